@@ -1,6 +1,8 @@
 from fastapi import FastAPI, Depends # Triggering reload to verify database path
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 import socketio
 import sys
 import os
@@ -9,9 +11,9 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from backend.config import settings
-from backend.routers import auth, patient, admin, pharmacy
+from backend.routers import auth, patient, admin, pharmacy, lab
 from backend.services.socket_manager import socket_manager
-from backend.database import create_tables, get_db  # <--- IMPORT THIS
+from backend.database import create_tables, get_async_db  # <--- IMPORT THIS
 
 # 1. Initialize FastAPI (Use a different variable name temporarily)
 fastapi_app = FastAPI(title=settings.PROJECT_NAME)
@@ -29,6 +31,7 @@ fastapi_app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # 3. Mount Routes
@@ -36,6 +39,7 @@ fastapi_app.include_router(auth.router)
 fastapi_app.include_router(patient.router)
 fastapi_app.include_router(admin.router)
 fastapi_app.include_router(pharmacy.router)
+fastapi_app.include_router(lab.router)
 
 # 4. STARTUP EVENT: Create Tables in Cloud DB
 @fastapi_app.on_event("startup")
@@ -48,24 +52,39 @@ def on_startup():
         print(f"Database Creation Failed: {e}")
 
 # 5. Health Check (Enhanced Diagnostic)
+# Totals come from stat_counters (kept current by every write), so this is one small SELECT
 @fastapi_app.get("/")
-def health_check(db: Session = Depends(get_db)):
-    from backend.database import DATABASE_URL, User, Appointment, Prescription
+async def health_check(db: AsyncSession = Depends(get_async_db)):
+    from backend.database import SAFE_DATABASE_URL as DATABASE_URL
+    from backend.services.counters import read_counters, totals
     try:
-        user_count = db.query(User).count()
-        appt_count = db.query(Appointment).count()
-        rx_count = db.query(Prescription).count()
         return {
             "status": "online",
             "database": DATABASE_URL,
-            "counts": {
-                "users": user_count,
-                "appointments": appt_count,
-                "prescriptions": rx_count
-            }
+            "counts": totals(await read_counters(db))
         }
     except Exception as e:
         return {"status": "error", "message": str(e), "database": DATABASE_URL}
 
+# Liveness: the process is up and serving. Never touches the database.
+@fastapi_app.get("/health/live")
+def liveness():
+    return {"status": "alive"}
+
+# Readiness: the database answers a trivial query. 503 tells the load balancer to hold traffic.
+@fastapi_app.get("/health/ready")
+async def readiness(db: AsyncSession = Depends(get_async_db)):
+    try:
+        await db.execute(text("SELECT 1"))
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "unavailable", "message": str(e)})
+    return {"status": "ready"}
+
+# Connection/pool numbers for sizing workers and DB_POOL_SIZE
+@fastapi_app.get("/health/db")
+def database_stats():
+    from backend.database import get_pool_stats
+    return get_pool_stats()
+
 # 6. Mount Socket.IO (Wrap the FastAPI app)
 app = socketio.ASGIApp(socket_manager.server, other_asgi_app=fastapi_app)
\ No newline at end of file
@@ -10,7 +10,8 @@ class Settings:
     PROJECT_NAME: str = "Healthcare Enterprise Platform"
     
     # Database & Security
-    DATABASE_URL: str = os.getenv("DATABASE_URL")
+    # Falls back to the SQLite file in the project root (see README_SETUP.md)
+    DATABASE_URL: str = os.getenv("DATABASE_URL") or f"sqlite:///{Path(__file__).resolve().parent.parent.as_posix()}/database.db"
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
@@ -24,7 +25,54 @@ class Settings:
     ZOOM_CLIENT_ID: str = os.getenv("ZOOM_CLIENT_ID")
     ZOOM_CLIENT_SECRET: str = os.getenv("ZOOM_CLIENT_SECRET")
     
+    # Run pending seed steps (demo data, staff logins) on startup instead of via `python -m backend.seed`
+    AUTO_SEED: bool = os.getenv("AUTO_SEED", "false").lower() == "true"
+
+    # Database Engine Tuning
+    # Postgres connection pool (per worker process)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 500))
+    DB_ECHO: bool = os.getenv("DB_ECHO", "false").lower() == "true"
+    # SQLite pragmas applied on every new connection
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", 65536))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))
+    # SQLite schema upgrades: the migrating worker refreshes its lock row every third of this;
+    # a row not refreshed for this long belongs to a worker that died and is taken over
+    MIGRATION_LOCK_STALE_SECONDS: int = int(os.getenv("MIGRATION_LOCK_STALE_SECONDS", 120))
+
+    # Realtime event log: how many recent events reconnecting sockets can replay, and whether
+    # to keep them in the database (survives restarts, shared by every worker) instead of memory
+    EVENT_LOG_SIZE: int = int(os.getenv("EVENT_LOG_SIZE", 1000))
+    EVENT_LOG_PERSIST: bool = os.getenv("EVENT_LOG_PERSIST", "false").lower() == "true"
+
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL")
 
+    # Socket.IO fan-out across workers: "memory" (one process), "redis" (pub/sub on REDIS_URL)
+    # or "local" (in-process stand-in). Cross-worker messages are batched per window/size.
+    SOCKETIO_MANAGER: str = os.getenv("SOCKETIO_MANAGER", "memory")
+    SOCKETIO_BATCH_MS: int = int(os.getenv("SOCKETIO_BATCH_MS", 10))
+    SOCKETIO_BATCH_SIZE: int = int(os.getenv("SOCKETIO_BATCH_SIZE", 100))
+    # Deltas to the same rooms within this window go out as one message; a client with more
+    # than SOCKETIO_CLIENT_HWM packets waiting stops getting deltas and is asked to resync
+    SOCKETIO_COALESCE_MS: int = int(os.getenv("SOCKETIO_COALESCE_MS", 75))
+    SOCKETIO_CLIENT_HWM: int = int(os.getenv("SOCKETIO_CLIENT_HWM", 500))
+
+    # Lab work queue: how long a claimed test stays reserved without a heartbeat, and the
+    # most tests one claim call may take
+    LAB_LEASE_SECONDS: int = int(os.getenv("LAB_LEASE_SECONDS", 300))
+    LAB_CLAIM_MAX: int = int(os.getenv("LAB_CLAIM_MAX", 50))
+
+    # Pharmacy fulfilment queue: how long a claimed prescription/order stays with one
+    # pharmacist without progress, and how often the queue is rebuilt from the database
+    PHARMACY_LEASE_SECONDS: int = int(os.getenv("PHARMACY_LEASE_SECONDS", 900))
+    PHARMACY_QUEUE_RESYNC_SECONDS: int = int(os.getenv("PHARMACY_QUEUE_RESYNC_SECONDS", 60))
+    # Stock held for a cart at checkout, and how often expired holds are returned to stock
+    CART_HOLD_SECONDS: int = int(os.getenv("CART_HOLD_SECONDS", 900))
+    INVENTORY_SWEEP_SECONDS: int = int(os.getenv("INVENTORY_SWEEP_SECONDS", 30))
+
 settings = Settings()
\ No newline at end of file
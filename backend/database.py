@@ -1,31 +1,124 @@
-import os
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Text, Enum # Reload trigger
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Text, Enum, Float, Index, text # Reload trigger
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from datetime import datetime
 import enum
 
-# --- 1. Database Connection Logic (Updated for Render) ---
+from backend.config import settings
 
-# Get DB URL from environment variable (Render) OR use a local fallback
-# Note: I changed the fallback to SQLite ('sqlite:///./database.db') so it works 
-# instantly on any machine without needing a local Postgres server running.
-# FORCE HARDCODED PATH FOR WINDOWS LOCAL
-DATABASE_URL = "sqlite:///D:/Desktop/med-com/database.db"
-print(f"Connecting to Database at: {DATABASE_URL}")
+# --- 1. Database Connection Logic ---
 
-# Fix for Render's Postgres URL (it starts with 'postgres://' but SQLAlchemy needs 'postgresql://')
-if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+def normalize_url(url: str) -> str:
+    # Render/Heroku hand out 'postgres://' URLs, SQLAlchemy needs 'postgresql://'
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
 
-# Create Engine
-if "sqlite" in DATABASE_URL:
-    # SQLite specific args
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    # Postgres configuration (Render)
-    engine = create_engine(DATABASE_URL)
+def to_async_url(url: str) -> str:
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
 
+DATABASE_URL = normalize_url(settings.DATABASE_URL)
+# Same URL with the password masked, safe for logs and the health check
+SAFE_DATABASE_URL = make_url(DATABASE_URL).render_as_string(hide_password=True)
+print(f"Connecting to Database at: {SAFE_DATABASE_URL}")
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    WAL lets readers keep going while a writer commits; NORMAL sync is safe under WAL and avoids
+    an fsync per commit; busy_timeout makes writers queue instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def engine_options(url: str) -> dict:
+    """
+    Keyword arguments for create_engine / create_async_engine for the given URL.
+    """
+    options = {"echo": settings.DB_ECHO, "query_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    if url.startswith("sqlite"):
+        # Sessions hop between threads (threadpool handlers, background tasks)
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=True
+        )
+    return options
+
+def _track_pool(engine, counters: dict):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        counters["connects"] += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        counters["checkouts"] += 1
+
+def build_engine(url: str):
+    url = normalize_url(url)
+    engine = create_engine(url, **engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+def build_async_engine(url: str):
+    url = to_async_url(normalize_url(url))
+    if url.startswith("postgresql+asyncpg"):
+        # asyncpg keeps prepared statements per connection; size that cache alongside SQLAlchemy's
+        url = make_url(url).update_query_dict(
+            {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}
+        )
+    engine = create_async_engine(url, **engine_options(str(url)))
+    if str(url).startswith("sqlite"):
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+# Sync engine: scripts, seeding and migrations
+engine = build_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine for the FastAPI routers, so DB round-trips never block the event loop
+# (and with it Socket.IO traffic)
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+async_engine = build_async_engine(DATABASE_URL)
+# expire_on_commit=False: handlers read attributes after commit without triggering a lazy (sync) reload
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+_POOL_COUNTERS = {
+    "sync": {"connects": 0, "checkouts": 0},
+    "async": {"connects": 0, "checkouts": 0},
+}
+_track_pool(engine, _POOL_COUNTERS["sync"])
+_track_pool(async_engine.sync_engine, _POOL_COUNTERS["async"])
+
+def get_pool_stats() -> dict:
+    """
+    Connection and pool numbers for both engines, used to size workers and pools.
+    """
+    stats = {"database": SAFE_DATABASE_URL, "dialect": engine.dialect.name}
+    for name, eng in (("sync", engine), ("async", async_engine.sync_engine)):
+        pool = eng.pool
+        entry = {"pool_class": type(pool).__name__, **_POOL_COUNTERS[name]}
+        for attr in ("size", "checkedin", "checkedout", "overflow"):
+            if hasattr(pool, attr):
+                entry[attr] = getattr(pool, attr)()
+        stats[name] = entry
+    return stats
+
 Base = declarative_base()
 
 # --- 2. Enums (Fixed Options) ---
@@ -36,9 +129,12 @@ class UserRole(str, enum.Enum):
     LAB = "lab"
     PHARMACIST = "pharmacist"
 
+# Allowed moves between these live in backend/services/state_machine.py
 class AppointmentStatus(str, enum.Enum):
     PENDING = "pending"
+    NEW = "new" # Lab test not started yet
     CONFIRMED = "confirmed"
+    IN_PROGRESS = "in_progress" # Doctor consultation under way
     PROCESSING = "processing" # For Lab Tests
     READY = "ready" # For Lab Results
     COMPLETED = "completed"
@@ -46,11 +142,18 @@ class AppointmentStatus(str, enum.Enum):
     RESCHEDULED = "rescheduled" 
 
 class OrderStatus(str, enum.Enum):
+    PENDING = "pending"
     PROCESSING = "processing"
     PREPARING = "preparing"
     READY = "ready"
     DELIVERED = "delivered"
 
+class ReservationStatus(str, enum.Enum):
+    HELD = "held"           # stock set aside for a cart, until expires_at
+    COMMITTED = "committed" # sold: part of a placed order
+    RELEASED = "released"   # cart emptied or replaced
+    EXPIRED = "expired"     # cart abandoned, returned by the sweeper
+
 # --- 3. Tables ---
 
 class User(Base):
@@ -97,10 +200,43 @@ class Appointment(Base):
     # Lab specific fields
     lab_result = Column(Text, nullable=True)
     lab_report_url = Column(String, nullable=True)
+    # Lab work queue lease (services/lab_queue.py): who holds the test and until when.
+    # claimed_at is the first claim, claim_count > 1 means a lease expired and was reclaimed
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    claim_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    completed_at = Column(DateTime, nullable=True)
+
+    # Bumped by every UPDATE (optimistic concurrency); realtime deltas carry it so clients
+    # can drop events older than what they already show
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
 
     patient = relationship("User", foreign_keys=[patient_id], back_populates="appointments")
     doctor = relationship("User", foreign_keys=[doctor_id], back_populates="doctor_appointments")
 
+    # Keyset pagination walks (appointment_time, id); each dashboard filter gets a matching prefix
+    __table_args__ = (
+        Index("ix_appointments_time_id", "appointment_time", "id"),
+        Index("ix_appointments_status_time_id", "status", "appointment_time", "id"),
+        Index("ix_appointments_type_time_id", "type", "appointment_time", "id"),
+        # Work queues ("lab tests processing, oldest first") read this index alone
+        Index("ix_appointments_status_type_time_id", "status", "type", "appointment_time", "id"),
+        # Lab SLA metrics: lab tests completed within a time window
+        Index("ix_appointments_type_completed", "type", "completed_at"),
+        Index("ix_appointments_doctor_time_status", "doctor_id", "appointment_time", "status"),
+        Index("ix_appointments_patient_time", "patient_id", "appointment_time"),
+        # One active (non-cancelled) booking per doctor per slot. Bookings insert optimistically
+        # and treat the IntegrityError as "slot taken", so there is no lock to serialise on.
+        Index(
+            "uq_appointments_active_slot", "doctor_id", "appointment_time",
+            unique=True,
+            sqlite_where=text("doctor_id IS NOT NULL AND status != 'cancelled'"),
+            postgresql_where=text("doctor_id IS NOT NULL AND status != 'cancelled'")
+        ),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
 class Prescription(Base):
     __tablename__ = "prescriptions"
     
@@ -110,9 +246,90 @@ class Prescription(Base):
     extracted_data = Column(JSON, nullable=True) # OCR Results
     status = Column(String, default=OrderStatus.PROCESSING)
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    # Pharmacy fulfilment queue lease (services/fulfilment.py), so two workers never hand
+    # the same prescription to two pharmacists
+    claimed_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
     
     patient = relationship("User", back_populates="prescriptions")
 
+    __table_args__ = (
+        Index("ix_prescriptions_created_id", "created_at", "id"),
+        Index("ix_prescriptions_status_created_id", "status", "created_at", "id"),
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+class Order(Base):
+    __tablename__ = "orders"
+
+    # Pharmacy cart orders. Ids come from the table's own sequence (autoincrement).
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True) # None for guest checkouts
+    user_name = Column(String, nullable=True)
+    status = Column(String, default=OrderStatus.PENDING, nullable=False)
+    payment_method = Column(String, nullable=True)
+    total_amount = Column(Float, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Pharmacy fulfilment queue lease, same as Prescription
+    claimed_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+
+    items = relationship("OrderItem", back_populates="order", order_by="OrderItem.id")
+
+    __table_args__ = (
+        # Order history per user (newest first), the fulfilment queue and admin listings
+        Index("ix_orders_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_orders_status_created_id", "status", "created_at", "id"),
+        Index("ix_orders_created_id", "created_at", "id"),
+    )
+
+class OrderItem(Base):
+    __tablename__ = "order_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Integer, nullable=True) # MEDICINES_DB index
+    product_name = Column(String, nullable=False)
+    base_name = Column(String, nullable=True)
+    pack_size = Column(String, nullable=True)
+    brand = Column(String, nullable=True)
+    image = Column(String, nullable=True)
+    quantity = Column(Integer, nullable=False, default=1)
+    price = Column(Float, nullable=False, default=0) # per unit, at order time
+
+    order = relationship("Order", back_populates="items")
+
+class InventoryItem(Base):
+    __tablename__ = "inventory"
+
+    # One row per catalog product (MEDICINES_DB index). `stock` is what can still be sold;
+    # units held for carts move to `reserved` until the order commits or the hold ends.
+    # Both only change through conditional UPDATEs in services/inventory.py.
+    product_id = Column(Integer, primary_key=True, autoincrement=False)
+    stock = Column(Integer, nullable=False, default=0)
+    reserved = Column(Integer, nullable=False, default=0)
+
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+
+    # The inventory ledger: every hold, sale and return, one row per product and cart/order
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("inventory.product_id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(String, default=ReservationStatus.HELD, nullable=False)
+    cart_id = Column(String, nullable=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=True)
+    resolved_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # The expiry sweeper and "what does this cart hold"
+        Index("ix_stock_reservations_status_expires", "status", "expires_at"),
+        Index("ix_stock_reservations_cart_status", "cart_id", "status"),
+    )
+
 class RolePermission(Base):
     __tablename__ = "role_permissions"
     
@@ -129,6 +346,73 @@ class AuditLog(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
     details = Column(String)
 
+class StatusHistory(Base):
+    __tablename__ = "status_history"
+
+    # One row per status transition of an appointment or prescription, written in the
+    # same transaction as the change itself
+    id = Column(Integer, primary_key=True, index=True)
+    item_type = Column(String, nullable=False) # "appointment" or "prescription"
+    item_id = Column(Integer, nullable=False)
+    from_status = Column(String, nullable=True)
+    to_status = Column(String, nullable=False)
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    note = Column(String, nullable=True) # e.g. "rescheduled to 2026-06-02 10:30"
+
+    __table_args__ = (
+        Index("ix_status_history_item", "item_type", "item_id", "changed_at"),
+    )
+
+class Observation(Base):
+    __tablename__ = "observations"
+
+    # One numeric reading parsed out of a free-text lab result (services/lab_results.py).
+    # Re-entering an appointment's result replaces its observations.
+    id = Column(Integer, primary_key=True, index=True)
+    patient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    appointment_id = Column(Integer, ForeignKey("appointments.id"), nullable=True, index=True)
+    analyte = Column(String, nullable=False) # canonical code, e.g. "hba1c"
+    name = Column(String, nullable=True) # as written in the result, e.g. "HbA1c"
+    value = Column(Float, nullable=False)
+    unit = Column(String, nullable=True)
+    ref_low = Column(Float, nullable=True)
+    ref_high = Column(Float, nullable=True)
+    note = Column(String, nullable=True) # e.g. "Pre-diabetic"
+    observed_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # Trend reads are one range scan of this index; value rides along so they never hit the table
+        Index("ix_observations_patient_analyte_time", "patient_id", "analyte", "observed_at", "value"),
+    )
+
+class BootstrapState(Base):
+    __tablename__ = "bootstrap_state"
+
+    # One row per completed seed step (see backend/seed.py), so workers never redo it
+    key = Column(String, primary_key=True)
+    completed_at = Column(DateTime, default=datetime.utcnow)
+    details = Column(String, nullable=True)
+
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+
+    # Running row counts per table and per status (see backend/services/counters.py)
+    key = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class RealtimeEvent(Base):
+    __tablename__ = "realtime_events"
+
+    # Persisted Socket.IO event log (EVENT_LOG_PERSIST); seq is the replay position
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    event = Column(String, nullable=False)
+    rooms = Column(JSON, nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Registers the session hook that keeps stat_counters in step with every ORM write
+import backend.services.counters  # noqa: E402,F401
+
 # --- 4. Dependency to get DB Session ---
 def get_db():
     db = SessionLocal()
@@ -137,206 +421,25 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # --- 5. Create Tables Function ---
 def create_tables():
-    # Attempt automatic migrations for SQLite
-    if "sqlite" in DATABASE_URL:
-        import sqlite3
-        try:
-            # Connect directly to perform ALTER TABLE safely
-            # SQLite ALTER TABLE ADD COLUMN ignores 'DEFAULT' cleanly if the column already exists
-            db_path = DATABASE_URL.replace("sqlite:///", "")
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            try:
-                cursor.execute("ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT 1;")
-                conn.commit()
-                print(" Successfully migrated: Added `is_active` to users table.")
-            except sqlite3.OperationalError as e:
-                # OperationalError: duplicate column name, which is fine!
-                if "duplicate column name" not in str(e).lower():
-                    print(f" Migration Warning (is_active): {e}")
-            conn.close()
-        except Exception as e:
-            print(f" General Migration Error: {e}")
-
-    Base.metadata.create_all(bind=engine)
-    print(" Database Tables Created Successfully")
-    auto_seed()
-
-def auto_seed():
-    # Use a flag file to prevent infinite reload loops with uvicorn --reload
-    flag_file = "D:/Desktop/med-com/.seeded"
-    if os.path.exists(flag_file):
-        return
+    # Schema changes live in backend/migrations.py; when the DB is current this is one SELECT
+    from backend.migrations import upgrade
+    from backend.seed import pending_steps, run_seed
+    version = upgrade(engine)
+    print(f" Database Schema at version {version}")
 
-    db = SessionLocal()
-    try:
-        # 1. Ensure Doctors for ALL departments
-        target_depts = ["Cardiology", "Neurology", "Orthopedics", "General", "Gastroenterology", "Pediatrics", "Dermatology"]
-        for dept in target_depts:
-            count = db.query(User).filter(User.role == "doctor", User.department == dept).count()
-            if count == 0:
-                print(f" Seeding default doctor for {dept}...")
-                doc = User(
-                    full_name=f"Dr. {dept} Specialist",
-                    email=f"doc.{dept.lower()}@medicare.com",
-                    role=UserRole.DOCTOR,
-                    department=dept,
-                    hashed_password="mock_password"
-                )
-                db.add(doc)
-        db.commit()
-
-        # 1b. Seed default Role Permissions
-        permissions_count = db.query(RolePermission).count()
-        if permissions_count == 0:
-            print(" Seeding Default Role Permissions...")
-            # Default permissions structure
-            default_perms = [
-                {"role": UserRole.ADMIN, "perms": {"manage_users": True, "manage_roles": True, "manage_appointments": True, "manage_lab": True, "manage_pharmacy": True, "manage_inventory": True}},
-                {"role": UserRole.DOCTOR, "perms": {"manage_users": False, "manage_roles": False, "manage_appointments": True, "manage_lab": False, "manage_pharmacy": False, "manage_inventory": False}},
-                {"role": UserRole.LAB, "perms": {"manage_users": False, "manage_roles": False, "manage_appointments": False, "manage_lab": True, "manage_pharmacy": False, "manage_inventory": False}},
-                {"role": UserRole.PHARMACIST, "perms": {"manage_users": False, "manage_roles": False, "manage_appointments": False, "manage_lab": False, "manage_pharmacy": True, "manage_inventory": True}}
-            ]
-            for p in default_perms:
-                db.add(RolePermission(role_name=p["role"], permissions=p["perms"]))
-            db.commit()
-
-        # 2. Seed Medications (Pharmacy)
-        meds_count = db.query(Medication).count()
-        if meds_count == 0:
-            print(" Seeding mock medications...")
-            mock_meds = [
-                {"name": "Paracetamol 500mg", "stock": 1000, "price": 5.0, "supplier": "PharmaCorp", "description": "Pain relief & fever reducer.", "category": "tablet", "unit": "strip"},
-                {"name": "Amoxicillin 250mg", "stock": 500, "price": 45.0, "supplier": "HealthPlus", "description": "Antibiotic.", "category": "capsule", "unit": "bottle"},
-                {"name": "Cough Syrup JS", "stock": 200, "price": 85.0, "supplier": "LiquidMeds", "description": "Dry cough relief.", "category": "syrup", "unit": "bottle"},
-                {"name": "Vitamin C 1000mg", "stock": 1500, "price": 30.0, "supplier": "Vitamix", "description": "Immune booster.", "category": "tablet", "unit": "strip"}
-            ]
-            for m in mock_meds:
-                db.add(Medication(**m))
-            db.commit()
-
-        # 2. Create Mock Patients if none
-        patient_count = db.query(User).filter(User.role == "patient").count()
-        patients = []
-        if patient_count == 0:
-            print("Seeding Mock Patients...")
-            patients_data = [
-                {"name": "Alice Smith", "phone": "9876543210", "email": "alice@example.com"},
-                {"name": "John Doe", "phone": "8877665544", "email": "john@example.com"},
-                {"name": "Sarah Miller", "phone": "7766554433", "email": "sarah@example.com"}
-            ]
-            for p_data in patients_data:
-                p = User(
-                    full_name=p_data["name"],
-                    phone=p_data["phone"],
-                    email=p_data["email"],
-                    role=UserRole.PATIENT,
-                    hashed_password="mock_password"
-                )
-                db.add(p)
-                patients.append(p)
-            db.commit()
-            for p in patients: db.refresh(p)
-        else:
-            patients = db.query(User).filter(User.role == "patient").all()
-        
-        # 3. Add Mock Appointments if none
-        appt_count = db.query(Appointment).count()
-        if appt_count == 0 and patients:
-            print("Seeding Mock Appointments...")
-            appointments_data = [
-                {"name": "Complete Blood Count (CBC)", "type": "lab_test", "status": "pending"},
-                {"name": "Lipid Profile", "type": "lab_test", "status": "processing"},
-                {"name": "Diabetes Screen (HbA1c)", "type": "lab_test", "status": "ready", "result": "HbA1c: 5.8% (Pre-diabetic)"},
-                {"name": "General Consultation", "type": "clinic", "status": "pending"},
-                {"name": "Cardiology Follow-up", "type": "clinic", "status": "confirmed"}
-            ]
-            for idx, appt_data in enumerate(appointments_data):
-                appt = Appointment(
-                    patient_id=patients[idx % len(patients)].id,
-                    appointment_time=datetime.now(),
-                    type=appt_data["type"],
-                    doctor_name=appt_data["name"],
-                    status=appt_data["status"],
-                    lab_result=appt_data.get("result")
-                )
-                db.add(appt)
-            db.commit()
-
-        # 4. Add Mock Pharmacy Orders if none
-        rx_count = db.query(Prescription).count()
-        if rx_count == 0 and patients:
-            print("Seeding Mock Pharmacy Orders...")
-            pharmacy_orders = [
-                {"data": "Amoxicillin 500mg - 1x Daily\nParacetamol - SOS", "status": "preparing"},
-                {"data": "Vitamin C - 1x Daily\nZinc Supplements", "status": "ready"},
-                {"data": "Lisinopril 10mg\nAtorvastatin 20mg", "status": "processing"}
-            ]
-            for idx, order in enumerate(pharmacy_orders):
-                p_order = Prescription(
-                    patient_id=patients[idx % len(patients)].id,
-                    extracted_data=order["data"],
-                    status=order["status"],
-                    created_at=datetime.utcnow()
-                )
-                db.add(p_order)
-            db.commit()
-
-        print(" Database Sync & Seeding Completed Successfully!")
-        with open(flag_file, "w") as f: f.write("seeded")
-        
-    except Exception as e:
-        print(f" Seeding Failed: {e}")
-        db.rollback()
-    finally:
-        db.close()
+    # Seeding (bcrypt hashing, upserts) is a separate, recorded stage: `python -m backend.seed`.
+    # Startup only checks what is still pending, unless AUTO_SEED asks it to do the work.
+    pending = pending_steps()
+    if pending and settings.AUTO_SEED:
+        run_seed()
+    elif pending:
+        print(f" Seed steps pending: {', '.join(pending)} (run `python -m backend.seed`)")
 
 if __name__ == "__main__":
     create_tables()
-
-def update_mock_passwords():
-    import sys
-    import os
-    # Add the parent directory to sys.path so 'backend.security' works
-    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-    from backend.security import get_password_hash
-    from backend.database import User, UserRole
-    db = SessionLocal()
-    try:
-        def upsert_user(email, role, raw_pass, dept=None, name='Test Staff'):
-            u = db.query(User).filter(User.email == email).first()
-            if not u:
-                u = User(email=email, role=role, full_name=name)
-                if dept: u.department = dept
-                db.add(u)
-            u.hashed_password = get_password_hash(raw_pass)
-            return u
-
-        upsert_user('doc.cardiology@medicare.com', UserRole.DOCTOR, 'doctor123', 'Cardiology', 'Dr. Cardio')
-        upsert_user('doc.neurology@medicare.com', UserRole.DOCTOR, 'doctor123', 'Neurology', 'Dr. Neuro')
-        upsert_user('doc.orthopedics@medicare.com', UserRole.DOCTOR, 'doctor123', 'Orthopedics', 'Dr. Ortho')
-        upsert_user('doc.general@medicare.com', UserRole.DOCTOR, 'doctor123', 'General', 'Dr. General')
-        upsert_user('doc.gastroenterology@medicare.com', UserRole.DOCTOR, 'doctor123', 'Gastroenterology', 'Dr. Gastro')
-        upsert_user('doc.pediatrics@medicare.com', UserRole.DOCTOR, 'doctor123', 'Pediatrics', 'Dr. Peds')
-        upsert_user('doc.dermatology@medicare.com', UserRole.DOCTOR, 'doctor123', 'Dermatology', 'Dr. Derm')
-        upsert_user('lab@medicare.com', UserRole.LAB, 'lab123', name='Lab Tech')
-        upsert_user('pharmacy@medicare.com', UserRole.PHARMACIST, '12345', name='Pharmacist')
-
-        # Also patch any generic ones left over
-        users = db.query(User).filter(User.hashed_password == "mock_password").all()
-        if users:
-            for user in users:
-                if user.role == "doctor": user.hashed_password = get_password_hash("doctor123")
-                elif user.role == "lab_technician": user.hashed_password = get_password_hash("lab123")
-                elif user.role == "pharmacist": user.hashed_password = get_password_hash("12345")
-                elif user.role == "admin": user.hashed_password = get_password_hash("admin123")
-        db.commit()
-    except Exception as e:
-        print(f" Password Update Error: {e}")
-    finally:
-        db.close()
-
-# Unconditionally run to patch existing databases on reload
-update_mock_passwords()
\ No newline at end of file
@@ -0,0 +1,433 @@
+"""
+Versioned schema migrations.
+
+Startup calls `upgrade()`, which is a single `SELECT MAX(version)` when the database is
+already current. Pending migrations run in order, each one recorded in `schema_version`
+as soon as it succeeds.
+
+Adding a migration: write a function taking the sync engine, append it to MIGRATIONS with
+the next version number, and keep it idempotent (check before ALTER/CREATE) so it is safe
+on databases that were patched by hand before this runner existed. Anything that rewrites
+rows on a big table should go through `batched_update` (or `batched_update_by_id` when the
+rows to fix can't be told apart by an index), which commits every batch so readers and the
+app never wait on one long write lock.
+
+Only one process migrates at a time: Postgres holds an advisory lock, SQLite a row in
+schema_migration_lock (its writes are per statement, so a lock that spans many
+transactions has to live in a table). The migrating worker keeps refreshing that row from a
+heartbeat thread; the others take it over only once it has not been refreshed for
+MIGRATION_LOCK_STALE_SECONDS, i.e. its owner is gone.
+
+CLI:
+    python -m backend.migrations            # upgrade to head
+    python -m backend.migrations current    # print the current version
+"""
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, List, Tuple
+
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text, inspect, text,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateTable
+
+from backend.config import settings
+from backend.database import Appointment, engine as default_engine
+
+_meta = MetaData()
+schema_version = Table(
+    "schema_version", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+# Postgres advisory lock key, so several workers booting at once don't migrate concurrently
+_PG_LOCK_KEY = 872_341_001
+
+# SQLite: the worker that inserts the single row migrates, the others wait for it to go
+migration_lock = Table(
+    "schema_migration_lock", _meta,
+    Column("id", Integer, primary_key=True),
+    Column("owner", String),
+    Column("locked_at", DateTime, nullable=False),
+)
+_LOCK_POLL_SECONDS = 0.2
+
+# The schema m001 creates, as it was when this runner replaced create_all(). Frozen: later
+# columns and indexes come from their own migrations, whatever the models say today.
+_baseline = MetaData()
+Table(
+    "users", _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("full_name", String, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("hashed_password", String),
+    Column("role", String),
+    Column("phone", String),
+    Column("department", String),
+    Column("is_active", Boolean),
+    Column("patient_uid", String, unique=True),
+    Column("is_gold_member", Boolean),
+    Column("guardian_id", Integer, ForeignKey("users.id")),
+)
+Table(
+    "appointments", _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("users.id")),
+    Column("doctor_id", Integer, ForeignKey("users.id")),
+    Column("appointment_time", DateTime),
+    Column("status", String),
+    Column("type", String),
+    Column("zoom_link", String),
+    Column("symptoms_summary", Text),
+    Column("doctor_name", String),
+    Column("lab_result", Text),
+    Column("lab_report_url", String),
+)
+Table(
+    "prescriptions", _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("patient_id", Integer, ForeignKey("users.id")),
+    Column("image_url", String),
+    Column("extracted_data", JSON),
+    Column("status", String),
+    Column("created_at", DateTime),
+)
+Table(
+    "role_permissions", _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("role_name", String, unique=True, index=True),
+    Column("permissions", JSON),
+)
+Table(
+    "audit_logs", _baseline,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("action", String),
+    Column("performed_by", Integer, ForeignKey("users.id")),
+    Column("timestamp", DateTime),
+    Column("details", String),
+)
+
+# --- Helpers ---
+
+def column_names(engine: Engine, table: str) -> set:
+    return {col["name"] for col in inspect(engine).get_columns(table)}
+
+def add_column_if_missing(engine: Engine, table: str, column: str, ddl_type: str):
+    if column in column_names(engine, table):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+    print(f"    + {table}.{column}")
+
+def create_indexes(engine: Engine, table, names=None):
+    """
+    Creates the model-declared indexes of `table` that don't exist yet (all, or only `names`).
+    """
+    for index in table.indexes:
+        if names is None or index.name in names:
+            index.create(bind=engine, checkfirst=True)
+
+def batched_update(engine: Engine, select_ids_sql: str, update_sql: str, batch_size: int = 5000, **params) -> int:
+    """
+    Repeats "pick up to batch_size ids, update them, commit" until the select returns nothing.
+    `select_ids_sql` must stop matching rows once they are updated, and must accept :batch_size.
+    `update_sql` gets the ids as the expanding :ids parameter.
+    """
+    from sqlalchemy import bindparam
+    update_stmt = text(update_sql).bindparams(bindparam("ids", expanding=True))
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            ids = [row[0] for row in conn.execute(text(select_ids_sql), {"batch_size": batch_size, **params})]
+            if not ids:
+                return total
+            conn.execute(update_stmt, {"ids": ids, **params})
+        total += len(ids)
+        print(f"    ... {total} rows")
+
+def batched_update_by_id(engine: Engine, table: str, where_sql: str, set_sql: str, batch_size: int = 5000, **params) -> int:
+    """
+    Runs "UPDATE table SET set_sql WHERE where_sql" one id range of batch_size at a time,
+    committing each. Every row is looked at once, where batched_update's select would rescan
+    the rows it skipped on every batch. Returns the rows updated.
+    """
+    with engine.connect() as conn:
+        max_id = conn.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or 0
+    update_stmt = text(f"UPDATE {table} SET {set_sql} WHERE id > :low AND id <= :high AND ({where_sql})")
+    total = 0
+    for low in range(0, max_id, batch_size):
+        with engine.begin() as conn:
+            updated = conn.execute(update_stmt, {"low": low, "high": low + batch_size, **params}).rowcount
+        if updated:
+            total += updated
+            print(f"    ... {total} rows")
+    return total
+
+def _as_datetime(value):
+    # Raw SELECTs on SQLite return DATETIME columns as strings
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+# --- Migrations ---
+
+def m001_baseline(engine: Engine):
+    # The tables that existed before this runner, as they were then (see _baseline)
+    _baseline.create_all(bind=engine, checkfirst=True)
+
+def m002_legacy_columns(engine: Engine):
+    # Columns that used to be patched in by create_tables() and migrate_db.py
+    add_column_if_missing(engine, "users", "is_active", "BOOLEAN DEFAULT TRUE")
+    add_column_if_missing(engine, "users", "department", "VARCHAR")
+    for column, ddl_type in [
+        ("lab_result", "TEXT"),
+        ("lab_report_url", "VARCHAR"),
+        ("doctor_name", "VARCHAR"),
+        ("symptoms_summary", "TEXT"),
+        ("zoom_link", "VARCHAR"),
+        ("type", "VARCHAR(50) DEFAULT 'consultation'"),
+    ]:
+        add_column_if_missing(engine, "appointments", column, ddl_type)
+
+def m003_listing_indexes(engine: Engine):
+    # Keyset pagination / dashboard filter indexes and the per-doctor availability index
+    create_indexes(engine, Appointment.__table__, {
+        "ix_appointments_time_id",
+        "ix_appointments_status_time_id",
+        "ix_appointments_type_time_id",
+        "ix_appointments_doctor_time_status",
+        "ix_appointments_patient_time",
+    })
+    from backend.database import Prescription
+    create_indexes(engine, Prescription.__table__)
+
+def m004_unique_active_slot(engine: Engine):
+    # Double bookings made before the constraint existed would block the unique index:
+    # keep the oldest active booking per (doctor, time) and cancel the rest, in batches
+    cancelled = batched_update(
+        engine,
+        """
+        SELECT a.id FROM appointments a
+        WHERE a.doctor_id IS NOT NULL AND a.status != 'cancelled'
+          AND EXISTS (
+            SELECT 1 FROM appointments b
+            WHERE b.doctor_id = a.doctor_id AND b.appointment_time = a.appointment_time
+              AND b.status != 'cancelled' AND b.id < a.id
+          )
+        LIMIT :batch_size
+        """,
+        "UPDATE appointments SET status = 'cancelled' WHERE id IN :ids",
+    )
+    if cancelled:
+        print(f"    Cancelled {cancelled} duplicate bookings")
+    create_indexes(engine, Appointment.__table__, {"uq_appointments_active_slot"})
+
+def m005_bootstrap_state(engine: Engine):
+    from backend.database import BootstrapState
+    BootstrapState.__table__.create(bind=engine, checkfirst=True)
+
+def m006_stat_counters(engine: Engine):
+    from backend.database import StatCounter
+    from backend.services.counters import rebuild
+    StatCounter.__table__.create(bind=engine, checkfirst=True)
+    # Backfill once; from here on every ORM write moves the counters itself
+    with engine.begin() as conn:
+        rebuild(conn)
+
+def m007_row_versions(engine: Engine):
+    # Existing rows start at version 1, same as new inserts
+    add_column_if_missing(engine, "appointments", "version", "INTEGER NOT NULL DEFAULT 1")
+    add_column_if_missing(engine, "prescriptions", "version", "INTEGER NOT NULL DEFAULT 1")
+
+def m008_realtime_events(engine: Engine):
+    from backend.database import RealtimeEvent
+    RealtimeEvent.__table__.create(bind=engine, checkfirst=True)
+
+def m009_status_history(engine: Engine):
+    from backend.database import Prescription, StatusHistory
+    from backend.services.counters import rebuild
+    StatusHistory.__table__.create(bind=engine, checkfirst=True)
+    create_indexes(engine, Appointment.__table__, {"ix_appointments_status_type_time_id"})
+    # Statuses are compared exactly from now on: lowercase whatever was stored otherwise
+    fixed = 0
+    for table in (Appointment.__tablename__, Prescription.__tablename__):
+        fixed += batched_update_by_id(
+            engine, table, "status != LOWER(TRIM(status))", "status = LOWER(TRIM(status))",
+        )
+    if fixed:
+        print(f"    Normalized {fixed} statuses")
+        with engine.begin() as conn:
+            rebuild(conn, ["appointments", "prescriptions"])
+
+def m010_lab_queue(engine: Engine):
+    for column, ddl_type in [
+        ("claimed_by", "VARCHAR"),
+        ("claimed_at", "TIMESTAMP"),
+        ("lease_expires_at", "TIMESTAMP"),
+        ("claim_count", "INTEGER NOT NULL DEFAULT 0"),
+        ("completed_at", "TIMESTAMP"),
+    ]:
+        add_column_if_missing(engine, "appointments", column, ddl_type)
+    create_indexes(engine, Appointment.__table__, {"ix_appointments_type_completed"})
+
+def m011_observations(engine: Engine, batch_size: int = 2000):
+    from backend.database import Observation
+    from backend.services.lab_results import observation_rows
+    Observation.__table__.create(bind=engine, checkfirst=True)
+    # Backfill from the free-text results entered so far, walking appointments by id.
+    # Appointments that already have observations are skipped, so a rerun adds nothing.
+    last_id, written = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                """
+                SELECT a.id, a.patient_id, a.lab_result, a.appointment_time FROM appointments a
+                WHERE a.id > :last_id AND a.lab_result IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM observations o WHERE o.appointment_id = a.id)
+                ORDER BY a.id LIMIT :batch_size
+                """
+            ), {"last_id": last_id, "batch_size": batch_size}).all()
+            if not rows:
+                break
+            parsed = [obs for row in rows for obs in observation_rows(
+                row.id, row.patient_id, row.lab_result, _as_datetime(row.appointment_time)
+            )]
+            if parsed:
+                conn.execute(Observation.__table__.insert(), parsed)
+        last_id, written = rows[-1].id, written + len(parsed)
+    if written:
+        print(f"    Parsed {written} observations from existing lab results")
+
+def m012_prescription_claims(engine: Engine):
+    add_column_if_missing(engine, "prescriptions", "claimed_by", "VARCHAR")
+    add_column_if_missing(engine, "prescriptions", "lease_expires_at", "TIMESTAMP")
+
+def m013_orders(engine: Engine):
+    # Orders used to live in a per-process list, so there is nothing to carry over
+    from backend.database import Order, OrderItem
+    Order.__table__.create(bind=engine, checkfirst=True)
+    OrderItem.__table__.create(bind=engine, checkfirst=True)
+
+def m014_inventory(engine: Engine):
+    # Rows are created on first use from the catalog's stock (services/inventory.py)
+    from backend.database import InventoryItem, StockReservation
+    InventoryItem.__table__.create(bind=engine, checkfirst=True)
+    StockReservation.__table__.create(bind=engine, checkfirst=True)
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Engine], None]]] = [
+    (1, "baseline", m001_baseline),
+    (2, "legacy_columns", m002_legacy_columns),
+    (3, "listing_indexes", m003_listing_indexes),
+    (4, "unique_active_slot", m004_unique_active_slot),
+    (5, "bootstrap_state", m005_bootstrap_state),
+    (6, "stat_counters", m006_stat_counters),
+    (7, "row_versions", m007_row_versions),
+    (8, "realtime_events", m008_realtime_events),
+    (9, "status_history", m009_status_history),
+    (10, "lab_queue", m010_lab_queue),
+    (11, "observations", m011_observations),
+    (12, "prescription_claims", m012_prescription_claims),
+    (13, "orders", m013_orders),
+    (14, "inventory", m014_inventory),
+]
+HEAD = MIGRATIONS[-1][0]
+
+# --- Runner ---
+
+def current_version(engine: Engine = default_engine) -> int:
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        # No schema_version table yet means a fresh or pre-migration database. Anything else
+        # (a locked or unreachable database) must not pass for version 0.
+        if inspect(engine).has_table(schema_version.name):
+            raise
+        return 0
+
+@contextmanager
+def _migration_lock(engine: Engine):
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as lock_conn:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _PG_LOCK_KEY})
+            try:
+                yield
+            finally:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _PG_LOCK_KEY})
+        return
+
+    stale_seconds = settings.MIGRATION_LOCK_STALE_SECONDS
+    with engine.begin() as conn:
+        conn.execute(CreateTable(migration_lock, if_not_exists=True))
+    add_column_if_missing(engine, migration_lock.name, "owner", "VARCHAR")
+    owner = uuid.uuid4().hex
+    mine = (migration_lock.c.id == 1) & (migration_lock.c.owner == owner)
+    while True:
+        now = datetime.utcnow()
+        try:
+            with engine.begin() as conn:
+                conn.execute(migration_lock.insert().values(id=1, owner=owner, locked_at=now))
+            break
+        except IntegrityError:
+            with engine.begin() as conn:
+                conn.execute(migration_lock.delete().where(
+                    migration_lock.c.locked_at < now - timedelta(seconds=stale_seconds)
+                ))
+            time.sleep(_LOCK_POLL_SECONDS)
+
+    # Keep the row fresh however long one migration runs
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(stale_seconds / 3):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(migration_lock.update().where(mine).values(locked_at=datetime.utcnow()))
+            except OperationalError as e:
+                # e.g. a long CREATE INDEX holding the write lock; try again next beat
+                print(f"    (migration lock not refreshed: {e})")
+
+    beat = threading.Thread(target=heartbeat, name="migration-lock-heartbeat", daemon=True)
+    beat.start()
+    try:
+        yield
+    finally:
+        done.set()
+        beat.join()
+        with engine.begin() as conn:
+            conn.execute(migration_lock.delete().where(mine))
+
+def upgrade(engine: Engine = default_engine) -> int:
+    """
+    Applies every pending migration. Returns the version the database ends up at.
+    """
+    version = current_version(engine)
+    if version >= HEAD:
+        return version
+
+    with _migration_lock(engine):
+        # Another worker may have finished while we waited for the lock
+        version = current_version(engine)
+        schema_version.create(bind=engine, checkfirst=True)
+        for number, name, migrate in MIGRATIONS:
+            if number <= version:
+                continue
+            print(f" Migrating schema -> {number} ({name})")
+            migrate(engine)
+            with engine.begin() as conn:
+                conn.execute(schema_version.insert().values(version=number, name=name, applied_at=datetime.utcnow()))
+            version = number
+    return version
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "current":
+        print(f"Schema version: {current_version()} (head: {HEAD})")
+    else:
+        print(f"Schema version: {upgrade()} (head: {HEAD})")
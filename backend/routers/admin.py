@@ -1,10 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from backend.database import get_db, Appointment, Prescription
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db, Appointment, Prescription
 from backend.services.socket_manager import socket_manager as manager
-from typing import Optional
+from backend.services.availability import availability_engine
+from backend.services.records import (
+    appointment_query, appointment_record, load_appointment, load_appointments, load_prescription, load_prescriptions,
+    prescription_query, prescription_record
+)
+from backend.services.pagination import NEXT_CURSOR_HEADER, keyset_page, page_rows, parse_date_range, split_csv
+from typing import List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 class AdminAppointmentRequest(BaseModel):
     patient_name: str
@@ -18,6 +30,7 @@ class AdminLabRequest(BaseModel):
     patient_name: str
     patient_phone: str
     test_name: str
+    result: Optional[str] = None # Walk-in tests whose result is already known
 
 class AdminUserCreateRequest(BaseModel):
     full_name: str
@@ -34,48 +47,146 @@ class RolePermissionUpdateRequest(BaseModel):
     role_name: str
     permissions: dict
 
+class BulkStatusOperation(BaseModel):
+    item_type: str
+    item_id: int
+    new_status: str
+    new_result: Optional[str] = None
+    new_date: Optional[str] = None
+    new_time: Optional[str] = None
+
+class BulkStatusRequest(BaseModel):
+    operations: List[BulkStatusOperation]
+
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 @router.get("/appointments")
-def get_all_appointments(db: Session = Depends(get_db)):
+async def get_all_appointments(
+    response: Response,
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    doctor_id: Optional[int] = None,
+    department: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
     from backend.database import User
-    # Return all appointments (doctors + lab), but join with User to get patient name and phone
-    appointments = db.query(Appointment).all()
-    results = []
-    for appt in appointments:
-        patient = db.query(User).filter(User.id == appt.patient_id).first()
-        results.append({
-            "id": appt.id,
-            "patient_id": appt.patient_id,
-            "doctor_id": appt.doctor_id,
-            "appointment_time": appt.appointment_time,
-            "status": appt.status,
-            "type": appt.type,
-            "zoom_link": appt.zoom_link,
-            "doctor_name": appt.doctor_name,
-            "patient_name": patient.full_name if patient else "Unknown",
-            "patient_phone": patient.phone if patient else None,
-            "lab_result": appt.lab_result,
-            "lab_report_url": appt.lab_report_url
-        })
-    return results
+    # Appointments (doctors + lab) with patient name and phone pulled in by a single outer join.
+    # Pages are keyset-paginated on (appointment_time, id); the cursor for the next page is
+    # returned in the X-Next-Cursor header, so every page costs one index range scan.
+    # order=desc lists newest first (what the dashboard wants when there are many pages).
+    query = appointment_query()
+
+    statuses = split_csv(status)
+    if statuses:
+        query = query.where(Appointment.status.in_(statuses))
+    types = split_csv(type)
+    if types:
+        query = query.where(Appointment.type.in_(types))
+    if doctor_id is not None:
+        query = query.where(Appointment.doctor_id == doctor_id)
+    if department:
+        department_doctors = select(User.id).where(User.role == "doctor", User.department == department)
+        query = query.where(Appointment.doctor_id.in_(department_doctors.scalar_subquery()))
+
+    start, end = parse_date_range(date_from, date_to)
+    if start:
+        query = query.where(Appointment.appointment_time >= start)
+    if end:
+        query = query.where(Appointment.appointment_time < end)
+
+    # Appointments without a time (legacy rows) are listed after the rest, by id
+    query = keyset_page(query, Appointment.appointment_time, Appointment.id, cursor, limit, descending=order == "desc")
+    rows, next_cursor = page_rows((await db.execute(query)).all(), limit, "appointment_time")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return [appointment_record(row) for row in rows]
 
 @router.get("/pharmacy_queue")
-def get_pharmacy_queue(db: Session = Depends(get_db)):
-    from backend.database import User
-    prescriptions = db.query(Prescription).all()
-    results = []
-    for rx in prescriptions:
-        patient = db.query(User).filter(User.id == rx.patient_id).first()
-        results.append({
-            "id": rx.id,
-            "patient_id": rx.patient_id,
-            "extracted_data": rx.extracted_data,
-            "status": rx.status,
-            "patient_name": patient.full_name if patient else "Unknown",
-            "patient_phone": patient.phone if patient else None
-        })
-    return results
+async def get_pharmacy_queue(
+    response: Response,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Same keyset scheme as /appointments, ordered by (created_at, id)
+    query = prescription_query()
+
+    statuses = split_csv(status)
+    if statuses:
+        query = query.where(Prescription.status.in_(statuses))
+
+    start, end = parse_date_range(date_from, date_to)
+    if start:
+        query = query.where(Prescription.created_at >= start)
+    if end:
+        query = query.where(Prescription.created_at < end)
+
+    query = keyset_page(query, Prescription.created_at, Prescription.id, cursor, limit, descending=order == "desc")
+    rows, next_cursor = page_rows((await db.execute(query)).all(), limit, "created_at")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return [prescription_record(row) for row in rows]
+
+# Stat tiles each staff role sees on the dashboard
+DASHBOARD_TILES = {
+    "admin": ("doctors", "lab", "pharmacy", "inventory"),
+    "doctor": ("doctors",),
+    "lab": ("lab",),
+    "pharmacist": ("pharmacy", "inventory"),
+}
+
+@router.get("/dashboard")
+async def get_dashboard(
+    role: Optional[str] = None,
+    doctor_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Tile numbers come from the stat_counters rollups (one small SELECT) rather than
+    # shipping every appointment and prescription to the browser to be filtered there
+    from backend.routers.pharmacy import MEDICINES_DB
+    from backend.services.counters import read_counters
+
+    # Custom roles (see /admin/roles) get the full set, as the dashboard always showed them
+    tiles = DASHBOARD_TILES.get((role or "admin").lower(), DASHBOARD_TILES["admin"])
+
+    counters = {}
+    if "lab" in tiles or "pharmacy" in tiles or ("doctors" in tiles and doctor_id is None):
+        counters = await read_counters(db)
+
+    def total(group: str, keep) -> int:
+        return sum(count for key, count in counters.items() if key.startswith(group + ":") and keep(*key.split(":")[1:]))
+
+    stats = {}
+    if "doctors" in tiles:
+        if doctor_id is not None:
+            # A doctor's own queue: one indexed COUNT on (doctor_id, ...)
+            stats["doctors"] = await db.scalar(
+                select(func.count(Appointment.id)).where(
+                    Appointment.doctor_id == doctor_id,
+                    Appointment.type != "lab_test",
+                    func.lower(Appointment.status) == "pending"
+                )
+            ) or 0
+        else:
+            stats["doctors"] = total("appointments", lambda kind, status: kind != "lab_test" and status.lower() == "pending")
+    if "lab" in tiles:
+        stats["lab"] = total("appointments", lambda kind, status: kind == "lab_test" and status.lower() != "completed")
+    if "pharmacy" in tiles:
+        stats["pharmacy"] = total("prescriptions", lambda status: status.lower() in ("preparing", "pending"))
+    if "inventory" in tiles:
+        stats["inventory"] = len(MEDICINES_DB)
+    return stats
 
 @router.post("/update_status")
 async def update_status(
@@ -85,75 +196,299 @@ async def update_status(
     new_date: Optional[str] = None, 
     new_time: Optional[str] = None,
     new_result: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) :
+    from backend.database import StatusHistory
+    from backend.services.lab_queue import FINISHED_STATUSES
+    from backend.services.state_machine import normalize_status, transition_error
+
+    new_status = normalize_status(new_status)
     print(f" ADMIN UPDATE: {item_type} #{item_id} -> {new_status}")
 
     if item_type == "appointment":
-        appt = db.query(Appointment).filter(Appointment.id == item_id).first()
+        appt = await db.get(Appointment, item_id)
         if not appt: 
             raise HTTPException(status_code=404, detail="Appointment not found")
+        error = transition_error(item_type, appt.status, new_status)
+        if error:
+            raise HTTPException(status_code=409, detail=error)
         
+        old_time, old_status = appt.appointment_time, appt.status
         appt.status = new_status
+        if new_status in FINISHED_STATUSES and appt.completed_at is None:
+            appt.completed_at = datetime.now()  # local time, like appointment_time and the lab queue
+        note = None
         
         # LOGIC TO UPDATE TIME IF RESCHEDULING
         if new_status == 'rescheduled' and new_date and new_time:
             try:
-                new_dt_str = f"{new_date} {new_time}"
-                new_dt = datetime.strptime(new_dt_str, "%Y-%m-%d %H:%M")
-                appt.appointment_time = new_dt
-                print(f"    Rescheduled to {new_dt}")
-            except Exception as e:
-                print(f"    Date Parse Error: {e}")
+                new_dt = datetime.strptime(f"{new_date} {new_time}", "%Y-%m-%d %H:%M")
+            except ValueError:
+                raise HTTPException(status_code=400, detail="new_date must be YYYY-MM-DD and new_time HH:MM")
+            appt.appointment_time = new_dt
+            note = f"rescheduled to {new_dt:%Y-%m-%d %H:%M}"
+            print(f"    Rescheduled to {new_dt}")
 
         if new_result:
+            from backend.services.lab_results import record_observations
             appt.lab_result = new_result
+            await record_observations(db, [(appt.id, appt.patient_id, new_result, appt.appointment_time)])
             print(f"    Added Result: {new_result}")
 
-        db.commit()
+        if old_status != new_status or note:
+            db.add(StatusHistory(item_type=item_type, item_id=item_id, from_status=old_status, to_status=new_status, note=note))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Rescheduling (or re-activating) into a slot another active booking holds
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="The doctor already has an active booking in that slot")
+        except StaleDataError:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="The appointment was changed by someone else. Please refresh.")
+        availability_engine.apply_change(appt.doctor_id, old_time, old_status, appt.appointment_time, appt.status)
         
-        # Notify Clients via Socket
-        await manager.broadcast(f"Appointment #{item_id} is now {new_status}")
+        # Notify Clients via Socket: just the changed row, to the rooms that show it
+        kind = "rescheduled" if appt.appointment_time != old_time else "status_changed"
+        await manager.appointment_event(kind, await load_appointment(db, item_id))
         
     elif item_type == "prescription":
-        rx = db.query(Prescription).filter(Prescription.id == item_id).first()
-        if rx:
-            rx.status = new_status
-            db.commit()
-            await manager.broadcast(f"Prescription #{item_id} is now {new_status}")
+        rx = await db.get(Prescription, item_id)
+        if not rx:
+            raise HTTPException(status_code=404, detail="Prescription not found")
+        error = transition_error(item_type, rx.status, new_status)
+        if error:
+            raise HTTPException(status_code=409, detail=error)
+        if rx.status != new_status:
+            db.add(StatusHistory(item_type=item_type, item_id=item_id, from_status=rx.status, to_status=new_status))
+        rx.status = new_status
+        try:
+            await db.commit()
+        except StaleDataError:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="The prescription was changed by someone else. Please refresh.")
+        await manager.prescription_event(await load_prescription(db, item_id))
+
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown item type '{item_type}'")
 
     return {"message": "Status updated"}
 
+@router.get("/status_history")
+async def get_status_history(item_type: str, item_id: int, db: AsyncSession = Depends(get_async_db)):
+    from backend.database import StatusHistory
+    rows = (await db.execute(
+        select(StatusHistory.from_status, StatusHistory.to_status, StatusHistory.changed_at, StatusHistory.note)
+        .where(StatusHistory.item_type == item_type, StatusHistory.item_id == item_id)
+        .order_by(StatusHistory.changed_at, StatusHistory.id)
+    )).all()
+    return [
+        {"from_status": row.from_status, "to_status": row.to_status, "changed_at": row.changed_at, "note": row.note}
+        for row in rows
+    ]
+
+MAX_BULK_OPERATIONS = 1000
+
+class BulkConflict(Exception):
+    pass
+
+@router.post("/bulk_status")
+async def bulk_update_status(req: BulkStatusRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Applies many status changes (optionally with a lab result or a reschedule) at once.
+    Every operation is checked against the allowed transitions first; if any fails, nothing
+    is changed. Otherwise they are written in one transaction with one UPDATE per
+    (type, from, to) group and announced in one aggregated socket message.
+    """
+    from backend.services.counters import apply_deltas, counter_key
+    from backend.database import StatusHistory
+    from backend.services.lab_queue import FINISHED_STATUSES
+    from backend.services.lab_results import record_observations
+    from backend.services.state_machine import TRANSITIONS, normalize_status, transition_error
+
+    ops = req.operations
+    for op in ops:
+        op.new_status = normalize_status(op.new_status)
+    if not ops:
+        raise HTTPException(status_code=400, detail="No operations given")
+    if len(ops) > MAX_BULK_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_OPERATIONS} operations per request")
+
+    # 1. Current state of every item: one SELECT per item type
+    current = {}
+    appt_ids = {op.item_id for op in ops if op.item_type == "appointment"}
+    rx_ids = {op.item_id for op in ops if op.item_type == "prescription"}
+    if appt_ids:
+        rows = (await db.execute(select(
+            Appointment.id, Appointment.status, Appointment.type, Appointment.doctor_id, Appointment.appointment_time,
+            Appointment.patient_id
+        ).where(Appointment.id.in_(appt_ids)))).all()
+        current.update({("appointment", row.id): row for row in rows})
+    if rx_ids:
+        rows = (await db.execute(select(Prescription.id, Prescription.status).where(Prescription.id.in_(rx_ids)))).all()
+        current.update({("prescription", row.id): row for row in rows})
+
+    # 2. Validate everything before writing anything
+    errors, seen, plans = [], set(), []
+    for index, op in enumerate(ops):
+        key = (op.item_type, op.item_id)
+        row = current.get(key)
+        new_time = None
+        if op.item_type not in TRANSITIONS:
+            error = f"unknown item type '{op.item_type}'"
+        elif key in seen:
+            error = "listed more than once"
+        elif row is None:
+            error = f"{op.item_type} not found"
+        else:
+            error = transition_error(op.item_type, row.status, op.new_status)
+        if not error and op.item_type == "prescription" and (op.new_result or op.new_date or op.new_time):
+            error = "prescriptions take no result or new time"
+        if not error and op.new_status == "rescheduled":
+            try:
+                new_time = datetime.strptime(f"{op.new_date} {op.new_time}", "%Y-%m-%d %H:%M")
+            except (TypeError, ValueError):
+                error = "rescheduling needs new_date (YYYY-MM-DD) and new_time (HH:MM)"
+        seen.add(key)
+        if error:
+            errors.append({"index": index, "item_type": op.item_type, "item_id": op.item_id, "error": error})
+        elif row.status != op.new_status or op.new_result or new_time:
+            plans.append((op, row, new_time))
+    if errors:
+        raise HTTPException(status_code=409, detail={"message": "No changes were applied", "errors": errors})
+
+    # 3. Write: plain status moves grouped into one UPDATE each; results and reschedules
+    #    carry per-row values. "AND status = <what we read>" catches concurrent edits.
+    models = {"appointment": Appointment, "prescription": Prescription}
+    groups, singles, deltas = {}, [], {}
+    for op, row, new_time in plans:
+        if op.new_result or new_time:
+            singles.append((op, row, new_time))
+        else:
+            groups.setdefault((op.item_type, row.status, op.new_status), []).append(op.item_id)
+        if op.item_type == "appointment":
+            old_key, new_key = counter_key("appointments", row.type, row.status), counter_key("appointments", row.type, op.new_status)
+        else:
+            old_key, new_key = counter_key("prescriptions", row.status), counter_key("prescriptions", op.new_status)
+        deltas[old_key] = deltas.get(old_key, 0) - 1
+        deltas[new_key] = deltas.get(new_key, 0) + 1
+
+    changed_at, finished_at = datetime.utcnow(), datetime.now()
+
+    def finished(item_type, new_status):
+        # Keep the first finish time, so ready -> completed does not stretch the turnaround
+        if item_type == "appointment" and new_status in FINISHED_STATUSES:
+            return {"completed_at": func.coalesce(Appointment.completed_at, finished_at)}
+        return {}
+
+    try:
+        for (item_type, old_status, new_status), ids in groups.items():
+            model = models[item_type]
+            result = await db.execute(
+                update(model)
+                .where(model.id.in_(ids), model.status == old_status)
+                .values(status=new_status, version=model.version + 1, **finished(item_type, new_status))
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != len(ids):
+                raise BulkConflict()
+        for op, row, new_time in singles:
+            values = {"status": op.new_status, "version": Appointment.version + 1, **finished(op.item_type, op.new_status)}
+            if op.new_result:
+                values["lab_result"] = op.new_result
+            if new_time:
+                values["appointment_time"] = new_time
+            result = await db.execute(
+                update(Appointment)
+                .where(Appointment.id == op.item_id, Appointment.status == row.status)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                raise BulkConflict()
+        # Bulk UPDATEs bypass the ORM flush hook, so move the counters here, same transaction
+        await db.run_sync(lambda session: apply_deltas(session.connection(), deltas))
+        history = [
+            {
+                "item_type": op.item_type, "item_id": op.item_id, "from_status": row.status, "to_status": op.new_status,
+                "changed_at": changed_at, "note": f"rescheduled to {new_time:%Y-%m-%d %H:%M}" if new_time else None,
+            }
+            for op, row, new_time in plans if row.status != op.new_status or new_time
+        ]
+        if history:
+            await db.execute(insert(StatusHistory), history)
+        await record_observations(db, [
+            (op.item_id, row.patient_id, op.new_result, new_time or row.appointment_time)
+            for op, row, new_time in singles if op.new_result
+        ])
+        await db.commit()
+    except BulkConflict:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Some items were changed by someone else. Please refresh.")
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="A reschedule or reactivation hits a slot that is already booked")
+
+    # 4. Caches and one aggregated realtime message
+    moved = {}
+    for op, row, new_time in plans:
+        if op.item_type == "appointment":
+            new_at = new_time or row.appointment_time
+            availability_engine.apply_change(row.doctor_id, row.appointment_time, row.status, new_at, op.new_status)
+            moved[op.item_id] = new_at != row.appointment_time
+    changed_appts = [op.item_id for op, _, _ in plans if op.item_type == "appointment"]
+    changed_rx = [op.item_id for op, _, _ in plans if op.item_type == "prescription"]
+    deltas_out = []
+    if changed_appts:
+        deltas_out += [
+            ("rescheduled" if moved[record["id"]] else "status_changed", "appointment", record)
+            for record in await load_appointments(db, changed_appts)
+        ]
+    if changed_rx:
+        deltas_out += [("prescription_status", "prescription", record) for record in await load_prescriptions(db, changed_rx)]
+    if deltas_out:
+        await manager.publish_many(deltas_out)
+
+    logger.info("Admin bulk update: %d changed, %d already in place", len(plans), len(ops) - len(plans))
+    return {"updated": len(plans), "unchanged": len(ops) - len(plans)}
+
 @router.get("/patients")
-def get_all_patients(db: Session = Depends(get_db)):
+async def get_all_patients(db: AsyncSession = Depends(get_async_db)):
     from backend.database import User
-    patients = db.query(User).filter(User.role == "patient").all()
+    rows = (await db.execute(select(User.id, User.full_name, User.phone).where(User.role == "patient"))).all()
     # Map to id, name, phone for frontend selection
-    return [{"id": p.id, "full_name": p.full_name, "phone": p.phone} for p in patients]
+    return [{"id": p.id, "full_name": p.full_name, "phone": p.phone} for p in rows]
+
+async def get_or_create_patient(db: AsyncSession, name: str, phone: str):
+    """
+    Finds a walk-in patient by phone (creating a profile if needed) and keeps the name current.
+    """
+    from backend.database import User
+    patient = (await db.execute(
+        select(User).where(User.phone == phone, User.role == "patient").limit(1)
+    )).scalar_one_or_none()
+    if not patient:
+        # Create a new patient profile
+        patient = User(
+            full_name=name,
+            phone=phone,
+            role="patient",
+            email=f"{phone}@temp.com", # Mock email, just to satisfy unique constraint
+            hashed_password="mock" 
+        )
+        db.add(patient)
+        await db.commit()
+    elif patient.full_name != name:
+        # Update name if it changed
+        patient.full_name = name
+        await db.commit()
+    return patient
 
 @router.post("/book_appointment")
-async def admin_book_appointment(req: AdminAppointmentRequest, db: Session = Depends(get_db)):
-    from backend.database import User, AppointmentStatus
+async def admin_book_appointment(req: AdminAppointmentRequest, db: AsyncSession = Depends(get_async_db)):
+    from backend.database import AppointmentStatus
     try:
-        # Check if patient exists by phone
-        patient = db.query(User).filter(User.phone == req.patient_phone, User.role == "patient").first()
-        if not patient:
-            # Create a new patient profile
-            patient = User(
-                full_name=req.patient_name,
-                phone=req.patient_phone,
-                role="patient",
-                email=f"{req.patient_phone}@temp.com", # Mock email, just to satisfy unique constraint
-                hashed_password="mock" 
-            )
-            db.add(patient)
-            db.commit()
-            db.refresh(patient)
-        else:
-            # Update name if it changed
-            if patient.full_name != req.patient_name:
-                patient.full_name = req.patient_name
-                db.commit()
+        patient = await get_or_create_patient(db, req.patient_name, req.patient_phone)
 
         # Parse the appointment time
         appt_dt = datetime.strptime(f"{req.date_str} {req.time_slot}", "%Y-%m-%d %H:%M")
@@ -167,42 +502,32 @@ async def admin_book_appointment(req: AdminAppointmentRequest, db: Session = Dep
             status=AppointmentStatus.PENDING
         )
         db.add(new_appt)
-        db.commit()
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            availability_engine.mark_booked(req.doctor_id, appt_dt)
+            raise HTTPException(status_code=409, detail="This slot is already booked for the selected doctor")
+        availability_engine.mark_booked(req.doctor_id, appt_dt)
 
         # Try to broadcast event
         try:
-            await manager.broadcast(f"New Appointment #{new_appt.id} booked by Admin")
+            await manager.appointment_event("created", await load_appointment(db, new_appt.id))
         except:
             pass
             
         return {"message": "Booking Successful"}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error booking admin appt: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/book_lab")
-async def admin_book_lab(req: AdminLabRequest, db: Session = Depends(get_db)):
-    from backend.database import User, AppointmentStatus
+async def admin_book_lab(req: AdminLabRequest, db: AsyncSession = Depends(get_async_db)):
+    from backend.database import AppointmentStatus
     try:
-        # Check if patient exists by phone
-        patient = db.query(User).filter(User.phone == req.patient_phone, User.role == "patient").first()
-        if not patient:
-            # Create a new patient profile
-            patient = User(
-                full_name=req.patient_name,
-                phone=req.patient_phone,
-                role="patient",
-                email=f"{req.patient_phone}@temp.com", # Mock email
-                hashed_password="mock" 
-            )
-            db.add(patient)
-            db.commit()
-            db.refresh(patient)
-        else:
-            # Update name if it changed
-            if patient.full_name != req.patient_name:
-                patient.full_name = req.patient_name
-                db.commit()
+        patient = await get_or_create_patient(db, req.patient_name, req.patient_phone)
 
         # Create Lab Appointment
         new_appt = Appointment(
@@ -211,11 +536,16 @@ async def admin_book_lab(req: AdminLabRequest, db: Session = Depends(get_db)):
             appointment_time=datetime.now(),
             type="lab_test",
             doctor_name=req.test_name, # Storing the requested test in doctor_name for now
-            status=AppointmentStatus.PENDING
+            status=AppointmentStatus.READY if req.result else AppointmentStatus.PENDING,
+            lab_result=req.result
         )
         db.add(new_appt)
-        db.commit()
-        db.refresh(new_appt)
+        if req.result:
+            from backend.services.lab_results import record_observations
+            await db.flush()
+            await record_observations(db, [(new_appt.id, patient.id, req.result, new_appt.appointment_time)])
+        await db.commit()
+        await manager.appointment_event("created", await load_appointment(db, new_appt.id))
 
         return {"message": "Lab Request Booked", "id": new_appt.id}
     except Exception as e:
@@ -225,10 +555,10 @@ async def admin_book_lab(req: AdminLabRequest, db: Session = Depends(get_db)):
 # --- USER MANAGEMENT ENDPOINTS ---
 
 @router.get("/users")
-def get_all_users(db: Session = Depends(get_db)):
+async def get_all_users(db: AsyncSession = Depends(get_async_db)):
     from backend.database import User
     # Return all staff users (not patients)
-    users = db.query(User).filter(User.role != "patient").all()
+    users = (await db.execute(select(User).where(User.role != "patient"))).scalars().all()
     return [{
         "id": u.id,
         "full_name": u.full_name,
@@ -240,10 +570,10 @@ def get_all_users(db: Session = Depends(get_db)):
     } for u in users]
 
 @router.post("/users")
-def create_admin_user(req: AdminUserCreateRequest, db: Session = Depends(get_db)):
+async def create_admin_user(req: AdminUserCreateRequest, db: AsyncSession = Depends(get_async_db)):
     from backend.database import User
     # Verify email uniqueness
-    existing_user = db.query(User).filter(User.email == req.email).first()
+    existing_user = (await db.execute(select(User.id).where(User.email == req.email))).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
         
@@ -257,47 +587,48 @@ def create_admin_user(req: AdminUserCreateRequest, db: Session = Depends(get_db)
         is_active=True
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     return {"message": "User created successfully", "id": new_user.id}
 
 @router.put("/users/{user_id}/status")
-def update_user_status(user_id: int, req: AdminUserStatusRequest, db: Session = Depends(get_db)):
+async def update_user_status(user_id: int, req: AdminUserStatusRequest, db: AsyncSession = Depends(get_async_db)):
     from backend.database import User
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
         
     user.is_active = req.is_active
-    db.commit()
+    await db.commit()
     return {"message": "User status updated successfully", "is_active": user.is_active}
 
 @router.post("/users/{user_id}/reset_password")
-def reset_user_password(user_id: int, db: Session = Depends(get_db)):
+async def reset_user_password(user_id: int, db: AsyncSession = Depends(get_async_db)):
     from backend.database import User
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
         
     user.hashed_password = "defaultpassword" # Reset to known default
-    db.commit()
+    await db.commit()
     return {"message": "Password reset to defaultpassword successfully"}
 
 # --- ROLES & PERMISSIONS ENDPOINTS ---
 
 @router.get("/roles/permissions")
-def get_all_role_permissions(db: Session = Depends(get_db)):
+async def get_all_role_permissions(db: AsyncSession = Depends(get_async_db)):
     from backend.database import RolePermission
-    role_perms = db.query(RolePermission).all()
+    role_perms = (await db.execute(select(RolePermission.role_name, RolePermission.permissions))).all()
     return [{
         "role_name": rp.role_name,
         "permissions": rp.permissions
     } for rp in role_perms]
 
 @router.put("/roles/permissions")
-def update_role_permissions(req: RolePermissionUpdateRequest, db: Session = Depends(get_db)):
+async def update_role_permissions(req: RolePermissionUpdateRequest, db: AsyncSession = Depends(get_async_db)):
     from backend.database import RolePermission
-    role_perm = db.query(RolePermission).filter(RolePermission.role_name == req.role_name).first()
+    role_perm = (await db.execute(
+        select(RolePermission).where(RolePermission.role_name == req.role_name)
+    )).scalar_one_or_none()
     
     if not role_perm:
         # Create it if it doesn't exist
@@ -307,5 +638,5 @@ def update_role_permissions(req: RolePermissionUpdateRequest, db: Session = Depe
         # Avoid SQLAlchemy JSON mutation issues by assigning a new dictionary
         role_perm.permissions = dict(req.permissions)
         
-    db.commit()
+    await db.commit()
     return {"message": f"Permissions for {req.role_name} updated successfully"}
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from backend.database import get_db, User, UserRole
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db, User, UserRole
 from backend.security import verify_password, get_password_hash, create_access_token
 from pydantic import BaseModel
 import uuid
@@ -19,8 +21,8 @@ class RegisterRequest(BaseModel):
     phone: str = None
 
 @router.post("/register")
-def register(user_data: RegisterRequest, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+async def register(user_data: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
+    existing_user = (await db.execute(select(User.id).where(User.email == user_data.email))).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
@@ -31,21 +33,21 @@ def register(user_data: RegisterRequest, db: Session = Depends(get_db)):
     new_user = User(
         full_name=user_data.full_name,
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        # bcrypt is deliberately slow; run it in the threadpool so it never stalls the event loop
+        hashed_password=await run_in_threadpool(get_password_hash, user_data.password),
         role=UserRole.PATIENT,
         patient_uid=patient_id,
         phone=user_data.phone
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
 
     return {"message": "Registration successful", "patient_id": patient_id}
 
 @router.post("/login")
-def login(login_data: LoginRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == login_data.email).first()
-    if not user or not verify_password(login_data.password, user.hashed_password):
+async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(User).where(User.email == login_data.email).limit(1))).scalar_one_or_none()
+    if not user or not await run_in_threadpool(verify_password, login_data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     access_token = create_access_token(data={"sub": user.email, "role": user.role, "id": user.id})
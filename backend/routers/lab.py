@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.database import get_async_db
+from backend.services.lab_queue import LeaseLost, lab_queue
+from backend.services.records import load_appointment, load_appointments
+from backend.services.socket_manager import socket_manager as manager
+
+class LabClaimRequest(BaseModel):
+    technician: str
+    limit: int = 10
+
+class LabHeartbeatRequest(BaseModel):
+    technician: str
+    ids: List[int]
+
+class LabCompleteRequest(BaseModel):
+    technician: str
+    result: str
+
+router = APIRouter(prefix="/lab", tags=["Lab"])
+
+# Lab technician work queue. Claim a batch, heartbeat while working, complete each test
+# with its result. Tests whose lease runs out go back to the queue for the next claim.
+
+@router.post("/queue/claim")
+async def claim_tests(req: LabClaimRequest, db: AsyncSession = Depends(get_async_db)):
+    now = datetime.now()
+    ids = await lab_queue.claim(db, req.technician, req.limit, now)
+    await db.commit()
+    if not ids:
+        return {"items": [], "lease_expires_at": None}
+    return {
+        "items": await load_appointments(db, ids),
+        "lease_expires_at": now + timedelta(seconds=lab_queue.lease_seconds),
+    }
+
+@router.post("/queue/heartbeat")
+async def heartbeat_tests(req: LabHeartbeatRequest, db: AsyncSession = Depends(get_async_db)):
+    now = datetime.now()
+    renewed = await lab_queue.heartbeat(db, req.technician, req.ids, now)
+    await db.commit()
+    return {
+        "renewed": renewed,
+        # Reclaimed by someone else, completed, or never held: stop working on these
+        "lost": sorted(set(req.ids) - set(renewed)),
+        "lease_expires_at": now + timedelta(seconds=lab_queue.lease_seconds) if renewed else None,
+    }
+
+@router.post("/queue/{appointment_id}/complete")
+async def complete_test(appointment_id: int, req: LabCompleteRequest, db: AsyncSession = Depends(get_async_db)):
+    try:
+        await lab_queue.complete(db, req.technician, appointment_id, req.result, datetime.now())
+        await db.commit()
+    except LeaseLost:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="This test is not leased to you (the lease expired or it was completed). Claim again.")
+    await manager.appointment_event("status_changed", await load_appointment(db, appointment_id))
+    return {"message": "Result saved", "id": appointment_id}
+
+@router.get("/queue/metrics")
+async def queue_metrics(days: int = 7, db: AsyncSession = Depends(get_async_db)):
+    now = datetime.now()
+    return {
+        "since": now - timedelta(days=days),
+        "tests": await lab_queue.metrics(db, now, now - timedelta(days=days)),
+    }
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import List, Optional
 from pydantic import BaseModel
 
-from backend.database import get_db, Appointment, Prescription, User, AppointmentStatus
+from backend.database import get_async_db, Appointment, Prescription, User, AppointmentStatus
 from backend.services.ai_engine import ai_service
 from backend.services.integrations import integration_service
 from backend.services.socket_manager import socket_manager
+from backend.services.availability import availability_engine
+from backend.services.records import load_appointment, load_prescription
 from backend.security import encrypt_pii
 from backend.services.ai_engine import get_ai_response
 
@@ -55,11 +60,11 @@ def health_chat(request: ChatRequest):
 
 # --- 2. APPOINTMENT BOOKING ---
 @router.get("/doctors")
-def get_doctors(department: str = None, db: Session = Depends(get_db)):
-    query = db.query(User).filter(User.role == "doctor")
+async def get_doctors(department: str = None, db: AsyncSession = Depends(get_async_db)):
+    query = select(User.id, User.full_name, User.department).where(User.role == "doctor")
     if department:
-        query = query.filter(User.department == department)
-    doctors = query.all()
+        query = query.where(User.department == department)
+    doctors = (await db.execute(query)).all()
     
     result = []
     for doc in doctors:
@@ -73,53 +78,54 @@ def get_doctors(department: str = None, db: Session = Depends(get_db)):
 
 
 @router.get("/slots")
-def get_available_slots(doctor_id: int, date_str: str, db: Session = Depends(get_db)):
-    # 1. Define Business Hours (09:00 to 20:00)
-    slots = [
-        "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
-        "12:00", "12:30", "13:00", "13:30", "14:00", "14:30", 
-        "15:00", "15:30", "16:00", "16:30", "17:00", "17:30",
-        "18:00", "18:30", "19:00", "19:30"
-    ]
-    
-    # 2. Get Taken Slots from DB
-    existing = db.query(Appointment).filter(
-        Appointment.doctor_id == doctor_id,
-        Appointment.status != "cancelled"
-    ).all()
-    
-    booked_times = []
-    for appt in existing:
-        if appt.appointment_time.strftime("%Y-%m-%d") == date_str:
-            booked_times.append(appt.appointment_time.strftime("%H:%M"))
+async def get_available_slots(doctor_id: int, date_str: str, db: AsyncSession = Depends(get_async_db)):
+    try:
+        check_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date_str must be in YYYY-MM-DD format")
 
-    # 3. Filter Logic
-    final_slots = []
+    # Booked slots come from the per-doctor, per-day bitmap; slots already past today are dropped
+    return {"slots": await availability_engine.free_slots(db, doctor_id, check_date, now=datetime.now())}
+
+@router.get("/earliest_slots")
+async def get_earliest_slots(
+    department: str,
+    date_from: Optional[str] = None,
+    days: int = Query(7, ge=1, le=31),
+    limit: int = Query(5, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Earliest free slots across every doctor in a department (e.g. the one suggested by /chat)
     now = datetime.now()
-    
-    # Check if testing with hardcoded date from my script or actual today
-    check_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-    
-    for slot in slots:
-        # Check A: Is it already booked?
-        if slot in booked_times:
-            continue
-            
-        # Check B: Is it in the past? (Only if date is TODAY)
-        if check_date == now.date():
-            slot_dt = datetime.strptime(f"{date_str} {slot}", "%Y-%m-%d %H:%M")
-            if slot_dt < now:
-                continue # Skip past time
-        
-        final_slots.append(slot)
-    
-    return {"slots": final_slots}
+    try:
+        first_day = datetime.strptime(date_from, "%Y-%m-%d").date() if date_from else now.date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date_from must be in YYYY-MM-DD format")
+    # A past date_from searches from today (and today's slots from now on), for `days` days
+    first_day = max(first_day, now.date())
+
+    doctors = dict((await db.execute(
+        select(User.id, User.full_name).where(User.role == "doctor", User.department == department)
+    )).all())
+    if not doctors:
+        return {"department": department, "slots": []}
+
+    earliest = await availability_engine.earliest(db, list(doctors), first_day, days, limit, now=now)
+    return {
+        "department": department,
+        "slots": [{
+            "doctor_id": doctor_id,
+            "doctor_name": doctors[doctor_id],
+            "date": slot_dt.strftime("%Y-%m-%d"),
+            "time_slot": slot_dt.strftime("%H:%M")
+        } for slot_dt, doctor_id in earliest]
+    }
 
 @router.post("/book_appointment")
-async def book_appointment(req: AppointmentRequest, db: Session = Depends(get_db)):
+async def book_appointment(req: AppointmentRequest, db: AsyncSession = Depends(get_async_db)):
     # Verify Patient and Doctor exist
-    patient = db.query(User).filter(User.id == req.patient_id).first()
-    doctor = db.query(User).filter(User.id == req.doctor_id).first()
+    patient = await db.get(User, req.patient_id)
+    doctor = await db.get(User, req.doctor_id)
     
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -130,7 +136,7 @@ async def book_appointment(req: AppointmentRequest, db: Session = Depends(get_db
     appt_dt = datetime.strptime(f"{req.date_str} {req.time_slot}", "%Y-%m-%d %H:%M")
     zoom_url = None
     if req.type == "online":
-        zoom_url = integration_service.create_zoom_meeting("Doctor Consult", appt_dt)
+        zoom_url = await run_in_threadpool(integration_service.create_zoom_meeting, "Doctor Consult", appt_dt)
 
     new_appt = Appointment(
         patient_id=req.patient_id,
@@ -142,15 +148,16 @@ async def book_appointment(req: AppointmentRequest, db: Session = Depends(get_db
         symptoms_summary=req.symptoms
     )
     db.add(new_appt)
-    db.commit()
-    db.refresh(new_appt)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # uq_appointments_active_slot: someone else got this slot first
+        await db.rollback()
+        availability_engine.mark_booked(req.doctor_id, appt_dt)
+        raise HTTPException(status_code=409, detail="This slot has just been booked. Please pick another time.")
+    availability_engine.mark_booked(req.doctor_id, appt_dt)
     
-    await socket_manager.broadcast_new_appointment({
-        "id": new_appt.id,
-        "doctor_id": req.doctor_id,
-        "time": req.time_slot,
-        "patient_id": req.patient_id
-    })
+    await socket_manager.appointment_event("created", await load_appointment(db, new_appt.id))
 
     return {"message": "Booking Successful", "zoom_link": zoom_url}
 
@@ -159,10 +166,11 @@ async def book_appointment(req: AppointmentRequest, db: Session = Depends(get_db
 async def upload_prescription(
     patient_id: int = Form(...),   # <--- Converts string to int automatically
     file: UploadFile = File(...), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     contents = await file.read()
-    extracted_text = integration_service.extract_text_from_image(contents)
+    # OCR and the AI check are blocking calls; keep them off the event loop
+    extracted_text = await run_in_threadpool(integration_service.extract_text_from_image, contents)
     
     # --- STEP 1: Fast Keyword Validation (Basic "Training") ---
     medical_keywords = [
@@ -191,7 +199,7 @@ async def upload_prescription(
 
     if not is_medical:
         # Ask AI to decide
-        ai_is_medical, ai_reason = ai_service.validate_prescription(extracted_text)
+        ai_is_medical, ai_reason = await run_in_threadpool(ai_service.validate_prescription, extracted_text)
         is_medical = ai_is_medical
         reason = ai_reason
 
@@ -211,12 +219,13 @@ async def upload_prescription(
         status="preparing"
     )
     db.add(new_rx)
-    db.commit()
+    await db.commit()
+    await socket_manager.prescription_event(await load_prescription(db, new_rx.id), "created")
     
     return {"message": "Prescription Received", "extracted_preview": extracted_text or "Image received, processing..."}
 
 @router.post("/book_lab")
-def book_lab_test(req: LabRequest, db: Session = Depends(get_db)):
+async def book_lab_test(req: LabRequest, db: AsyncSession = Depends(get_async_db)):
     # specific handling for lab tests
     
     appt_time = datetime.now() + timedelta(days=1) # Fallback
@@ -236,34 +245,75 @@ def book_lab_test(req: LabRequest, db: Session = Depends(get_db)):
         status="confirmed"
     )
     db.add(new_appt)
-    db.commit()
+    await db.commit()
+    await socket_manager.appointment_event("created", await load_appointment(db, new_appt.id))
     return {"message": "Lab Test Booked", "test_name": req.test_name, "time": appt_time.strftime("%b %d, %H:%M")}
 
 # --- UPDATE: My Appointments to include Lab Tests ---
 @router.get("/my_appointments/{patient_id}")
-def get_my_appointments(patient_id: int, db: Session = Depends(get_db)):
-    appointments = db.query(Appointment).filter(Appointment.patient_id == patient_id).all()
-    results = []
-    for appt in appointments:
-        doc_name = "Lab Technician"
-        if appt.doctor_id:
-             doc = db.query(User).filter(User.id == appt.doctor_id).first()
-             if doc: doc_name = doc.full_name
-        
-        # Format for frontend
-        results.append({
-            "id": appt.id,
-            "doctor_name": doc_name,
-            "time": appt.appointment_time,
-            "zoom_link": appt.zoom_link,
-            "status": appt.status,
-            "type": appt.type # Send type so frontend knows if it's Lab or Doctor
-        })
-    return results
+async def get_my_appointments(patient_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Doctor name comes from an outer join (lab tests have no doctor), one query per request
+    rows = (await db.execute(select(
+        Appointment.id,
+        Appointment.appointment_time,
+        Appointment.zoom_link,
+        Appointment.status,
+        Appointment.type,
+        User.full_name.label("doctor_full_name")
+    ).outerjoin(User, User.id == Appointment.doctor_id).where(
+        Appointment.patient_id == patient_id
+    ))).all()
+
+    # Format for frontend
+    return [{
+        "id": row.id,
+        "doctor_name": row.doctor_full_name or "Lab Technician",
+        "time": row.appointment_time,
+        "zoom_link": row.zoom_link,
+        "status": row.status,
+        "type": row.type # Send type so frontend knows if it's Lab or Doctor
+    } for row in rows]
 
 # --- 5. GET MY PRESCRIPTIONS (For Status) ---
 @router.get("/my_prescriptions/{patient_id}")
-def get_my_prescriptions(patient_id: int, db: Session = Depends(get_db)):
-    prescriptions = db.query(Prescription).filter(Prescription.patient_id == patient_id).all()
+async def get_my_prescriptions(patient_id: int, db: AsyncSession = Depends(get_async_db)):
+    prescriptions = (await db.execute(
+        select(Prescription).where(Prescription.patient_id == patient_id)
+    )).scalars().all()
     return prescriptions
 
+
+# --- 6. LAB RESULT TRENDS (observations parsed from lab results) ---
+@router.get("/observations/{patient_id}")
+async def get_my_observations(patient_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Which analytes have readings, from the (patient_id, analyte, observed_at) index alone
+    from sqlalchemy import func
+    from backend.database import Observation
+    rows = (await db.execute(
+        select(
+            Observation.analyte,
+            func.count().label("readings"),
+            func.min(Observation.observed_at).label("first"),
+            func.max(Observation.observed_at).label("last")
+        ).where(Observation.patient_id == patient_id).group_by(Observation.analyte)
+    )).all()
+    return [{"analyte": row.analyte, "readings": row.readings, "first": row.first, "last": row.last} for row in rows]
+
+@router.get("/observations/{patient_id}/{analyte}")
+async def get_observation_trend(
+    patient_id: int,
+    analyte: str,
+    years: float = Query(5, gt=0, le=50),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    max_points: int = Query(200, ge=2, le=2000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Time series of one analyte (e.g. "hba1c", or any alias such as "A1c"), oldest first.
+    Defaults to the last `years` years; longer series are averaged into `max_points` buckets.
+    """
+    from backend.services.lab_results import trend
+    until = until or datetime.now()
+    since = since or until - timedelta(days=365 * years)
+    return await trend(db, patient_id, analyte, since, until, max_points)
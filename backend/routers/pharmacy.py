@@ -1,8 +1,21 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import List, Optional, Union
+from datetime import datetime
 import json
 import os
 from pathlib import Path
 
+from backend.database import get_async_db
+from backend.services.fulfilment import LeaseLost, fulfilment_queue
+from backend.services.inventory import OutOfStock, inventory
+from backend.services.pagination import NEXT_CURSOR_HEADER, keyset_page, page_rows
+from backend.services.records import load_orders, load_prescription, load_prescriptions
+from backend.services.search import CatalogIndex, TrigramIndex
+from backend.services.socket_manager import socket_manager as manager
+
 router = APIRouter(prefix="/pharmacy", tags=["pharmacy"])
 
 # Load mock_medicine.json at startup
@@ -21,7 +34,8 @@ def load_medicines():
         return []
 
 MEDICINES_DB = load_medicines()
-ORDERS_DB = []  # In-memory orders store
+catalog_index = CatalogIndex(MEDICINES_DB)
+fuzzy_index = TrigramIndex(MEDICINES_DB)
 
 
 def extract_pack_size(product_name: str) -> tuple[str, str]:
@@ -43,7 +57,7 @@ def extract_pack_size(product_name: str) -> tuple[str, str]:
     return product_name, ""
 
 
-def map_medicine(m: dict) -> dict:
+def map_medicine(m: dict, stock: Optional[int] = None) -> dict:
     discount = 0
     if m.get("market_price", 0) > m.get("sale_price", 0):
         discount = round(((m["market_price"] - m["sale_price"]) / m["market_price"]) * 100)
@@ -61,7 +75,7 @@ def map_medicine(m: dict) -> dict:
         "originalPrice": m.get("market_price", 0),
         "image": m.get("image_url", f"https://placehold.co/400?text={base_name}"),
         "rating": m.get("ratings", 4.0),
-        "stock": m.get("stock", 25), # Fallback stock
+        "stock": stock if stock is not None else m.get("stock", 25), # Live stock once the product has sold
         "expiryDate": m.get("expiry_date", "12/2026"), # Fallback expiry
         "discount": discount,
         "selectedWeight": pack_size or "Std",
@@ -72,58 +86,229 @@ def map_medicine(m: dict) -> dict:
 
 
 @router.get("/medicines")
-def get_medicines(
+async def get_medicines(
     search: str = Query(None),
     category: str = Query(None),
     sub_category: str = Query(None),
-    limit: int = Query(50)
+    limit: int = Query(50),
+    mode: str = Query("auto", pattern="^(prefix|fuzzy|auto)$"),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    results = MEDICINES_DB
-
-    if category:
-        results = [m for m in results if m.get("category", "").lower() == category.lower()]
-
-    if sub_category:
-        results = [m for m in results if m.get("sub_category", "").lower() == sub_category.lower()]
-
-    if search:
-        search_terms = search.lower().split()
-        results = [
-            m for m in results
-            if all(
-                any(term in m.get(field, "").lower() for field in ["product_name", "brand", "category", "sub_category"])
-                for term in search_terms
-            )
-        ]
-
-    return [map_medicine(m) for m in results[:limit]]
+    # prefix: each search term matches words starting with it, across the four text fields.
+    # fuzzy: typo-tolerant match on name and brand, best matches and ratings first.
+    # auto: prefix, falling back to fuzzy when nothing matches.
+    page = []
+    if mode != "fuzzy":
+        page = catalog_index.search(search, category=category, sub_category=sub_category, limit=limit)
+    if search and (mode == "fuzzy" or (mode == "auto" and not page)):
+        page = fuzzy_index.search(search, limit=limit, candidates=catalog_index.filtered(category, sub_category))
+    stock = await inventory.available(db, [m["index"] for m in page])
+    return [map_medicine(m, stock.get(m["index"])) for m in page]
 
 
 @router.get("/categories")
 def get_categories():
-    cats = list({m.get("category", "") for m in MEDICINES_DB if m.get("category")})
-    return sorted(cats)
+    return catalog_index.categories()
 
 
 @router.get("/subcategories")
 def get_subcategories(category: str = Query(None)):
-    if category:
-        subs = list({m.get("sub_category", "") for m in MEDICINES_DB if m.get("category", "").lower() == category.lower() and m.get("sub_category")})
-    else:
-        subs = list({m.get("sub_category", "") for m in MEDICINES_DB if m.get("sub_category")})
-    return sorted(subs)
+    return catalog_index.subcategories(category)
+
+
+def catalog_product(product_id: int) -> dict:
+    # Product ids are 1-based MEDICINES_DB positions (see load_medicines)
+    if not 1 <= product_id <= len(MEDICINES_DB):
+        raise HTTPException(status_code=400, detail=f"Unknown product {product_id}")
+    return MEDICINES_DB[product_id - 1]
+
+
+async def prepare_stock(db: AsyncSession, product_ids) -> None:
+    # Inventory rows start from the catalog's stock figure the first time a product is sold
+    await inventory.ensure(db, {pid: catalog_product(pid).get("stock", 25) for pid in set(product_ids)})
+
+
+def out_of_stock(e: OutOfStock) -> HTTPException:
+    name = catalog_product(e.product_id).get("product_name", f"product {e.product_id}")
+    return HTTPException(status_code=409, detail=f"Only {e.available} left of {name} (requested {e.requested})")
+
+
+class CartLine(BaseModel):
+    product_id: int
+    quantity: int = Field(1, ge=1)
+
+class CartReserveRequest(BaseModel):
+    cart_id: Optional[str] = None # omit to start a new hold
+    items: List[CartLine]
+
+class OrderItemRequest(BaseModel):
+    # Same keys the cart sends (baseName/packSize as produced by map_medicine)
+    product_id: int
+    product_name: str
+    baseName: Optional[str] = None
+    packSize: Optional[str] = None
+    brand: Optional[str] = None
+    image: Optional[str] = None
+    quantity: int = Field(1, ge=1)
+    price: float = 0
+
+class OrderRequest(BaseModel):
+    user_id: Optional[Union[int, str]] = None # "guest" for anonymous carts
+    user_name: Optional[str] = None
+    total_amount: Optional[float] = None
+    payment_method: Optional[str] = None
+    items: List[OrderItemRequest] = []
+    cart_id: Optional[str] = None # from /pharmacy/cart/reserve, if the cart was held at checkout
+
+
+@router.post("/cart/reserve")
+async def reserve_cart(req: CartReserveRequest, db: AsyncSession = Depends(get_async_db)):
+    # Holds stock for the cart until expires_at; calling again with the same cart_id replaces the hold
+    import uuid
+    cart_id = req.cart_id or uuid.uuid4().hex
+    lines = [(line.product_id, line.quantity) for line in req.items]
+    now = datetime.utcnow()
+    await inventory.maybe_sweep(db.bind, now)
+    await prepare_stock(db, [pid for pid, _ in lines])
+    try:
+        expires_at = await inventory.hold(db, cart_id, lines, now)
+    except OutOfStock as e:
+        await db.rollback()
+        raise out_of_stock(e)
+    await db.commit()
+    return {"cart_id": cart_id, "expires_at": expires_at, "items": [line.model_dump() for line in req.items]}
+
+
+@router.delete("/cart/{cart_id}")
+async def release_cart(cart_id: str, db: AsyncSession = Depends(get_async_db)):
+    released = await inventory.release(db, cart_id, datetime.utcnow())
+    await db.commit()
+    return {"cart_id": cart_id, "released": released}
+
+
+@router.post("/inventory/sweep")
+async def sweep_inventory(db: AsyncSession = Depends(get_async_db)):
+    # Reservations and orders already sweep every INVENTORY_SWEEP_SECONDS; this is for a cron or an admin
+    expired = await inventory.sweep(db, datetime.utcnow())
+    await db.commit()
+    return {"expired": expired}
 
 
 @router.post("/orders")
-def create_order(order_data: dict):
-    from datetime import datetime
-    import random
-    order_id = random.randint(1000, 9999)
-    order = {"id": f"ORD-RX-{order_id}", "created_at": datetime.utcnow().isoformat(), **order_data}
-    ORDERS_DB.append(order)
-    return order
+async def create_order(req: OrderRequest, db: AsyncSession = Depends(get_async_db)):
+    from sqlalchemy import insert
+    from backend.database import Order, OrderItem
+    user_id = str(req.user_id or "")
+    total = req.total_amount if req.total_amount is not None else sum(i.price * i.quantity for i in req.items)
+    lines = [(i.product_id, i.quantity) for i in req.items]
+    now = datetime.utcnow()
+    await inventory.maybe_sweep(db.bind, now)
+    await prepare_stock(db, [pid for pid, _ in lines])
+    order = Order(
+        user_id=int(user_id) if user_id.isdigit() else None,
+        user_name=req.user_name,
+        payment_method=req.payment_method,
+        total_amount=round(total, 2),
+        created_at=now,
+    )
+    db.add(order)
+    await db.flush() # id from the orders sequence
+    if req.items:
+        await db.execute(insert(OrderItem), [
+            {
+                "order_id": order.id, "product_id": i.product_id, "product_name": i.product_name,
+                "base_name": i.baseName, "pack_size": i.packSize, "brand": i.brand, "image": i.image,
+                "quantity": i.quantity, "price": i.price,
+            }
+            for i in req.items
+        ])
+    try:
+        # Stock is taken in the same transaction, so a short line cancels the whole order
+        await inventory.commit(db, order.id, lines, now, cart_id=req.cart_id)
+    except OutOfStock as e:
+        await db.rollback()
+        raise out_of_stock(e)
+    await db.commit()
+    # Every worker's fulfilment queue picks it up on its next sync
+    return (await load_orders(db, [order.id]))[0]
 
 
 @router.get("/orders/{user_id}")
-def get_orders(user_id: str):
-    return [o for o in ORDERS_DB if o.get("user_id") == user_id]
+async def get_orders(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Newest first, keyset-paginated on ix_orders_user_created_id; the next page's cursor is
+    # in the X-Next-Cursor header. Guest carts are not stored against a user.
+    from backend.database import Order
+    if not user_id.isdigit():
+        return []
+    # created_at is NOT NULL here, so this is a plain keyset query
+    query = keyset_page(select(Order).where(Order.user_id == int(user_id)), Order.created_at, Order.id, cursor, limit, descending=True)
+    orders, next_cursor = page_rows((await db.execute(query)).scalars().all(), limit, "created_at")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return await load_orders(db, orders)
+
+
+# --- Fulfilment queue (prescriptions and cart orders) ---
+
+class QueueClaimRequest(BaseModel):
+    pharmacist: str
+    limit: int = 5
+
+class QueueAdvanceRequest(BaseModel):
+    pharmacist: str
+    status: str
+
+
+async def queue_entries(db: AsyncSession, items) -> list:
+    rx = {r["id"]: r for r in await load_prescriptions(db, [i.item_id for i in items if i.kind == "prescription"])}
+    orders = {r["id"]: r for r in await load_orders(db, [i.item_id for i in items if i.kind == "order"])}
+    return [{**item.as_dict(), "record": (rx if item.kind == "prescription" else orders).get(item.item_id)} for item in items]
+
+
+@router.get("/queue")
+async def peek_queue(limit: int = Query(20, ge=1, le=200), db: AsyncSession = Depends(get_async_db)):
+    # What the next claims would get, in order, without claiming anything
+    await fulfilment_queue.sync(db, datetime.utcnow())
+    return await queue_entries(db, fulfilment_queue.peek(limit))
+
+
+@router.post("/queue/claim")
+async def claim_queue(req: QueueClaimRequest, db: AsyncSession = Depends(get_async_db)):
+    items = await fulfilment_queue.claim(db, req.pharmacist, max(1, min(req.limit, 50)), datetime.utcnow())
+    try:
+        await db.commit()
+    except Exception:
+        for item in items:
+            fulfilment_queue.release(item.key)
+        raise
+    return {"items": await queue_entries(db, items)}
+
+
+@router.post("/queue/{kind}/{item_id}/advance")
+async def advance_queue_item(kind: str, item_id: str, req: QueueAdvanceRequest, db: AsyncSession = Depends(get_async_db)):
+    from backend.services.state_machine import normalize_status
+    if kind not in ("prescription", "order") or not item_id.isdigit():
+        raise HTTPException(status_code=404, detail="Unknown queue item")
+    key = (kind, int(item_id))
+    try:
+        item = await fulfilment_queue.advance(db, req.pharmacist, key, normalize_status(req.status), datetime.utcnow())
+        await db.commit()
+    except LeaseLost:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="This item is not claimed by you (the claim expired or it was changed). Claim again.")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if kind == "prescription":
+        await manager.prescription_event(await load_prescription(db, item.item_id))
+    return {**item.as_dict()}
+
+
+@router.get("/queue/metrics")
+def queue_metrics():
+    return fulfilment_queue.metrics(datetime.utcnow())
@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import jwt
+from jose import JWTError, jwt
 import bcrypt  # Replaced passlib with direct bcrypt import
 from cryptography.fernet import Fernet
 from backend.config import settings
@@ -32,6 +32,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def decode_access_token(token: str) -> Optional[dict]:
+    """Returns the token's claims, or None if it is invalid or expired"""
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+
 # 3. Encryption Helpers
 def encrypt_pii(data: str) -> str:
     """Encrypts text before saving to DB"""
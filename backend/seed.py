@@ -0,0 +1,198 @@
+"""
+Idempotent seeding for demo/dev databases.
+
+Each step runs once per database and is recorded in the bootstrap_state table, so app
+workers never repeat it: startup only reads which steps are still pending.
+
+CLI:
+    python -m backend.seed            # run pending steps
+    python -m backend.seed --force    # re-run every step (e.g. to reset staff passwords)
+"""
+import sys
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from backend.database import (
+    SessionLocal, User, UserRole, Appointment, Prescription, RolePermission, BootstrapState
+)
+
+def seed_demo_data(db: Session):
+    # 1. Ensure Doctors for ALL departments
+    target_depts = ["Cardiology", "Neurology", "Orthopedics", "General", "Gastroenterology", "Pediatrics", "Dermatology"]
+    for dept in target_depts:
+        count = db.query(User).filter(User.role == "doctor", User.department == dept).count()
+        if count == 0:
+            print(f" Seeding default doctor for {dept}...")
+            doc = User(
+                full_name=f"Dr. {dept} Specialist",
+                email=f"doc.{dept.lower()}@medicare.com",
+                role=UserRole.DOCTOR,
+                department=dept,
+                hashed_password="mock_password"
+            )
+            db.add(doc)
+    db.commit()
+
+    # 1b. Seed default Role Permissions
+    permissions_count = db.query(RolePermission).count()
+    if permissions_count == 0:
+        print(" Seeding Default Role Permissions...")
+        # Default permissions structure
+        default_perms = [
+            {"role": UserRole.ADMIN, "perms": {"manage_users": True, "manage_roles": True, "manage_appointments": True, "manage_lab": True, "manage_pharmacy": True, "manage_inventory": True}},
+            {"role": UserRole.DOCTOR, "perms": {"manage_users": False, "manage_roles": False, "manage_appointments": True, "manage_lab": False, "manage_pharmacy": False, "manage_inventory": False}},
+            {"role": UserRole.LAB, "perms": {"manage_users": False, "manage_roles": False, "manage_appointments": False, "manage_lab": True, "manage_pharmacy": False, "manage_inventory": False}},
+            {"role": UserRole.PHARMACIST, "perms": {"manage_users": False, "manage_roles": False, "manage_appointments": False, "manage_lab": False, "manage_pharmacy": True, "manage_inventory": True}}
+        ]
+        for p in default_perms:
+            db.add(RolePermission(role_name=p["role"], permissions=p["perms"]))
+        db.commit()
+
+    # 2. Create Mock Patients if none
+    patient_count = db.query(User).filter(User.role == "patient").count()
+    patients = []
+    if patient_count == 0:
+        print("Seeding Mock Patients...")
+        patients_data = [
+            {"name": "Alice Smith", "phone": "9876543210", "email": "alice@example.com"},
+            {"name": "John Doe", "phone": "8877665544", "email": "john@example.com"},
+            {"name": "Sarah Miller", "phone": "7766554433", "email": "sarah@example.com"}
+        ]
+        for p_data in patients_data:
+            p = User(
+                full_name=p_data["name"],
+                phone=p_data["phone"],
+                email=p_data["email"],
+                role=UserRole.PATIENT,
+                hashed_password="mock_password"
+            )
+            db.add(p)
+            patients.append(p)
+        db.commit()
+        for p in patients: db.refresh(p)
+    else:
+        patients = db.query(User).filter(User.role == "patient").all()
+    
+    # 3. Add Mock Appointments if none
+    appt_count = db.query(Appointment).count()
+    if appt_count == 0 and patients:
+        print("Seeding Mock Appointments...")
+        appointments_data = [
+            {"name": "Complete Blood Count (CBC)", "type": "lab_test", "status": "pending"},
+            {"name": "Lipid Profile", "type": "lab_test", "status": "processing"},
+            {"name": "Diabetes Screen (HbA1c)", "type": "lab_test", "status": "ready", "result": "HbA1c: 5.8% (Pre-diabetic)"},
+            {"name": "General Consultation", "type": "clinic", "status": "pending"},
+            {"name": "Cardiology Follow-up", "type": "clinic", "status": "confirmed"}
+        ]
+        for idx, appt_data in enumerate(appointments_data):
+            appt = Appointment(
+                patient_id=patients[idx % len(patients)].id,
+                appointment_time=datetime.now(),
+                type=appt_data["type"],
+                doctor_name=appt_data["name"],
+                status=appt_data["status"],
+                lab_result=appt_data.get("result")
+            )
+            db.add(appt)
+        db.commit()
+
+    # 4. Add Mock Pharmacy Orders if none
+    rx_count = db.query(Prescription).count()
+    if rx_count == 0 and patients:
+        print("Seeding Mock Pharmacy Orders...")
+        pharmacy_orders = [
+            {"data": "Amoxicillin 500mg - 1x Daily\nParacetamol - SOS", "status": "preparing"},
+            {"data": "Vitamin C - 1x Daily\nZinc Supplements", "status": "ready"},
+            {"data": "Lisinopril 10mg\nAtorvastatin 20mg", "status": "processing"}
+        ]
+        for idx, order in enumerate(pharmacy_orders):
+            p_order = Prescription(
+                patient_id=patients[idx % len(patients)].id,
+                extracted_data=order["data"],
+                status=order["status"],
+                created_at=datetime.utcnow()
+            )
+            db.add(p_order)
+        db.commit()
+
+def seed_staff_logins(db: Session):
+    # Real bcrypt hashes for the shared demo staff accounts (this is the slow part)
+    from backend.security import get_password_hash
+
+    def upsert_user(email, role, raw_pass, dept=None, name='Test Staff'):
+        u = db.query(User).filter(User.email == email).first()
+        if not u:
+            u = User(email=email, role=role, full_name=name)
+            if dept: u.department = dept
+            db.add(u)
+        u.hashed_password = get_password_hash(raw_pass)
+        return u
+
+    upsert_user('doc.cardiology@medicare.com', UserRole.DOCTOR, 'doctor123', 'Cardiology', 'Dr. Cardio')
+    upsert_user('doc.neurology@medicare.com', UserRole.DOCTOR, 'doctor123', 'Neurology', 'Dr. Neuro')
+    upsert_user('doc.orthopedics@medicare.com', UserRole.DOCTOR, 'doctor123', 'Orthopedics', 'Dr. Ortho')
+    upsert_user('doc.general@medicare.com', UserRole.DOCTOR, 'doctor123', 'General', 'Dr. General')
+    upsert_user('doc.gastroenterology@medicare.com', UserRole.DOCTOR, 'doctor123', 'Gastroenterology', 'Dr. Gastro')
+    upsert_user('doc.pediatrics@medicare.com', UserRole.DOCTOR, 'doctor123', 'Pediatrics', 'Dr. Peds')
+    upsert_user('doc.dermatology@medicare.com', UserRole.DOCTOR, 'doctor123', 'Dermatology', 'Dr. Derm')
+    upsert_user('lab@medicare.com', UserRole.LAB, 'lab123', name='Lab Tech')
+    upsert_user('pharmacy@medicare.com', UserRole.PHARMACIST, '12345', name='Pharmacist')
+
+    # Also patch any generic ones left over
+    users = db.query(User).filter(User.hashed_password == "mock_password").all()
+    if users:
+        for user in users:
+            if user.role == "doctor": user.hashed_password = get_password_hash("doctor123")
+            elif user.role == "lab_technician": user.hashed_password = get_password_hash("lab123")
+            elif user.role == "pharmacist": user.hashed_password = get_password_hash("12345")
+            elif user.role == "admin": user.hashed_password = get_password_hash("admin123")
+    db.commit()
+
+SEED_STEPS: List[Tuple[str, Callable[[Session], None]]] = [
+    ("demo_data", seed_demo_data),
+    ("staff_logins", seed_staff_logins),
+]
+
+def pending_steps(session_factory=SessionLocal) -> List[str]:
+    """
+    Names of seed steps not yet recorded for this database. One small SELECT.
+    """
+    db = session_factory()
+    try:
+        done = {key for (key,) in db.query(BootstrapState.key).all()}
+    finally:
+        db.close()
+    return [name for name, _ in SEED_STEPS if name not in done]
+
+def run_seed(force: bool = False, session_factory=SessionLocal) -> List[str]:
+    """
+    Runs pending (or, with force, all) seed steps. Returns the names that ran.
+    """
+    todo = {name for name, _ in SEED_STEPS} if force else set(pending_steps(session_factory))
+    ran = []
+    for name, step in SEED_STEPS:
+        if name not in todo:
+            continue
+        db = session_factory()
+        try:
+            print(f" Seeding: {name}...")
+            step(db)
+            state = db.get(BootstrapState, name) or BootstrapState(key=name)
+            state.completed_at = datetime.utcnow()
+            db.add(state)
+            db.commit()
+            ran.append(name)
+        except Exception as e:
+            print(f" Seeding Failed ({name}): {e}")
+            db.rollback()
+        finally:
+            db.close()
+    return ran
+
+if __name__ == "__main__":
+    from backend.migrations import upgrade
+    upgrade()
+    ran = run_seed(force="--force" in sys.argv)
+    print(f" Seed steps run: {', '.join(ran) or 'none (already seeded)'}")
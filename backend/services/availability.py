@@ -0,0 +1,204 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.database import Appointment, AppointmentStatus
+
+# --- Business Hours (09:00 to 20:00, 30 minute slots) ---
+SLOT_TIMES = [
+    "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
+    "12:00", "12:30", "13:00", "13:30", "14:00", "14:30",
+    "15:00", "15:30", "16:00", "16:30", "17:00", "17:30",
+    "18:00", "18:30", "19:00", "19:30"
+]
+SLOT_INDEX = {slot: i for i, slot in enumerate(SLOT_TIMES)}
+# Minutes since midnight for each slot, used for the "already in the past" check
+SLOT_MINUTES = [int(s[:2]) * 60 + int(s[3:]) for s in SLOT_TIMES]
+
+def is_active(status: Optional[str]) -> bool:
+    """
+    Every appointment except a cancelled one holds its slot.
+    """
+    return (status or "").lower() != AppointmentStatus.CANCELLED.value
+
+def slot_bit(when: datetime) -> int:
+    """
+    Bit for the slot starting at `when`, or 0 if it is off the business-hours grid.
+    """
+    index = SLOT_INDEX.get(when.strftime("%H:%M"))
+    return 0 if index is None else 1 << index
+
+
+class AvailabilityEngine:
+    """
+    Keeps a 22-bit "booked" mask per (doctor, day). A lookup is a dict hit; a miss costs one
+    range query on ix_appointments_doctor_time_status that only touches that single day.
+
+    Bookings, cancellations and reschedules in this process flip bits directly. Entries also
+    expire after `ttl_seconds` so that writes made by other workers are picked up.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._days: "OrderedDict[Tuple[int, date], Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- Reads ---
+    async def booked_mask(self, db: AsyncSession, doctor_id: int, day: date) -> int:
+        cached = self._cached(doctor_id, day)
+        if cached is not None:
+            return cached
+
+        start = datetime.combine(day, datetime.min.time())
+        rows = (await db.execute(
+            select(Appointment.appointment_time, Appointment.status).where(
+                Appointment.doctor_id == doctor_id,
+                Appointment.appointment_time >= start,
+                Appointment.appointment_time < start + timedelta(days=1)
+            )
+        )).all()
+
+        mask = 0
+        for appointment_time, status in rows:
+            if is_active(status):
+                mask |= slot_bit(appointment_time)
+        self._store((doctor_id, day), mask)
+        return mask
+
+    async def free_slots(self, db: AsyncSession, doctor_id: int, day: date, now: Optional[datetime] = None) -> List[str]:
+        return self.free_from_mask(await self.booked_mask(db, doctor_id, day), day, now)
+
+    @staticmethod
+    def free_from_mask(mask: int, day: date, now: Optional[datetime] = None) -> List[str]:
+        # Slots that already started (today's, and any past day's) are not offered
+        cutoff = -1
+        if now is not None and day < now.date():
+            return []
+        if now is not None and day == now.date():
+            cutoff = now.hour * 60 + now.minute
+        return [
+            slot for i, slot in enumerate(SLOT_TIMES)
+            if not mask & (1 << i) and SLOT_MINUTES[i] > cutoff
+        ]
+
+    async def warm(self, db: AsyncSession, doctor_ids: Sequence[int], first_day: date, days: int) -> Dict[Tuple[int, date], int]:
+        """
+        Returns the masks for every (doctor, day) in the window. Whatever is missing from the
+        cache is loaded with a single range query, instead of one query per doctor per day.
+        """
+        window = [first_day + timedelta(days=i) for i in range(days)]
+        masks, missing = {}, set()
+        for doctor_id in doctor_ids:
+            for day in window:
+                cached = self._cached(doctor_id, day)
+                if cached is None:
+                    missing.add(doctor_id)
+                else:
+                    masks[(doctor_id, day)] = cached
+        if not missing:
+            return masks
+
+        start = datetime.combine(first_day, datetime.min.time())
+        rows = (await db.execute(
+            select(Appointment.doctor_id, Appointment.appointment_time, Appointment.status).where(
+                Appointment.doctor_id.in_(missing),
+                Appointment.appointment_time >= start,
+                Appointment.appointment_time < start + timedelta(days=days)
+            )
+        )).all()
+
+        loaded = {(doctor_id, day): 0 for doctor_id in missing for day in window}
+        for doctor_id, appointment_time, status in rows:
+            if is_active(status):
+                loaded[(doctor_id, appointment_time.date())] |= slot_bit(appointment_time)
+        for key, mask in loaded.items():
+            self._store(key, mask)
+        masks.update(loaded)
+        return masks
+
+    async def earliest(self, db: AsyncSession, doctor_ids: Sequence[int], first_day: date, days: int,
+                       limit: int, now: Optional[datetime] = None) -> List[Tuple[datetime, int]]:
+        """
+        The `limit` earliest free (slot start, doctor_id) pairs across all given doctors.
+        Each doctor contributes an already-sorted stream of free slots; heapq.merge pulls
+        from them lazily, so only as many slots as requested are ever materialised.
+        """
+        masks = await self.warm(db, doctor_ids, first_day, days)
+        streams = [self._free_stream(masks, doctor_id, first_day, days, now) for doctor_id in doctor_ids]
+        return list(islice(heapq.merge(*streams), limit))
+
+    def _free_stream(self, masks: Dict[Tuple[int, date], int], doctor_id: int, first_day: date, days: int,
+                     now: Optional[datetime]) -> Iterator[Tuple[datetime, int]]:
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            for slot in self.free_from_mask(masks[(doctor_id, day)], day, now):
+                yield datetime.strptime(f"{day} {slot}", "%Y-%m-%d %H:%M"), doctor_id
+
+    # --- Writes (call after the DB commit succeeded) ---
+    def mark_booked(self, doctor_id: Optional[int], when: Optional[datetime]):
+        self._flip(doctor_id, when, booked=True)
+
+    def mark_released(self, doctor_id: Optional[int], when: Optional[datetime]):
+        self._flip(doctor_id, when, booked=False)
+
+    def apply_change(self, doctor_id: Optional[int], old_time: Optional[datetime], old_status: Optional[str],
+                     new_time: Optional[datetime], new_status: Optional[str]):
+        """
+        Mirrors a status change and/or reschedule of one appointment into the bitmaps.
+        """
+        if old_time == new_time and is_active(old_status) == is_active(new_status):
+            return
+        if is_active(old_status):
+            self.mark_released(doctor_id, old_time)
+        if is_active(new_status):
+            self.mark_booked(doctor_id, new_time)
+
+    def invalidate(self, doctor_id: Optional[int] = None):
+        with self._lock:
+            if doctor_id is None:
+                self._days.clear()
+            else:
+                for key in [k for k in self._days if k[0] == doctor_id]:
+                    del self._days[key]
+
+    # --- Internals ---
+    def _cached(self, doctor_id: int, day: date) -> Optional[int]:
+        key = (doctor_id, day)
+        with self._lock:
+            cached = self._days.get(key)
+            if cached and time.monotonic() - cached[1] < self.ttl_seconds:
+                self._days.move_to_end(key)
+                return cached[0]
+        return None
+
+    def _flip(self, doctor_id, when, booked: bool):
+        if doctor_id is None or when is None:
+            return
+        bit = slot_bit(when)
+        if not bit:
+            return
+        key = (doctor_id, when.date())
+        with self._lock:
+            cached = self._days.get(key)
+            if cached is None:
+                # Not loaded yet; the next lookup reads the committed row anyway
+                return
+            mask = cached[0] | bit if booked else cached[0] & ~bit
+            self._days[key] = (mask, cached[1])
+
+    def _store(self, key, mask: int):
+        with self._lock:
+            self._days[key] = (mask, time.monotonic())
+            self._days.move_to_end(key)
+            while len(self._days) > self.max_entries:
+                self._days.popitem(last=False)
+
+availability_engine = AvailabilityEngine()
@@ -0,0 +1,148 @@
+import enum
+from collections import Counter
+from typing import Dict, Iterable, Mapping, Optional
+
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from backend.database import Appointment, Prescription, StatCounter, User
+
+# Row counts kept in stat_counters, moved in the same transaction as the write that changes
+# them, so reading the totals is one small SELECT instead of COUNT(*) over every table.
+# Keys are "<group>" (table total) and "<group>:<value>[:<value>]" per tracked column value,
+# e.g. "appointments:lab_test:pending" or "prescriptions:ready".
+TRACKED = {
+    "users": (User, ("role",)),
+    "appointments": (Appointment, ("type", "status")),
+    "prescriptions": (Prescription, ("status",)),
+}
+_GROUP_BY_MODEL = {model: name for name, (model, _) in TRACKED.items()}
+
+def _label(value) -> str:
+    if isinstance(value, enum.Enum):
+        value = value.value
+    return "none" if value is None else str(value)
+
+def counter_key(group: str, *values) -> str:
+    return ":".join([group, *(_label(v) for v in values)])
+
+def _keys_for(group: str, values: Iterable) -> tuple:
+    return group, counter_key(group, *values)
+
+# --- Writes ---
+
+def apply_deltas(conn: Connection, deltas: Mapping[str, int]):
+    """
+    Adds each delta to its counter with an upsert. Keys are written in sorted order so
+    concurrent transactions take row locks in the same order (no deadlocks on Postgres).
+    Use this directly after bulk UPDATE/DELETE statements that bypass the ORM.
+    """
+    rows = [{"key": key, "value": delta} for key, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    insert = pg_insert if conn.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(StatCounter.__table__)
+    conn.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[StatCounter.key],
+            set_={"value": StatCounter.value + stmt.excluded.value},
+        ),
+        rows,
+    )
+
+def rebuild(conn: Connection, groups: Optional[Iterable[str]] = None):
+    """
+    Recomputes counters from GROUP BY queries. Needed after writes that bypass the ORM
+    (raw SQL in migrations) or when an old value was not loaded at flush time.
+    """
+    for group in groups or TRACKED:
+        model, columns = TRACKED[group]
+        cols = [getattr(model, c) for c in columns]
+        grouped = conn.execute(select(*cols, func.count()).group_by(*cols)).all()
+
+        counts = {group: 0}
+        for *values, count in grouped:
+            counts[counter_key(group, *values)] = count
+            counts[group] += count
+
+        conn.execute(delete(StatCounter).where((StatCounter.key == group) | StatCounter.key.like(f"{group}:%")))
+        conn.execute(StatCounter.__table__.insert(), [{"key": k, "value": v} for k, v in counts.items()])
+
+def _old_values(obj, columns) -> Optional[tuple]:
+    state = inspect(obj)
+    values = []
+    for column in columns:
+        history = state.attrs[column].history
+        if history.deleted:
+            values.append(history.deleted[0])
+        elif history.added or column in state.unloaded:
+            # Changed (or deleted) without the previous value ever being loaded
+            return None
+        else:
+            values.append(getattr(obj, column))
+    return tuple(values)
+
+@event.listens_for(Session, "after_flush")
+def _count_flush(session: Session, flush_context):
+    # Runs for sync sessions and for the sync session behind every AsyncSession.
+    # Attribute history still holds the pre-flush values here.
+    deltas = Counter()
+    stale = set()
+
+    for obj in session.new:
+        group = _GROUP_BY_MODEL.get(type(obj))
+        if group:
+            _, columns = TRACKED[group]
+            for key in _keys_for(group, (getattr(obj, c) for c in columns)):
+                deltas[key] += 1
+
+    for obj in session.deleted:
+        group = _GROUP_BY_MODEL.get(type(obj))
+        if group:
+            _, columns = TRACKED[group]
+            old = _old_values(obj, columns)
+            if old is None:
+                stale.add(group)
+                continue
+            for key in _keys_for(group, old):
+                deltas[key] -= 1
+
+    for obj in session.dirty:
+        group = _GROUP_BY_MODEL.get(type(obj))
+        if not group:
+            continue
+        _, columns = TRACKED[group]
+        state = inspect(obj)
+        if not any(state.attrs[c].history.added for c in columns):
+            continue
+        old = _old_values(obj, columns)
+        if old is None:
+            stale.add(group)
+            continue
+        new = tuple(getattr(obj, c) for c in columns)
+        old_key, new_key = counter_key(group, *old), counter_key(group, *new)
+        if old_key != new_key:
+            deltas[old_key] -= 1
+            deltas[new_key] += 1
+
+    if not deltas and not stale:
+        return
+    conn = session.connection()
+    apply_deltas(conn, {k: v for k, v in deltas.items() if k.split(":", 1)[0] not in stale})
+    if stale:
+        rebuild(conn, stale)
+
+# --- Reads ---
+
+async def read_counters(db: AsyncSession, prefix: Optional[str] = None) -> Dict[str, int]:
+    stmt = select(StatCounter.key, StatCounter.value)
+    if prefix:
+        stmt = stmt.where((StatCounter.key == prefix) | StatCounter.key.like(f"{prefix}:%"))
+    return {key: value for key, value in (await db.execute(stmt)).all()}
+
+def totals(counters: Mapping[str, int]) -> Dict[str, int]:
+    return {group: counters.get(group, 0) for group in TRACKED}
@@ -0,0 +1,129 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+import socketio
+from engineio import packet as eio_packet
+from socketio import packet
+
+# Two guards on the realtime path for bursts (e.g. the lab closing a batch of 300 tests):
+#  - EmissionScheduler coalesces deltas inside a short window and sends each run of deltas
+#    for the same target rooms as one "delta_batch" message, in seq order, keeping only the
+#    newest version of each record.
+#  - BoundedSendServer caps how many packets may wait in any one client's send queue; a
+#    slow consumer past the mark stops receiving deltas and is told to resync instead.
+
+BATCH_EVENT = "delta_batch"
+SNAPSHOT_EVENT = "snapshot_required"
+
+class EmissionScheduler:
+    def __init__(self, emit: Callable[..., Awaitable], window: float = 0.075):
+        """
+        emit(event, data, to=rooms) does the actual send; window is in seconds, and 0 sends
+        every delta straight away (still as a batch of one).
+        """
+        self._emit = emit
+        self.window = window
+        # (target rooms, entity, id) -> (target rooms, payload); insertion order = seq order
+        self._pending: Dict[tuple, Tuple[frozenset, dict]] = {}
+        self._timer: Optional[asyncio.Future] = None
+
+    async def enqueue(self, rooms: Iterable[str], payload: dict):
+        target = frozenset(rooms)
+        if self.window <= 0:
+            await self._emit(BATCH_EVENT, [payload], to=sorted(target))
+            return
+
+        key = (target, payload["entity"], payload["id"])
+        held = self._pending.get(key)
+        if held is None or held[1]["version"] <= payload["version"]:
+            # A newer version of the same record replaces the one still waiting, and moves
+            # to its seq position
+            self._pending.pop(key, None)
+            self._pending[key] = (target, payload)
+        if self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+    async def send_now(self, items: Iterable[tuple]):
+        """
+        Sends (rooms, payload) pairs right away, coalesced the same way. Used when a single
+        request changes many records at once.
+        """
+        latest: Dict[tuple, Tuple[frozenset, dict]] = {}
+        for rooms, payload in items:
+            target = frozenset(rooms)
+            key = (target, payload["entity"], payload["id"])
+            latest.pop(key, None)
+            latest[key] = (target, payload)
+        await self._send_in_order(latest.values())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        await self._send_in_order(pending.values())
+
+    async def _send_in_order(self, items: Iterable[Tuple[frozenset, dict]]):
+        # Room sets overlap (role:admin is in nearly all of them), so batches must go out in
+        # seq order: consecutive deltas for the same rooms share a message, and a change of
+        # rooms starts the next one. A socket in several of the sets still sees ascending seqs.
+        run_target, run = None, []
+        for target, payload in items:
+            if run and target != run_target:
+                await self._emit(BATCH_EVENT, run, to=sorted(run_target))
+                run = []
+            run_target = target
+            run.append(payload)
+        if run:
+            await self._emit(BATCH_EVENT, run, to=sorted(run_target))
+
+class BoundedSendServer(socketio.AsyncServer):
+    """
+    AsyncServer whose per-client send queues stop growing at `high_water_mark` packets.
+    The first packet over the mark is replaced by one 'snapshot_required' message and the
+    client's further events are dropped until its queue drains below half the mark; if
+    anything was dropped by then, it gets a second 'snapshot_required' before live events
+    resume. Applies to every emit, local or relayed from another worker.
+
+    _send_eio_packet and _handle_eio_disconnect are python-socketio internals (pinned to
+    5.11.1 in requirements.txt); test_emission drives both through the public emit path and
+    the Engine.IO disconnect handler, so an upgrade that stops calling them fails there.
+    """
+
+    def __init__(self, *args, high_water_mark: int = 500, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.high_water_mark = high_water_mark
+        # eio_sid -> packets dropped since that client's last snapshot_required
+        self.lagging: Dict[str, int] = {}
+        self.dropped = 0
+
+    def backlog(self, eio_sid: str) -> int:
+        socket = self.eio.sockets.get(eio_sid)
+        return socket.queue.qsize() if socket is not None else 0
+
+    async def _send_eio_packet(self, eio_sid, eio_pkt):
+        backlog = self.backlog(eio_sid)
+        if eio_sid in self.lagging:
+            if backlog > self.high_water_mark // 2:
+                self.lagging[eio_sid] += 1
+                self.dropped += 1
+                return
+            if self.lagging.pop(eio_sid):
+                await super()._send_eio_packet(eio_sid, self._snapshot_packet("recovered"))
+        elif backlog >= self.high_water_mark:
+            self.lagging[eio_sid] = 0
+            self.dropped += 1
+            await super()._send_eio_packet(eio_sid, self._snapshot_packet("lagging"))
+            return
+        await super()._send_eio_packet(eio_sid, eio_pkt)
+
+    async def _handle_eio_disconnect(self, eio_sid, *args):
+        # A client that leaves while lagging must not stay in the map
+        self.lagging.pop(eio_sid, None)
+        await super()._handle_eio_disconnect(eio_sid, *args)
+
+    def _snapshot_packet(self, reason: str):
+        pkt = self.packet_class(packet.EVENT, namespace="/", data=[SNAPSHOT_EVENT, {"reason": reason}])
+        return eio_packet.Packet(eio_packet.MESSAGE, pkt.encode())
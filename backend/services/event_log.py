@@ -0,0 +1,155 @@
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, insert, select
+
+from backend.config import settings
+from backend.database import AsyncSessionLocal, RealtimeEvent
+
+# Every realtime event gets a sequence number, so a socket that drops and reconnects can ask
+# for just what it missed ("resume") instead of reloading everything. Sequence numbers only
+# mean something within one epoch; a client holding another epoch's number must resync.
+
+class LoggedEvent(NamedTuple):
+    seq: int
+    event: str
+    payload: dict
+    rooms: Sequence[str]
+
+class EventLog:
+    """
+    Bounded in-memory ring buffer of the most recent events. The epoch changes on every
+    process start, since the sequence restarts with it.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.epoch = uuid.uuid4().hex[:12]
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+
+    async def head(self) -> int:
+        return self._seq
+
+    async def append(self, event: str, payload: dict, rooms: Iterable[str]) -> int:
+        """
+        Stamps the payload with its seq and epoch and records it. Returns the seq.
+        """
+        # No await between read and write: the event loop keeps this atomic
+        self._seq += 1
+        payload.update(seq=self._seq, epoch=self.epoch)
+        self._events.append(LoggedEvent(self._seq, event, payload, tuple(rooms)))
+        return self._seq
+
+    async def append_many(self, items: Iterable[Tuple[str, dict, Iterable[str]]]) -> List[int]:
+        """
+        append() for a batch of (event, payload, rooms). Returns the seqs in order.
+        """
+        return [await self.append(event, payload, rooms) for event, payload, rooms in items]
+
+    async def since(self, last_seq: int) -> Optional[List[LoggedEvent]]:
+        """
+        Events after last_seq, oldest first, or None when they are no longer all available.
+        """
+        if last_seq > self._seq:
+            return None
+        if last_seq < self._seq and (not self._events or self._events[0].seq > last_seq + 1):
+            return None
+        return [e for e in self._events if e.seq > last_seq]
+
+class PersistentEventLog(EventLog):
+    """
+    Same contract, backed by the realtime_events table: survives restarts and, because the
+    sequence is the table's id, stays in one order across every worker process.
+
+    Ids are handed out at INSERT but rows show up at COMMIT, so with several workers seq 12
+    can be readable while seq 11 is still being committed. Readers only go up to the last
+    seq with no hole before it; a hole whose later events are older than gap_seconds is an
+    append that rolled back and is stepped over.
+    """
+
+    def __init__(self, capacity: int = 1000, session_factory=AsyncSessionLocal, gap_seconds: float = 5.0):
+        super().__init__(capacity)
+        self.epoch = "db"
+        self.capacity = capacity
+        self.session_factory = session_factory
+        self.gap_seconds = gap_seconds
+
+    def _contiguous(self, rows, after: int, now: datetime) -> list:
+        # The leading rows (seq order, all > after) that no in-flight append can come before
+        settled = []
+        for row in rows:
+            if row.seq != after + 1 and row.created_at and (now - row.created_at).total_seconds() < self.gap_seconds:
+                break
+            settled.append(row)
+            after = row.seq
+        return settled
+
+    async def head(self) -> int:
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            # Everything written before the last gap_seconds is settled; check the rest
+            base = await db.scalar(
+                select(func.max(RealtimeEvent.seq))
+                .where(RealtimeEvent.created_at < now - timedelta(seconds=self.gap_seconds))
+            ) or 0
+            recent = (await db.execute(
+                select(RealtimeEvent.seq, RealtimeEvent.created_at)
+                .where(RealtimeEvent.seq > base).order_by(RealtimeEvent.seq)
+            )).all()
+        settled = self._contiguous(recent, base, now)
+        return settled[-1].seq if settled else base
+
+    async def append(self, event: str, payload: dict, rooms: Iterable[str]) -> int:
+        return (await self.append_many([(event, payload, rooms)]))[0]
+
+    async def append_many(self, items: Iterable[Tuple[str, dict, Iterable[str]]]) -> List[int]:
+        # One multi-row INSERT ... RETURNING and one commit for the whole batch. Rows keep the
+        # payload as given; seq and epoch are stamped on the way back out in since().
+        items = [(event, payload, list(rooms)) for event, payload, rooms in items]
+        if not items:
+            return []
+        async with self.session_factory() as db:
+            # The statement hands out ids in VALUES order; RETURNING only lists them in any order
+            # (asking SQLAlchemy to keep the order makes it send one INSERT per row on SQLite)
+            seqs = sorted((await db.scalars(
+                insert(RealtimeEvent).returning(RealtimeEvent.seq),
+                [{"event": event, "payload": payload, "rooms": rooms} for event, payload, rooms in items],
+            )).all())
+            # Trim in small steps rather than with a periodic job: keep ~capacity rows
+            if seqs[-1] // 100 > (seqs[0] - 1) // 100:
+                await db.execute(delete(RealtimeEvent).where(RealtimeEvent.seq <= seqs[-1] - self.capacity))
+            await db.commit()
+        for seq, (_, payload, _) in zip(seqs, items):
+            payload.update(seq=seq, epoch=self.epoch)
+        return seqs
+
+    async def since(self, last_seq: int) -> Optional[List[LoggedEvent]]:
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            rows = (await db.execute(
+                select(RealtimeEvent).where(RealtimeEvent.seq > last_seq)
+                .order_by(RealtimeEvent.seq).limit(self.capacity + 1)
+            )).scalars().all()
+            if not rows:
+                head = await db.scalar(select(func.max(RealtimeEvent.seq))) or 0
+                return [] if last_seq <= head else None
+            if len(rows) > self.capacity:
+                return None
+            if rows[0].seq != last_seq + 1:
+                # Trimming removes the oldest rows, so a kept row at or before last_seq means
+                # the next one is in flight (or rolled back) rather than trimmed away
+                oldest = await db.scalar(select(func.min(RealtimeEvent.seq)))
+                if oldest > last_seq:
+                    return None
+        return [
+            LoggedEvent(r.seq, r.event, {**r.payload, "seq": r.seq, "epoch": self.epoch}, tuple(r.rooms))
+            for r in self._contiguous(rows, last_seq, now)
+        ]
+
+def build_event_log() -> EventLog:
+    # With several workers behind Redis only the shared table gives one sequence for everyone
+    if settings.EVENT_LOG_PERSIST or settings.SOCKETIO_MANAGER.lower() == "redis":
+        return PersistentEventLog(settings.EVENT_LOG_SIZE)
+    return EventLog(settings.EVENT_LOG_SIZE)
@@ -0,0 +1,301 @@
+import heapq
+import itertools
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config import settings
+from backend.database import Order, OrderStatus, Prescription, StatusHistory, User
+from backend.services.state_machine import PRESCRIPTION_TRANSITIONS, transition_error
+from backend.services.stats import summarize
+
+# One fulfilment queue for uploaded prescriptions and cart orders. Pharmacists claim the
+# next items (gold members first, then oldest first), move them through the order statuses
+# and release them on delivery. Time spent waiting and in each status feeds the metrics.
+#
+# The heap lives in this process and is kept current incrementally (new rows by id on every
+# claim, a full rebuild every resync_seconds). Claims are confirmed with a conditional UPDATE
+# on the row, so two workers never hand out the same item, and every advance re-checks the
+# lease on the row, so a pharmacist can move an item through any worker.
+
+# Cart orders move through the same statuses (and state machine) as prescriptions
+DONE_STATUS = OrderStatus.DELIVERED.value
+# Anything not yet packed is waiting for a pharmacist
+OPEN_STATUSES = sorted(s for s, moves in PRESCRIPTION_TRANSITIONS.items() if OrderStatus.READY.value in moves)
+WAITING_STAGE = "queued"
+
+# kind -> (table, column holding the user whose gold membership sets the priority)
+SOURCES = {
+    "prescription": (Prescription, Prescription.patient_id),
+    "order": (Order, Order.user_id),
+}
+
+Key = Tuple[str, int]
+
+class LeaseLost(Exception):
+    """
+    The item is not (or no longer) claimed by this pharmacist.
+    """
+
+@dataclass
+class QueueItem:
+    kind: str # "prescription" or "order"
+    item_id: int
+    gold: bool
+    created_at: datetime
+    status: str
+
+    @property
+    def key(self) -> Key:
+        return (self.kind, self.item_id)
+
+    @property
+    def priority(self) -> tuple:
+        return (0 if self.gold else 1, self.created_at)
+
+    def as_dict(self) -> dict:
+        return {"kind": self.kind, "id": self.item_id, "gold": self.gold, "status": self.status, "created_at": self.created_at}
+
+class FulfilmentQueue:
+    def __init__(self, lease_seconds: float = 900, resync_seconds: float = 60, history: int = 1000):
+        self.lease_seconds = lease_seconds
+        self.resync_seconds = resync_seconds
+        # (priority, seq, key); entries whose seq no longer matches _queued are stale
+        self._heap: List[tuple] = []
+        self._queued: Dict[Key, Tuple[int, QueueItem]] = {}
+        self._seq = itertools.count()
+        # Claimed items: key -> (pharmacist, lease expiry, item), plus a heap of expiries
+        self._claims: Dict[Key, Tuple[str, datetime, QueueItem]] = {}
+        self._expiries: List[Tuple[datetime, Key]] = []
+        # key -> (stage, since) and the last `history` durations per stage, in seconds
+        self._stage_since: Dict[Key, Tuple[str, datetime]] = {}
+        self.durations: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=history))
+        self._last_ids = {kind: 0 for kind in SOURCES}
+        self._synced_at: Optional[datetime] = None
+
+    # --- Heap ---
+
+    def push(self, item: QueueItem):
+        """
+        Queues an item (no-op if it is already queued or claimed). O(log n).
+        """
+        if item.key in self._queued or item.key in self._claims:
+            return
+        seq = next(self._seq)
+        self._queued[item.key] = (seq, item)
+        heapq.heappush(self._heap, (item.priority, seq, item.key))
+        self._stage_since.setdefault(item.key, (WAITING_STAGE, item.created_at))
+
+    def _pop(self) -> Optional[QueueItem]:
+        while self._heap:
+            _, seq, key = heapq.heappop(self._heap)
+            entry = self._queued.get(key)
+            if entry is not None and entry[0] == seq:
+                del self._queued[key]
+                return entry[1]
+        return None
+
+    def peek(self, limit: int) -> List[QueueItem]:
+        live = (e for e in self._heap if self._queued.get(e[2], (None,))[0] == e[1])
+        return [self._queued[key][1] for _, _, key in heapq.nsmallest(limit, live)]
+
+    # --- Database sync ---
+
+    async def sync(self, db: AsyncSession, now: datetime):
+        """
+        Adds prescriptions and orders created since the last sync; every resync_seconds,
+        rebuilds the heap instead, dropping items finished or claimed elsewhere.
+        """
+        full = self._synced_at is None or (now - self._synced_at).total_seconds() >= self.resync_seconds
+        found = []
+        for kind, (model, user_column) in SOURCES.items():
+            stmt = (
+                select(model.id, model.status, model.created_at, User.is_gold_member)
+                .outerjoin(User, User.id == user_column)
+                .where(
+                    model.status.in_(OPEN_STATUSES),
+                    or_(model.lease_expires_at.is_(None), model.lease_expires_at < now),
+                )
+            )
+            if not full:
+                stmt = stmt.where(model.id > self._last_ids[kind])
+            found.append((kind, (await db.execute(stmt)).all()))
+
+        if full:
+            self._queued = {}
+            self._heap = []
+            self._stage_since = {k: v for k, v in self._stage_since.items() if k in self._claims}
+            self._synced_at = now
+        for kind, rows in found:
+            for row in rows:
+                self.push(QueueItem(kind, row.id, bool(row.is_gold_member), row.created_at or now, row.status))
+                self._last_ids[kind] = max(self._last_ids[kind], row.id)
+
+    def reclaim(self, now: datetime):
+        # Expired claims go back into the heap with their original priority
+        while self._expiries and self._expiries[0][0] < now:
+            expires_at, key = heapq.heappop(self._expiries)
+            claim = self._claims.get(key)
+            if claim is not None and claim[1] == expires_at:
+                del self._claims[key]
+                self.push(claim[2])
+
+    # --- Pharmacist actions (the caller commits) ---
+
+    async def claim(self, db: AsyncSession, pharmacist: str, limit: int, now: datetime) -> List[QueueItem]:
+        await self.sync(db, now)
+        self.reclaim(now)
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        claimed: List[QueueItem] = []
+        while len(claimed) < limit:
+            batch = []
+            while len(claimed) + len(batch) < limit:
+                item = self._pop()
+                if item is None:
+                    break
+                batch.append(item)
+            if not batch:
+                break
+
+            confirmed = {}
+            for kind, (model, _) in SOURCES.items():
+                ids = [item.item_id for item in batch if item.kind == kind]
+                if not ids:
+                    continue
+                result = await db.execute(
+                    update(model)
+                    .where(
+                        model.id.in_(ids),
+                        model.status.in_(OPEN_STATUSES),
+                        or_(model.lease_expires_at.is_(None), model.lease_expires_at < now),
+                    )
+                    .values(claimed_by=pharmacist, lease_expires_at=expires_at)
+                    .returning(model.id, model.status)
+                    .execution_options(synchronize_session=False)
+                )
+                confirmed.update(((kind, item_id), status) for item_id, status in result.all())
+
+            for item in batch:
+                if item.key not in confirmed:
+                    # Finished or claimed by another worker since we queued it
+                    self._stage_since.pop(item.key, None)
+                    continue
+                item.status = confirmed[item.key]
+                self._hold(item, pharmacist, expires_at)
+                stage, since = self._stage_since.get(item.key, (WAITING_STAGE, item.created_at))
+                if stage == WAITING_STAGE:
+                    self._record(item.key, item.status, since, now)
+                claimed.append(item)
+        return claimed
+
+    async def advance(self, db: AsyncSession, pharmacist: str, key: Key, new_status: str, now: datetime) -> QueueItem:
+        """
+        Moves a claimed item to `new_status`. Delivery releases it; any other move renews the
+        lease. Raises LeaseLost, or ValueError for a transition the state machine refuses.
+
+        The row decides who holds the lease, not _claims: the claim may have been made on
+        another worker or before a restart, and this worker's copy may be stale.
+        """
+        item = await self._load_claim(db, pharmacist, key, now)
+        error = transition_error("prescription", item.status, new_status)
+        if error:
+            raise ValueError(error)
+        if new_status == item.status:
+            return item
+
+        done = new_status == DONE_STATUS
+        expires_at = None if done else now + timedelta(seconds=self.lease_seconds)
+        await self._advance_row(db, pharmacist, item, new_status, expires_at, now)
+
+        if key in self._stage_since:
+            stage, since = self._stage_since[key]
+            self._record(key, new_status, since, now, stage)
+        else:
+            # Claimed elsewhere: time in the current stage is unknown here
+            self._stage_since[key] = (new_status, now)
+        item.status = new_status
+        self._queued.pop(key, None)
+        if done:
+            self._claims.pop(key, None)
+            self._stage_since.pop(key, None)
+        else:
+            self._hold(item, pharmacist, expires_at)
+        return item
+
+    async def _load_claim(self, db: AsyncSession, pharmacist: str, key: Key, now: datetime) -> QueueItem:
+        kind, item_id = key
+        model, user_column = SOURCES[kind]
+        row = (await db.execute(
+            select(model.status, model.created_at, model.claimed_by, model.lease_expires_at, User.is_gold_member)
+            .outerjoin(User, User.id == user_column)
+            .where(model.id == item_id)
+        )).first()
+        if row is None or row.claimed_by != pharmacist or row.lease_expires_at is None or row.lease_expires_at < now:
+            raise LeaseLost()
+        return QueueItem(kind, item_id, bool(row.is_gold_member), row.created_at or now, row.status)
+
+    async def _advance_row(self, db, pharmacist, item, new_status, expires_at, now):
+        from backend.services.counters import apply_deltas, counter_key
+        model, _ = SOURCES[item.kind]
+        values = {"status": new_status, "lease_expires_at": expires_at}
+        if item.kind == "prescription":
+            values["version"] = Prescription.version + 1
+        result = await db.execute(
+            update(model)
+            .where(
+                model.id == item.item_id,
+                model.status == item.status,
+                model.claimed_by == pharmacist,
+                model.lease_expires_at >= now,
+            )
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            raise LeaseLost()
+        if item.kind == "prescription":
+            deltas = {counter_key("prescriptions", item.status): -1, counter_key("prescriptions", new_status): 1}
+            await db.run_sync(lambda session: apply_deltas(session.connection(), deltas))
+        db.add(StatusHistory(
+            item_type=item.kind, item_id=item.item_id, from_status=item.status, to_status=new_status,
+            changed_at=now, note=f"by {pharmacist}",
+        ))
+
+    def release(self, key: Key):
+        # The caller's transaction failed after claim()/advance() changed our state
+        claim = self._claims.pop(key, None)
+        if claim is not None:
+            self.push(claim[2])
+
+    def _hold(self, item: QueueItem, pharmacist: str, expires_at: datetime):
+        self._claims[item.key] = (pharmacist, expires_at, item)
+        heapq.heappush(self._expiries, (expires_at, item.key))
+
+    def _record(self, key: Key, next_stage: str, since: datetime, now: datetime, stage: str = WAITING_STAGE):
+        self.durations[stage].append(max(0.0, (now - since).total_seconds()))
+        self._stage_since[key] = (next_stage, now)
+
+    # --- Reads ---
+
+    def metrics(self, now: datetime) -> dict:
+        """
+        This worker's view: its heap, the claims it made or advanced, and stage durations it
+        observed since it started. Other workers report their own.
+        """
+        waiting = [item for _, item in self._queued.values()]
+        oldest = min((item.created_at for item in waiting), default=None)
+        return {
+            "scope": "worker",
+            "queued": len(waiting),
+            "gold_queued": sum(1 for item in waiting if item.gold),
+            "claimed": len(self._claims),
+            "oldest_queued_seconds": max(0.0, (now - oldest).total_seconds()) if oldest else None,
+            # Seconds spent per stage: "queued" is creation to claim, the rest are statuses
+            "stages": {stage: summarize(values) for stage, values in self.durations.items()},
+        }
+
+fulfilment_queue = FulfilmentQueue(settings.PHARMACY_LEASE_SECONDS, settings.PHARMACY_QUEUE_RESYNC_SECONDS)
@@ -0,0 +1,190 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Mapping, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from backend.config import settings
+from backend.database import InventoryItem, ReservationStatus, StockReservation
+
+# Stock for pharmacy orders. Every change is one conditional UPDATE on the product's
+# inventory row ("... WHERE stock >= :qty"), so concurrent checkouts for the same SKU never
+# oversell and never need a table lock: the database serializes them on that one row, and
+# whoever finds too little stock gets OutOfStock instead of a negative count.
+#
+#   hold()    cart checkout: stock -> reserved, with an expiry (a "held" ledger row)
+#   commit()  order placed:  the cart's held units are sold, anything not held is taken now
+#   release() cart emptied:  reserved -> stock
+#   sweep()   abandoned carts: the same as release() for every hold past its expiry
+#
+# Each operation ends the ledger rows it replaces first, then changes every product's
+# inventory row once, in product_id order, so two multi-line carts on Postgres always take
+# row locks in the same order (no deadlocks). Nothing here commits; the caller does, and a
+# rollback undoes every line of the cart or order together.
+#
+# maybe_sweep() is the exception: reservations and checkouts call it before they write, and
+# it sweeps in a session and transaction of its own, so expired holds of other carts are
+# never locked alongside the caller's products.
+
+HELD, COMMITTED = ReservationStatus.HELD.value, ReservationStatus.COMMITTED.value
+
+class OutOfStock(Exception):
+    def __init__(self, product_id: int, requested: int, available: int):
+        super().__init__(f"product {product_id}: {requested} requested, {available} available")
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+def _totals(lines: Iterable[tuple]) -> Dict[int, int]:
+    # (product_id, quantity) pairs -> quantity per product; repeated products are summed
+    totals = Counter()
+    for product_id, quantity in lines:
+        totals[product_id] += quantity
+    return dict(totals)
+
+class InventoryLedger:
+    def __init__(self, hold_seconds: float = 900, sweep_seconds: float = 30):
+        self.hold_seconds = hold_seconds
+        self.sweep_seconds = sweep_seconds
+        self._swept_at: Optional[datetime] = None
+        self._sweeping = False
+
+    async def ensure(self, db: AsyncSession, initial: Mapping[int, int]):
+        """
+        Creates missing inventory rows with their starting stock (catalog products added
+        since the last order). Existing rows are left alone.
+        """
+        if not initial:
+            return
+        dialect = db.get_bind().dialect.name
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(InventoryItem)
+        await db.execute(
+            stmt.on_conflict_do_nothing(index_elements=[InventoryItem.product_id]),
+            [{"product_id": pid, "stock": stock, "reserved": 0} for pid, stock in sorted(initial.items())],
+        )
+
+    async def _take(self, db: AsyncSession, product_id: int, quantity: int, reserved_delta: int):
+        # quantity may be negative (units going back to stock); the guard then always passes
+        result = await db.execute(
+            update(InventoryItem)
+            .where(InventoryItem.product_id == product_id, InventoryItem.stock >= quantity)
+            .values(stock=InventoryItem.stock - quantity, reserved=InventoryItem.reserved + reserved_delta)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            available = (await db.execute(
+                select(InventoryItem.stock).where(InventoryItem.product_id == product_id)
+            )).scalar()
+            raise OutOfStock(product_id, quantity, available or 0)
+
+    async def _end_holds(self, db: AsyncSession, where, status: str, now: datetime, **values) -> Dict[int, int]:
+        """
+        Moves the matching held rows to `status` and returns their units per product. The
+        status check makes it safe to run on several workers: each hold ends exactly once.
+        """
+        result = await db.execute(
+            update(StockReservation)
+            .where(StockReservation.status == HELD, *where)
+            .values(status=status, resolved_at=now, **values)
+            .returning(StockReservation.product_id, StockReservation.quantity)
+            .execution_options(synchronize_session=False)
+        )
+        return _totals(result.all())
+
+    async def _restock(self, db: AsyncSession, held: Mapping[int, int]):
+        for product_id, quantity in sorted(held.items()):
+            await self._take(db, product_id, -quantity, -quantity)
+
+    # --- Operations (the caller commits) ---
+
+    async def hold(self, db: AsyncSession, cart_id: str, lines: Iterable[tuple], now: datetime) -> datetime:
+        """
+        Replaces the cart's holds with `lines` ((product_id, quantity) pairs) until the
+        returned expiry. Raises OutOfStock for the first product that is short.
+        """
+        released = await self._end_holds(db, [StockReservation.cart_id == cart_id], ReservationStatus.RELEASED.value, now)
+        totals = _totals(lines)
+        expires_at = now + timedelta(seconds=self.hold_seconds)
+        # Old and new holds net out per product, so each row is updated once, in order
+        for product_id in sorted(set(totals) | set(released)):
+            change = totals.get(product_id, 0) - released.get(product_id, 0)
+            if change:
+                await self._take(db, product_id, change, change)
+        if totals:
+            await db.execute(insert(StockReservation), [
+                {"product_id": pid, "quantity": qty, "status": HELD, "cart_id": cart_id,
+                 "created_at": now, "expires_at": expires_at}
+                for pid, qty in sorted(totals.items())
+            ])
+        return expires_at
+
+    async def commit(self, db: AsyncSession, order_id: int, lines: Iterable[tuple], now: datetime,
+                     cart_id: Optional[str] = None):
+        """
+        Sells `lines` for the order. Units the cart still holds are used first (a hold past
+        its expiry counts until the sweeper has returned it); the rest (no cart, a swept hold,
+        a bigger order than the hold) are taken from stock with the same conditional UPDATE,
+        and surplus held units go back.
+        """
+        held = {}
+        if cart_id:
+            held = await self._end_holds(db, [StockReservation.cart_id == cart_id], COMMITTED, now, order_id=order_id)
+        totals = _totals(lines)
+        adjustments = []
+        for product_id in sorted(set(totals) | set(held)):
+            extra = totals.get(product_id, 0) - held.get(product_id, 0)
+            await self._take(db, product_id, extra, -held.get(product_id, 0))
+            if extra:
+                adjustments.append({"product_id": product_id, "quantity": extra, "status": COMMITTED,
+                                    "order_id": order_id, "created_at": now, "resolved_at": now})
+        if adjustments:
+            await db.execute(insert(StockReservation), adjustments)
+
+    async def release(self, db: AsyncSession, cart_id: str, now: datetime) -> int:
+        held = await self._end_holds(db, [StockReservation.cart_id == cart_id], ReservationStatus.RELEASED.value, now)
+        await self._restock(db, held)
+        return sum(held.values())
+
+    async def sweep(self, db: AsyncSession, now: datetime) -> int:
+        """
+        Returns the holds of abandoned carts (past expires_at) to stock. Returns the units.
+        """
+        held = await self._end_holds(db, [StockReservation.expires_at < now], ReservationStatus.EXPIRED.value, now)
+        await self._restock(db, held)
+        return sum(held.values())
+
+    async def maybe_sweep(self, engine: AsyncEngine, now: datetime) -> int:
+        """
+        Sweeps in its own session and transaction if this worker hasn't in sweep_seconds.
+        Call it before the request writes anything (on SQLite the sweep would wait for the
+        request's write lock). A failed sweep is retried by the next caller.
+        """
+        due = self._swept_at is None or (now - self._swept_at).total_seconds() >= self.sweep_seconds
+        if not due or self._sweeping:
+            return 0
+        self._sweeping = True
+        try:
+            async with AsyncSession(engine) as session:
+                expired = await self.sweep(session, now)
+                await session.commit()
+            self._swept_at = now
+            return expired
+        except Exception as e:
+            print(f"Inventory sweep failed: {e}")
+            return 0
+        finally:
+            self._sweeping = False
+
+    # --- Reads ---
+
+    async def available(self, db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, int]:
+        ids = list(product_ids)
+        if not ids:
+            return {}
+        rows = await db.execute(select(InventoryItem.product_id, InventoryItem.stock).where(InventoryItem.product_id.in_(ids)))
+        return dict(rows.all())
+
+inventory = InventoryLedger(settings.CART_HOLD_SECONDS, settings.INVENTORY_SWEEP_SECONDS)
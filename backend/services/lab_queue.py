@@ -0,0 +1,193 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config import settings
+from backend.database import Appointment, AppointmentStatus, StatusHistory
+from backend.services.state_machine import APPOINTMENT_TRANSITIONS
+from backend.services.stats import summarize
+
+# Lab tests are Appointment rows with type="lab_test". Technicians claim the oldest open
+# tests in batches and hold each one under a lease that heartbeats extend; a lease that runs
+# out makes the test claimable again, so a technician who walks away loses nothing.
+#
+# A claim is a single UPDATE whose WHERE picks the ids: on Postgres the inner SELECT takes
+# FOR UPDATE SKIP LOCKED, so concurrent claims step over each other's rows instead of
+# waiting; SQLite runs every write statement under its one write lock, which gives the same
+# "nobody gets the same test twice" guarantee without a retry loop.
+
+DONE_STATUS = AppointmentStatus.READY.value
+# Statuses that count as finished for the metrics; completed_at is stamped on the first of them
+FINISHED_STATUSES = (DONE_STATUS, AppointmentStatus.COMPLETED.value)
+# Any status a result may still be entered from
+OPEN_STATUSES = sorted(status for status, moves in APPOINTMENT_TRANSITIONS.items() if DONE_STATUS in moves)
+
+class LeaseLost(Exception):
+    """
+    The test is not (or no longer) leased to this technician.
+    """
+
+class LabQueue:
+    def __init__(self, lease_seconds: float = 300, claim_max: int = 50):
+        self.lease_seconds = lease_seconds
+        self.claim_max = claim_max
+
+    def _claimable(self, now: datetime):
+        return and_(
+            Appointment.type == "lab_test",
+            Appointment.status.in_(OPEN_STATUSES),
+            Appointment.appointment_time <= now,
+            or_(Appointment.lease_expires_at.is_(None), Appointment.lease_expires_at < now),
+        )
+
+    def _held_by(self, technician: str, now: datetime):
+        return and_(Appointment.claimed_by == technician, Appointment.lease_expires_at >= now)
+
+    # --- Technician actions (the caller commits) ---
+
+    async def claim(self, db: AsyncSession, technician: str, limit: int, now: datetime) -> List[int]:
+        """
+        Leases up to `limit` of the oldest due tests to `technician`. Returns their ids.
+        """
+        limit = max(1, min(limit, self.claim_max))
+        picked = (
+            select(Appointment.id)
+            .where(self._claimable(now))
+            .order_by(Appointment.appointment_time, Appointment.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            update(Appointment)
+            # Re-checked on the row itself: under READ COMMITTED another claim may have
+            # committed between the subquery and this UPDATE
+            .where(Appointment.id.in_(picked.scalar_subquery()), self._claimable(now))
+            .values(
+                claimed_by=technician,
+                claimed_at=func.coalesce(Appointment.claimed_at, now),
+                lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                claim_count=Appointment.claim_count + 1,
+            )
+            .returning(Appointment.id)
+            .execution_options(synchronize_session=False)
+        )
+        return sorted(result.scalars().all())
+
+    async def heartbeat(self, db: AsyncSession, technician: str, ids: Sequence[int], now: datetime) -> List[int]:
+        """
+        Extends the leases `technician` still holds among `ids`. Returns the renewed ids.
+        """
+        if not ids:
+            return []
+        result = await db.execute(
+            update(Appointment)
+            .where(Appointment.id.in_(list(ids)), self._held_by(technician, now), Appointment.status.in_(OPEN_STATUSES))
+            .values(lease_expires_at=now + timedelta(seconds=self.lease_seconds))
+            .returning(Appointment.id)
+            .execution_options(synchronize_session=False)
+        )
+        return sorted(result.scalars().all())
+
+    async def complete(self, db: AsyncSession, technician: str, appointment_id: int, result: str, now: datetime):
+        """
+        Stores the result and moves the test to "ready", if `technician` still holds it.
+        Returns the row as it was before (id, status, type, patient_id, time); raises LeaseLost.
+        """
+        from backend.services.counters import apply_deltas, counter_key
+        from backend.services.lab_results import record_observations
+
+        row = (await db.execute(
+            select(Appointment.id, Appointment.status, Appointment.type, Appointment.patient_id, Appointment.appointment_time)
+            .where(Appointment.id == appointment_id, Appointment.type == "lab_test", self._held_by(technician, now))
+        )).first()
+        if row is None or row.status not in OPEN_STATUSES:
+            raise LeaseLost()
+
+        updated = await db.execute(
+            update(Appointment)
+            .where(Appointment.id == appointment_id, Appointment.status == row.status, self._held_by(technician, now))
+            .values(
+                status=DONE_STATUS, lab_result=result, completed_at=now,
+                lease_expires_at=None, version=Appointment.version + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if updated.rowcount != 1:
+            raise LeaseLost()
+
+        deltas = {counter_key("appointments", row.type, row.status): -1, counter_key("appointments", row.type, DONE_STATUS): 1}
+        await db.run_sync(lambda session: apply_deltas(session.connection(), deltas))
+        await record_observations(db, [(appointment_id, row.patient_id, result, row.appointment_time)])
+        db.add(StatusHistory(
+            item_type="appointment", item_id=appointment_id, from_status=row.status, to_status=DONE_STATUS,
+            changed_at=now, note=f"completed by {technician}",
+        ))
+        return row
+
+    # --- Reads ---
+
+    async def leases(self, db: AsyncSession, ids: Sequence[int]) -> Dict[int, datetime]:
+        rows = await db.execute(select(Appointment.id, Appointment.lease_expires_at).where(Appointment.id.in_(list(ids))))
+        return {row.id: row.lease_expires_at for row in rows}
+
+    async def metrics(self, db: AsyncSession, now: datetime, since: datetime) -> Dict[str, dict]:
+        """
+        Per test name (Appointment.doctor_name for lab tests): the queue as it stands now and
+        the SLA timings of tests completed since `since`. Times are in seconds.
+        """
+        leased = and_(Appointment.lease_expires_at.is_not(None), Appointment.lease_expires_at >= now)
+        queue_rows = (await db.execute(
+            select(
+                Appointment.doctor_name,
+                func.count().label("open"),
+                func.sum(case((leased, 1), else_=0)).label("in_progress"),
+                func.min(case((leased, None), else_=Appointment.appointment_time)).label("oldest_waiting"),
+            )
+            .where(Appointment.type == "lab_test", Appointment.status.in_(OPEN_STATUSES), Appointment.appointment_time <= now)
+            .group_by(Appointment.doctor_name)
+        )).all()
+
+        done_rows = (await db.execute(
+            select(
+                Appointment.doctor_name, Appointment.appointment_time, Appointment.claimed_at,
+                Appointment.completed_at, Appointment.claim_count,
+            ).where(Appointment.type == "lab_test", Appointment.completed_at >= since)
+        )).all()
+
+        report: Dict[str, dict] = defaultdict(lambda: {
+            "waiting": 0, "in_progress": 0, "oldest_waiting_seconds": None,
+            "completed": 0, "reclaimed": 0, "wait": None, "turnaround": None, "total": None,
+        })
+        for row in queue_rows:
+            entry = report[row.doctor_name or "unknown"]
+            entry["in_progress"] = int(row.in_progress or 0)
+            entry["waiting"] = row.open - entry["in_progress"]
+            if row.oldest_waiting is not None:
+                entry["oldest_waiting_seconds"] = _seconds(_as_datetime(row.oldest_waiting), now)
+
+        timings = defaultdict(lambda: defaultdict(list))
+        for row in done_rows:
+            name = row.doctor_name or "unknown"
+            report[name]["completed"] += 1
+            report[name]["reclaimed"] += 1 if row.claim_count > 1 else 0
+            if row.claimed_at is not None:
+                timings[name]["wait"].append(_seconds(row.appointment_time, row.claimed_at))
+                timings[name]["turnaround"].append(_seconds(row.claimed_at, row.completed_at))
+            timings[name]["total"].append(_seconds(row.appointment_time, row.completed_at))
+        for name, series in timings.items():
+            for metric, values in series.items():
+                report[name][metric] = summarize(values)
+        return dict(report)
+
+def _as_datetime(value) -> datetime:
+    # MIN() over a CASE comes back untyped on SQLite (a string)
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+def _seconds(start: datetime, end: datetime) -> float:
+    # Walk-in tests are booked "now" and may be claimed a moment before that on another clock
+    return max(0.0, (end - start).total_seconds())
+
+lab_queue = LabQueue(settings.LAB_LEASE_SECONDS, settings.LAB_CLAIM_MAX)
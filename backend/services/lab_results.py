@@ -0,0 +1,243 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.database import Observation
+
+# Lab results are typed in as free text ("HbA1c: 5.8% (Pre-diabetic)", "Blood Sugar: 120mg/dL",
+# "Hb 13.9 g/dL (13.5-17.5); WBC 6.1"). parse_result() pulls out every "name value [unit]
+# [(range or note)]" it finds, so each one can be stored as an observation row and charted.
+# Known analytes (ALIASES) get a canonical code and a default unit/reference range and may
+# be followed by just a space. Any other name needs ":" or "=" before its value ("Ferritin:
+# 80") and is kept under a code derived from it; otherwise prose like "done on 12 Jan 2026"
+# would turn into readings, and generic labels ("Result: 5", "Page: 1") are never analytes.
+# Blood pressure ("BP 120/80") gives a systolic and a diastolic row. The default unit and
+# range only apply when the text gives no unit of its own: "Platelets 2.5 lakhs" is stored
+# without a unit rather than as 2.5 x 10^3/uL.
+
+# code -> (display name, unit, reference low, reference high)
+ANALYTES: Dict[str, Tuple[str, str, Optional[float], Optional[float]]] = {
+    "hba1c": ("HbA1c", "%", 4.0, 5.6),
+    "glucose": ("Blood Glucose", "mg/dL", 70.0, 100.0),
+    "hemoglobin": ("Hemoglobin", "g/dL", 12.0, 17.5),
+    "wbc": ("White Blood Cells", "10^3/uL", 4.0, 11.0),
+    "platelets": ("Platelets", "10^3/uL", 150.0, 450.0),
+    "cholesterol": ("Total Cholesterol", "mg/dL", None, 200.0),
+    "ldl": ("LDL Cholesterol", "mg/dL", None, 100.0),
+    "hdl": ("HDL Cholesterol", "mg/dL", 40.0, None),
+    "triglycerides": ("Triglycerides", "mg/dL", None, 150.0),
+    "tsh": ("TSH", "mIU/L", 0.4, 4.0),
+    "creatinine": ("Creatinine", "mg/dL", 0.6, 1.3),
+    "vitamin_d": ("Vitamin D", "ng/mL", 30.0, 100.0),
+    "ferritin": ("Ferritin", "ng/mL", 30.0, 400.0),
+    "bp_systolic": ("Systolic BP", "mmHg", 90.0, 120.0),
+    "bp_diastolic": ("Diastolic BP", "mmHg", 60.0, 80.0),
+}
+
+# Normalized name (lowercase, letters and digits only) -> code
+ALIASES = {
+    "hba1c": "hba1c", "a1c": "hba1c", "glycatedhemoglobin": "hba1c",
+    "glucose": "glucose", "bloodsugar": "glucose", "bloodglucose": "glucose", "sugar": "glucose",
+    "fbs": "glucose", "fastingbloodsugar": "glucose", "fastingglucose": "glucose",
+    "hb": "hemoglobin", "hgb": "hemoglobin", "haemoglobin": "hemoglobin", "hemoglobin": "hemoglobin",
+    "wbc": "wbc", "whitebloodcells": "wbc", "tlc": "wbc",
+    "plt": "platelets", "platelets": "platelets", "plateletcount": "platelets",
+    "cholesterol": "cholesterol", "totalcholesterol": "cholesterol", "tc": "cholesterol",
+    "ldl": "ldl", "ldlcholesterol": "ldl", "hdl": "hdl", "hdlcholesterol": "hdl",
+    "tg": "triglycerides", "triglycerides": "triglycerides",
+    "tsh": "tsh", "creatinine": "creatinine", "vitd": "vitamin_d", "vitamind": "vitamin_d",
+    "ferritin": "ferritin", "serumferritin": "ferritin",
+    "systolic": "bp_systolic", "systolicbp": "bp_systolic", "diastolic": "bp_diastolic", "diastolicbp": "bp_diastolic",
+}
+
+_ITEM = re.compile(
+    # The name must be split from the value by ":"/"=" or a space, so "HbA1c" stays one name
+    r"(?P<name>[A-Za-z][A-Za-z0-9 .\-]*?)(?P<separator>\s*[:=]\s*|\s+)"
+    r"(?P<value>\d+(?:\.\d+)?)\s*"
+    # Only things that look like units, so "WBC 6.1 Hb 14" doesn't read "Hb" as a unit
+    r"(?P<unit>%|[A-Za-zµ0-9^]+/[A-Za-zµ0-9]+|(?:mg|g|fL|pg|ng|IU|mIU|U|mmol|mEq|cells)\b)?\s*"
+    r"(?:\((?P<note>[^)]*)\))?"
+)
+_RANGE = re.compile(r"(?:ref(?:erence)?[: ]*)?(?P<low>\d+(?:\.\d+)?)\s*-\s*(?P<high>\d+(?:\.\d+)?)", re.IGNORECASE)
+_SEPARATORS = re.compile(r"[\n;,]+")
+# A word right after the value that is not a unit _ITEM knows, nor the next reading's name
+_WORD_AFTER = re.compile(r"\s*(?P<word>[A-Za-z][A-Za-z/]*)(?P<reading>\s*[:=]?\s*\d)?")
+# Words that may follow a value without being its unit
+_QUALIFIERS = {"normal", "high", "low", "borderline", "positive", "negative", "h", "l", "ok", "and", "on", "at", "in"}
+# Labels that come before numbers in reports without naming an analyte (as alias keys)
+_GENERIC_LABELS = {
+    "result", "results", "report", "page", "sample", "sampleno", "test", "tests", "value", "reading",
+    "no", "number", "srno", "id", "age", "date", "time", "day", "ref", "reference", "range",
+}
+_BLOOD_PRESSURE = re.compile(
+    r"\b(?:BP|blood\s+pressure)\s*[:=]?\s*(?P<systolic>\d{2,3})\s*/\s*(?P<diastolic>\d{2,3})(?:\s*mm\s*Hg\b)?",
+    re.IGNORECASE,
+)
+
+@dataclass
+class ParsedObservation:
+    analyte: str
+    name: str
+    value: float
+    unit: Optional[str]
+    ref_low: Optional[float]
+    ref_high: Optional[float]
+    note: Optional[str]
+
+def _alias_key(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+def analyte_code(name: str) -> str:
+    return ALIASES.get(_alias_key(name)) or re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def _known_name(name: str) -> Optional[str]:
+    # The longest run of trailing words naming a known analyte: "fasting blood sugar" in
+    # "Report fasting blood sugar"
+    words = name.split()
+    for start in range(len(words)):
+        candidate = " ".join(words[start:])
+        if _alias_key(candidate) in ALIASES:
+            return candidate
+    return None
+
+def _unknown_unit(part: str, value_end: int) -> bool:
+    # True when the value is followed by a unit-like word _ITEM could not read ("lakhs")
+    after = _WORD_AFTER.match(part, value_end)
+    if after is None or after.group("reading"):
+        return False
+    word = after.group("word")
+    return word.lower() not in _QUALIFIERS and _alias_key(word) not in ALIASES
+
+def parse_result(text: Optional[str]) -> List[ParsedObservation]:
+    """
+    Every numeric reading in a free-text lab result. Text without numbers gives [].
+    """
+    found = []
+    for part in _SEPARATORS.split(text or ""):
+        for match in _BLOOD_PRESSURE.finditer(part):
+            for code in ("bp_systolic", "bp_diastolic"):
+                name, unit, low, high = ANALYTES[code]
+                found.append(ParsedObservation(
+                    analyte=code, name=name, value=float(match.group(code[3:])),
+                    unit=unit, ref_low=low, ref_high=high, note=None,
+                ))
+        part = _BLOOD_PRESSURE.sub(" ", part)
+        for match in _ITEM.finditer(part):
+            name = match.group("name").strip(" .-")
+            known = _known_name(name)
+            if known:
+                name = known
+            elif not name or not match.group("separator").strip() or _alias_key(name) in _GENERIC_LABELS:
+                continue
+            code = analyte_code(name)
+            _, default_unit, low, high = ANALYTES.get(code, (name, None, None, None))
+            unit = match.group("unit")
+            if unit is None and not _unknown_unit(part, match.end("value")):
+                unit = default_unit
+            if (unit or "").lower() != (default_unit or "").lower():
+                # Not the unit the default range is in (or one we can't read)
+                low = high = None
+            note = (match.group("note") or "").strip() or None
+            ranged = _RANGE.fullmatch(note) if note else None
+            if ranged:
+                low, high, note = float(ranged.group("low")), float(ranged.group("high")), None
+            found.append(ParsedObservation(
+                analyte=code, name=name, value=float(match.group("value")),
+                unit=unit, ref_low=low, ref_high=high, note=note,
+            ))
+    return found
+
+async def record_observations(db: AsyncSession, results: Iterable[Tuple[int, Optional[int], Optional[str], Optional[datetime]]]) -> int:
+    """
+    For each (appointment_id, patient_id, result text, observed_at): replaces the stored
+    observations of that appointment with the ones parsed from the text. One DELETE and one
+    multi-row INSERT, in the caller's transaction. Returns how many rows were written.
+    """
+    results = list(results)
+    if not results:
+        return 0
+    await db.execute(delete(Observation).where(Observation.appointment_id.in_([r[0] for r in results])))
+    rows = [row for result in results for row in observation_rows(*result)]
+    if rows:
+        await db.execute(insert(Observation), rows)
+    return len(rows)
+
+def observation_rows(appointment_id: int, patient_id: Optional[int], text: Optional[str],
+                     observed_at: Optional[datetime]) -> List[dict]:
+    if patient_id is None:
+        return []
+    observed_at = observed_at or datetime.now()
+    return [
+        {
+            "patient_id": patient_id, "appointment_id": appointment_id, "analyte": item.analyte, "name": item.name,
+            "value": item.value, "unit": item.unit, "ref_low": item.ref_low, "ref_high": item.ref_high,
+            "note": item.note, "observed_at": observed_at,
+        }
+        for item in parse_result(text)
+    ]
+
+# --- Reads ---
+
+def downsample(points: List[Tuple[datetime, float]], max_points: int) -> List[dict]:
+    """
+    Points in time order -> at most `max_points` equal-width time buckets, each with the
+    mean, min and max of the readings in it. Short series come back one point per reading.
+    """
+    if len(points) <= max_points:
+        return [{"t": t, "value": v, "min": v, "max": v, "count": 1} for t, v in points]
+    start, end = points[0][0], points[-1][0]
+    width = (end - start) / max_points
+    buckets: Dict[int, List[Tuple[datetime, float]]] = {}
+    for t, v in points:
+        index = min(max_points - 1, int((t - start) / width)) if width else 0
+        buckets.setdefault(index, []).append((t, v))
+    series = []
+    for index in sorted(buckets):
+        bucket = buckets[index]
+        values = [v for _, v in bucket]
+        series.append({
+            # Mid-time of the readings in the bucket, so a single outlier stays where it was taken
+            "t": bucket[0][0] + (bucket[-1][0] - bucket[0][0]) / 2,
+            "value": round(sum(values) / len(values), 3),
+            "min": min(values), "max": max(values), "count": len(values),
+        })
+    return series
+
+async def trend(db: AsyncSession, patient_id: int, analyte: str, since: datetime, until: datetime,
+                max_points: int) -> dict:
+    """
+    One range read on ix_observations_patient_analyte_time (it carries the value too, so
+    the series never touches the table) plus the newest row for unit and reference range.
+    """
+    code = analyte_code(analyte)
+    points = (await db.execute(
+        select(Observation.observed_at, Observation.value)
+        .where(
+            Observation.patient_id == patient_id, Observation.analyte == code,
+            Observation.observed_at >= since, Observation.observed_at <= until,
+        )
+        .order_by(Observation.observed_at)
+    )).all()
+    latest = (await db.execute(
+        select(Observation.name, Observation.unit, Observation.ref_low, Observation.ref_high)
+        .where(Observation.patient_id == patient_id, Observation.analyte == code)
+        .order_by(Observation.observed_at.desc())
+        .limit(1)
+    )).first()
+    name, unit, low, high = ANALYTES.get(code, (latest.name if latest else analyte, None, None, None))
+    if latest is not None:
+        unit = latest.unit or unit
+        low = latest.ref_low if latest.ref_low is not None else low
+        high = latest.ref_high if latest.ref_high is not None else high
+    return {
+        "analyte": code,
+        "name": name,
+        "unit": unit,
+        "reference_range": {"low": low, "high": high},
+        "readings": len(points),
+        "points": downsample([(row.observed_at, row.value) for row in points], max_points),
+    }
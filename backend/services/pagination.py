@@ -0,0 +1,114 @@
+import base64
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, literal, or_, select, union_all
+
+# Header used to hand the next-page cursor back to the client. The body stays a plain list
+# so existing consumers keep working.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_value: Optional[datetime], row_id: int) -> str:
+    """
+    Packs the (timestamp, id) of the last row on a page into an opaque token. A row without
+    a timestamp gives an empty one (see keyset_page).
+    """
+    raw = f"{sort_value.isoformat() if sort_value is not None else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        sort_str, id_str = raw.rsplit("|", 1)
+        return (datetime.fromisoformat(sort_str) if sort_str else None), int(id_str)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_after(sort_column, id_column, cursor: Optional[str], descending: bool = False):
+    """
+    Returns the WHERE clause for rows strictly after the cursor in (sort_column, id) order,
+    or None when there is no cursor (first page). Written as an OR of range predicates
+    so it can walk a (sort_column, id) index on both SQLite and Postgres.
+    With descending=True, "after" means older (for newest-first listings).
+    """
+    if not cursor:
+        return None
+    sort_value, row_id = decode_cursor(cursor)
+    return _after(sort_column, id_column, sort_value, row_id, descending)
+
+def _after(sort_column, id_column, sort_value: datetime, row_id: int, descending: bool):
+    if descending:
+        return or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < row_id)
+        )
+    return or_(
+        sort_column > sort_value,
+        and_(sort_column == sort_value, id_column > row_id)
+    )
+
+def keyset_page(query, sort_column, id_column, cursor: Optional[str], limit: int, descending: bool = False):
+    """
+    `query` narrowed to the page after `cursor`: up to limit + 1 rows (the extra one says
+    whether there is a next page) in (sort_column, id) order.
+
+    If sort_column is nullable, rows where it is NULL (legacy rows) come after all the
+    others in id order, whichever the direction. SQLite and Postgres put NULLs at opposite
+    ends and they can't be compared with a cursor, so they are paged as a second segment.
+    Both segments are read in the same statement (UNION ALL of two index-ordered pieces),
+    and a page may hold the end of one and the start of the other.
+    """
+    sort_value, row_id = decode_cursor(cursor) if cursor else (None, None)
+    sort_order = (sort_column.desc(), id_column.desc()) if descending else (sort_column, id_column)
+    id_order = id_column.desc() if descending else id_column
+    undated = query.where(sort_column.is_(None))
+    if cursor and sort_value is None:
+        # Already inside the NULL segment
+        return undated.where(id_column < row_id if descending else id_column > row_id).order_by(id_order).limit(limit + 1)
+
+    dated = query
+    if cursor:
+        dated = dated.where(_after(sort_column, id_column, sort_value, row_id, descending))
+    if not sort_column.expression.nullable:
+        return dated.order_by(*sort_order).limit(limit + 1)
+
+    dated = dated.where(sort_column.isnot(None)).order_by(*sort_order).limit(limit + 1)
+    undated = undated.order_by(id_order).limit(limit + 1)
+    segments = union_all(
+        select(dated.add_columns(literal(0).label("null_segment")).subquery()),
+        select(undated.add_columns(literal(1).label("null_segment")).subquery()),
+    ).subquery()
+    sort_key, id_key = segments.c[sort_column.key], segments.c[id_column.key]
+    return select(segments).order_by(
+        segments.c.null_segment, *((sort_key.desc(), id_key.desc()) if descending else (sort_key, id_key))
+    ).limit(limit + 1)
+
+def page_rows(rows: Sequence, limit: int, sort_key: str, id_key: str = "id") -> Tuple[List, Optional[str]]:
+    """
+    Rows fetched with keyset_page -> (the page, the next page's cursor or None).
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], sort_key), getattr(rows[-1], id_key))
+
+def parse_date_range(date_from: Optional[str], date_to: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Turns inclusive YYYY-MM-DD bounds into a half-open [start, end) datetime range.
+    """
+    try:
+        start = datetime.strptime(date_from, "%Y-%m-%d") if date_from else None
+        end = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1) if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    return start, end
+
+def split_csv(value: Optional[str]):
+    """
+    'pending,Processing' -> ['pending', 'processing']
+    """
+    if not value:
+        return []
+    return [v.strip().lower() for v in value.split(",") if v.strip()]
@@ -0,0 +1,114 @@
+import asyncio
+import pickle
+from typing import List, Optional
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+from backend.config import settings
+
+# Socket.IO client managers. The default in-process manager only reaches sockets connected
+# to this worker; the pub/sub ones also publish every emit on a shared channel so each
+# worker delivers it to its own sockets. Pick one with SOCKETIO_MANAGER:
+#   memory - single process (default)
+#   redis  - Redis pub/sub at REDIS_URL, for several uvicorn workers or hosts
+#   local  - an in-process bus that stands in for Redis (tests, single-host experiments)
+
+class BatchedPublishMixin:
+    """
+    Coalesces outbound pub/sub traffic: messages published within `batch_window` seconds
+    (up to `batch_size` of them) go out as one list, which every listener unpacks again.
+    AsyncPubSubManager.emit() serves this worker's own sockets before publishing, and the
+    listener skips messages from its own host_id, so local sockets get an emit immediately
+    (once); only sockets on other workers see up to `batch_window` seconds of delay.
+    """
+
+    def __init__(self, *args, batch_window: float = 0.01, batch_size: int = 100, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self._pending: List[dict] = []
+        self._flusher: Optional[asyncio.Future] = None
+
+    async def _publish(self, data):
+        self._pending.append(data)
+        if len(self._pending) >= self.batch_size:
+            await self._flush()
+        elif self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.batch_window)
+        self._flusher = None
+        await self._flush()
+
+    async def _flush(self):
+        batch, self._pending = self._pending, []
+        if batch:
+            await super()._publish(batch)
+
+    async def _listen(self):
+        async for message in super()._listen():
+            data = pickle.loads(message) if isinstance(message, bytes) else message
+            if isinstance(data, list):
+                for item in data:
+                    yield item
+            else:
+                yield data
+
+class LocalBus:
+    """
+    Fan-out queue shared by every LocalPubSubManager that is given it, like a Redis channel.
+    """
+
+    def __init__(self):
+        self.subscribers: List[asyncio.Queue] = []
+        self.published = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self.subscribers.append(queue)
+        return queue
+
+    def publish(self, message: bytes):
+        self.published += 1
+        for queue in self.subscribers:
+            queue.put_nowait(message)
+
+class LocalTransport(AsyncPubSubManager):
+    """
+    Pub/sub manager over a LocalBus; messages are pickled, as the Redis manager does.
+    """
+    name = 'local'
+
+    def __init__(self, bus: Optional[LocalBus] = None, **kwargs):
+        self.bus = bus or LocalBus()
+        super().__init__(**kwargs)
+
+    async def _publish(self, data):
+        self.bus.publish(pickle.dumps(data))
+
+    async def _listen(self):
+        queue = self.bus.subscribe()
+        while True:
+            yield await queue.get()
+
+class LocalPubSubManager(BatchedPublishMixin, LocalTransport):
+    pass
+
+class BatchedRedisManager(BatchedPublishMixin, socketio.AsyncRedisManager):
+    pass
+
+def build_client_manager(kind: Optional[str] = None):
+    kind = (kind or settings.SOCKETIO_MANAGER).lower()
+    batching = {
+        "batch_window": settings.SOCKETIO_BATCH_MS / 1000,
+        "batch_size": settings.SOCKETIO_BATCH_SIZE,
+    }
+    if kind == "redis":
+        if not settings.REDIS_URL:
+            raise RuntimeError("SOCKETIO_MANAGER=redis needs REDIS_URL")
+        return BatchedRedisManager(settings.REDIS_URL, **batching)
+    if kind == "local":
+        return LocalPubSubManager(**batching)
+    return socketio.AsyncManager()
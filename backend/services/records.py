@@ -0,0 +1,126 @@
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.database import Appointment, Order, OrderItem, Prescription, User
+
+# Row shapes shared by the staff listings and the realtime deltas, so a dashboard can merge
+# an event into the list it already holds without refetching it.
+
+def appointment_query():
+    # Appointment columns plus patient name and phone from a single outer join
+    return select(
+        Appointment.id,
+        Appointment.patient_id,
+        Appointment.doctor_id,
+        Appointment.appointment_time,
+        Appointment.status,
+        Appointment.type,
+        Appointment.zoom_link,
+        Appointment.doctor_name,
+        Appointment.lab_result,
+        Appointment.lab_report_url,
+        Appointment.version,
+        User.full_name.label("patient_name"),
+        User.phone.label("patient_phone")
+    ).outerjoin(User, User.id == Appointment.patient_id)
+
+def appointment_record(row) -> dict:
+    return {
+        "id": row.id,
+        "patient_id": row.patient_id,
+        "doctor_id": row.doctor_id,
+        "appointment_time": row.appointment_time,
+        "status": row.status,
+        "type": row.type,
+        "zoom_link": row.zoom_link,
+        "doctor_name": row.doctor_name,
+        "patient_name": row.patient_name or "Unknown",
+        "patient_phone": row.patient_phone,
+        "lab_result": row.lab_result,
+        "lab_report_url": row.lab_report_url,
+        "version": row.version
+    }
+
+def prescription_query():
+    return select(
+        Prescription.id,
+        Prescription.patient_id,
+        Prescription.extracted_data,
+        Prescription.status,
+        Prescription.created_at,
+        Prescription.version,
+        User.full_name.label("patient_name"),
+        User.phone.label("patient_phone")
+    ).outerjoin(User, User.id == Prescription.patient_id)
+
+def prescription_record(row) -> dict:
+    return {
+        "id": row.id,
+        "patient_id": row.patient_id,
+        "extracted_data": row.extracted_data,
+        "status": row.status,
+        "patient_name": row.patient_name or "Unknown",
+        "patient_phone": row.patient_phone,
+        "version": row.version
+    }
+
+async def load_appointment(db: AsyncSession, appointment_id: int) -> Optional[dict]:
+    row = (await db.execute(appointment_query().where(Appointment.id == appointment_id))).first()
+    return appointment_record(row) if row else None
+
+async def load_prescription(db: AsyncSession, prescription_id: int) -> Optional[dict]:
+    row = (await db.execute(prescription_query().where(Prescription.id == prescription_id))).first()
+    return prescription_record(row) if row else None
+
+async def load_appointments(db: AsyncSession, appointment_ids) -> List[dict]:
+    rows = (await db.execute(appointment_query().where(Appointment.id.in_(list(appointment_ids))))).all()
+    return [appointment_record(row) for row in rows]
+
+async def load_prescriptions(db: AsyncSession, prescription_ids) -> List[dict]:
+    rows = (await db.execute(prescription_query().where(Prescription.id.in_(list(prescription_ids))))).all()
+    return [prescription_record(row) for row in rows]
+
+def order_record(order, items) -> dict:
+    # Item keys match what the pharmacy frontend sends and renders
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "user_name": order.user_name,
+        "status": order.status,
+        "payment_method": order.payment_method,
+        "total_amount": order.total_amount,
+        "created_at": order.created_at,
+        "items": [
+            {
+                "product_id": item.product_id,
+                "product_name": item.product_name,
+                "baseName": item.base_name,
+                "packSize": item.pack_size,
+                "brand": item.brand,
+                "image": item.image,
+                "quantity": item.quantity,
+                "price": item.price,
+            }
+            for item in items
+        ],
+    }
+
+async def load_orders(db: AsyncSession, orders) -> List[dict]:
+    """
+    Order rows (or ids) -> records with their items, in the given order. Two queries.
+    """
+    orders = list(orders)
+    if orders and isinstance(orders[0], int):
+        found = {o.id: o for o in (await db.execute(select(Order).where(Order.id.in_(orders)))).scalars()}
+        orders = [found[i] for i in orders if i in found]
+    if not orders:
+        return []
+    items = {}
+    rows = (await db.execute(
+        select(OrderItem).where(OrderItem.order_id.in_([o.id for o in orders])).order_by(OrderItem.order_id, OrderItem.id)
+    )).scalars()
+    for item in rows:
+        items.setdefault(item.order_id, []).append(item)
+    return [order_record(o, items.get(o.id, [])) for o in orders]
@@ -0,0 +1,262 @@
+import bisect
+import heapq
+import itertools
+import re
+from functools import lru_cache
+from itertools import accumulate
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Medicine search over the in-memory catalog. The catalog is fixed once loaded, so an
+# inverted index is built once: every token of product_name, brand, category and
+# sub_category maps to the sorted positions of the products that contain it.
+#
+# A query matches products that have, for every query term, some token starting with it
+# ("para 650" finds "Paracetamol 650mg"). Each term's products are the postings of a range
+# of the sorted vocabulary. The rarest term drives a walk in catalog order that stops once
+# `limit` products passed the other terms; if matches are sparse the walk hands over to an
+# intersection of the terms' (cached) posting sets.
+
+SEARCH_FIELDS = ("product_name", "brand", "category", "sub_category")
+
+_WORD = re.compile(r"[a-z0-9]+")
+_PARTS = re.compile(r"[a-z]+|[0-9]+")
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """
+    Lowercase alphanumeric words; words mixing letters and digits also give their parts,
+    so "500mg" is found by "500" and by "mg".
+    """
+    tokens = []
+    for word in _WORD.findall((text or "").lower()):
+        tokens.append(word)
+        parts = _PARTS.findall(word)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+class CatalogIndex:
+    # Candidates of the rarest term checked one by one before AND switches to set intersection
+    WALK_LIMIT = 256
+
+    def __init__(self, items: Sequence[dict], fields: Sequence[str] = SEARCH_FIELDS, cache_size: int = 2048):
+        self.items = items
+        postings: Dict[str, List[int]] = {}
+        self.doc_tokens: List[FrozenSet[str]] = []
+        for position, item in enumerate(items):
+            tokens = frozenset(t for field in fields for t in tokenize(item.get(field)))
+            self.doc_tokens.append(tokens)
+            for token in tokens:
+                postings.setdefault(token, []).append(position) # positions arrive in order
+        self.vocabulary = sorted(postings)
+        self.postings = [postings[token] for token in self.vocabulary]
+        # Postings before vocabulary[i], so a prefix range's size costs two bisects
+        self._offsets = [0, *accumulate(len(p) for p in self.postings)]
+        # Exact-match filters (case-insensitive), as the category pages use them
+        self.by_category = self._group(items, "category")
+        self.by_sub_category = self._group(items, "sub_category")
+        self.subcategories_of: Dict[str, List[str]] = {
+            name: sorted({items[i]["sub_category"] for i in positions if items[i].get("sub_category")})
+            for name, (positions, _) in self.by_category.items()
+        }
+        self.term_positions = lru_cache(maxsize=cache_size)(self._term_positions)
+
+    @staticmethod
+    def _group(items, field) -> Dict[str, Tuple[List[int], FrozenSet[int]]]:
+        # value -> (positions in order, the same as a set)
+        groups: Dict[str, List[int]] = {}
+        for position, item in enumerate(items):
+            if item.get(field):
+                groups.setdefault(item[field].lower(), []).append(position)
+        return {key: (positions, frozenset(positions)) for key, positions in groups.items()}
+
+    def _range(self, term: str) -> range:
+        # Vocabulary indexes of the tokens starting with `term`
+        lo = bisect.bisect_left(self.vocabulary, term)
+        hi = bisect.bisect_left(self.vocabulary, term + "\uffff", lo)
+        return range(lo, hi)
+
+    def _estimate(self, term: str) -> int:
+        span = self._range(term)
+        return self._offsets[span.stop] - self._offsets[span.start]
+
+    def _walk(self, term: str) -> Iterator[int]:
+        # Products matching `term` in catalog order, produced lazily
+        lists = [self.postings[i] for i in self._range(term)]
+        if len(lists) == 1:
+            return iter(lists[0])
+        return _dedupe(heapq.merge(*lists))
+
+    def _term_positions(self, term: str) -> FrozenSet[int]:
+        return frozenset(position for i in self._range(term) for position in self.postings[i])
+
+    def _has_prefix(self, position: int, term: str) -> bool:
+        return any(token.startswith(term) for token in self.doc_tokens[position])
+
+    def search(self, query: Optional[str] = None, category: Optional[str] = None,
+               sub_category: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """
+        Products matching every term of `query` (and the category filters), in catalog
+        order, at most `limit` of them.
+        """
+        terms = sorted(set(tokenize(query)), key=self._estimate)
+        filters = []
+        for groups, value in ((self.by_category, category), (self.by_sub_category, sub_category)):
+            if value:
+                filters.append(groups.get(value.lower(), ([], frozenset())))
+        if any(not positions for positions, _ in filters) or (terms and self._estimate(terms[0]) == 0):
+            return []
+
+        if not terms and not filters:
+            return list(self.items[:limit])
+        filters.sort(key=lambda f: len(f[0]))
+        if terms:
+            driver = self._walk(terms[0])
+            checks = [(lambda p, s=positions: p in s) for _, positions in filters]
+        else:
+            driver = iter(filters[0][0])
+            checks = [(lambda p, s=positions: p in s) for _, positions in filters[1:]]
+        checks += [(lambda p, t=term: self._has_prefix(p, t)) for term in terms[1:]]
+
+        results = []
+        for visited, position in enumerate(driver):
+            if checks and visited == self.WALK_LIMIT:
+                # Few of the candidates match: intersecting the (cached) term sets runs at C
+                # speed, checking thousands more candidates in Python would not
+                sets = [self.term_positions(t) for t in terms] + [s for _, s in filters]
+                matched = frozenset.intersection(*sorted(sets, key=len))
+                return [self.items[p] for p in heapq.nsmallest(limit, matched)]
+            if all(check(position) for check in checks):
+                results.append(self.items[position])
+                if len(results) >= limit:
+                    break
+        return results
+
+    def filtered(self, category: Optional[str] = None, sub_category: Optional[str] = None) -> Optional[FrozenSet[int]]:
+        # Positions passing the category filters, or None when there are none
+        sets = [groups.get(value.lower(), ([], frozenset()))[1]
+                for groups, value in ((self.by_category, category), (self.by_sub_category, sub_category)) if value]
+        return frozenset.intersection(*sets) if sets else None
+
+    # --- Facets ---
+
+    def categories(self) -> List[str]:
+        return sorted({self.items[positions[0]]["category"] for positions, _ in self.by_category.values()})
+
+    def subcategories(self, category: Optional[str] = None) -> List[str]:
+        if category:
+            return self.subcategories_of.get(category.lower(), [])
+        return sorted({self.items[positions[0]]["sub_category"] for positions, _ in self.by_sub_category.values()})
+
+# --- Typo-tolerant search ---
+#
+# "benadril syrop" should still find "Benadryl Cough Syrup". Each distinct word of
+# product_name and brand is indexed by its character trigrams (padded as in pg_trgm, so word
+# starts count: "  b", " be", "ben", ...). A query word's candidate words are the ones sharing
+# enough trigrams to reach the similarity threshold; only the rarest trigrams need scanning
+# for that (a word sharing >= m of the query's n trigrams shares one of its n - m + 1 rarest),
+# and at most max_words candidates are scored. Products are then ranked by how well their
+# best-matching words fit each query word, then by rating.
+
+def trigrams(word: str) -> FrozenSet[str]:
+    padded = f"  {word} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    # Jaccard similarity of two trigram sets, as pg_trgm's similarity()
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared) if shared else 0.0
+
+class TrigramIndex:
+    FUZZY_FIELDS = ("product_name", "brand")
+
+    def __init__(self, items: Sequence[dict], fields: Sequence[str] = FUZZY_FIELDS, threshold: float = 0.3,
+                 max_words: int = 50, max_candidates: int = 1000):
+        self.items = items
+        self.threshold = threshold
+        self.max_words = max_words           # similar words scored per query word
+        self.max_candidates = max_candidates # products scored per query
+        word_ids: Dict[str, int] = {}
+        self.word_docs: List[List[int]] = []
+        self.doc_words: List[FrozenSet[int]] = []
+        for position, item in enumerate(items):
+            ids = set()
+            for word in {t for field in fields for t in tokenize(item.get(field))}:
+                if word not in word_ids:
+                    word_ids[word] = len(word_ids)
+                    self.word_docs.append([])
+                ids.add(word_ids[word])
+                self.word_docs[word_ids[word]].append(position)
+            self.doc_words.append(frozenset(ids))
+        self.words = list(word_ids)
+        self.word_trigrams = [trigrams(word) for word in self.words]
+        postings: Dict[str, List[int]] = {}
+        for word_id, grams in enumerate(self.word_trigrams):
+            for gram in grams:
+                postings.setdefault(gram, []).append(word_id)
+        self.postings = postings
+        self.similar_words = lru_cache(maxsize=4096)(self._similar_words)
+
+    def _similar_words(self, word: str) -> Dict[int, float]:
+        """
+        Indexed words whose similarity to `word` reaches the threshold -> similarity.
+        """
+        grams = trigrams(word)
+        need = max(1, int(self.threshold * len(grams) + 0.999999)) # shared trigrams for the threshold
+        rarest = sorted(grams, key=lambda g: len(self.postings.get(g, ())))[:len(grams) - need + 1]
+        shared: Dict[int, int] = {}
+        for gram in rarest:
+            for word_id in self.postings.get(gram, ()):
+                shared[word_id] = shared.get(word_id, 0) + 1
+        # Words sharing the most trigrams first, so the candidates kept are the likeliest ones
+        candidates = heapq.nlargest(self.max_words * 4, shared, key=shared.get)
+        scored = {}
+        for word_id in candidates:
+            score = similarity(grams, self.word_trigrams[word_id])
+            if score >= self.threshold:
+                scored[word_id] = score
+        best = heapq.nlargest(self.max_words, scored, key=scored.get)
+        return {word_id: scored[word_id] for word_id in best}
+
+    def search(self, query: Optional[str], limit: int = 50, candidates: Optional[Iterable[int]] = None) -> List[dict]:
+        """
+        Products ranked by mean best-word similarity over the query words, then rating.
+        `candidates` (catalog positions, e.g. a category) restricts the result.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        matches = [self.similar_words(term) for term in terms]
+        allowed = frozenset(candidates) if candidates is not None else None
+
+        # Products come from the query word with the fewest of them, best matching words first
+        # (so a product's first appearance carries its best similarity for that word)
+        def doc_count(matched):
+            return sum(len(self.word_docs[w]) for w in matched) if matched else float("inf")
+        driver = min(range(len(matches)), key=lambda i: doc_count(matches[i]))
+        others = [(m, m.keys()) for i, m in enumerate(matches) if i != driver]
+        pool: Dict[int, float] = {}
+        for word_id in sorted(matches[driver], key=matches[driver].get, reverse=True):
+            score = matches[driver][word_id]
+            for position in self.word_docs[word_id]:
+                if position not in pool and (allowed is None or position in allowed):
+                    pool[position] = score
+            if len(pool) >= self.max_candidates:
+                break
+
+        ranked = []
+        for position, score in itertools.islice(pool.items(), self.max_candidates):
+            words = self.doc_words[position]
+            for matched, keys in others:
+                score += max((matched[w] for w in keys & words), default=0.0)
+            score /= len(matches)
+            if score >= self.threshold:
+                ranked.append((score, self.items[position].get("ratings") or 0, -position))
+        return [self.items[-p] for _, _, p in heapq.nlargest(limit, ranked)]
+
+def _dedupe(positions: Iterable[int]) -> Iterator[int]:
+    # A product with several tokens in one prefix range appears once per token
+    last = None
+    for position in positions:
+        if position != last:
+            yield position
+            last = position
@@ -1,40 +1,190 @@
+from typing import Iterable, List, Optional
+from urllib.parse import parse_qs
+
 import socketio
+from fastapi.encoders import jsonable_encoder
+
+from backend.config import settings
+from backend.security import decode_access_token
+from backend.services.emission import BATCH_EVENT, SNAPSHOT_EVENT, BoundedSendServer, EmissionScheduler
+from backend.services.event_log import EventLog, build_event_log
+from backend.services.pubsub import build_client_manager
+
+# Create a Socket.IO Async Server; the client manager decides whether emits also reach
+# sockets held by other workers (see backend/services/pubsub.py), and each client's send
+# queue is capped (see backend/services/emission.py)
+sio = BoundedSendServer(
+    async_mode='asgi', cors_allowed_origins='*',
+    client_manager=build_client_manager(),
+    high_water_mark=settings.SOCKETIO_CLIENT_HWM
+)
+
+# Every record change is one delta: {type, entity, id, version, record}, stamped with its
+# place in the event log (seq, epoch) for the resume handshake. Deltas reach clients in
+# "delta_batch" messages (a list), coalesced per target rooms.
+DELTA_EVENT = "delta"
+
+# --- Rooms ---
+# Every socket joins the rooms for who it is, and events are emitted only to the rooms
+# of the records they touch, so fan-out grows with interested clients, not connections.
+# Admins (and custom staff roles, whose dashboards show everything) share one full feed.
+FULL_FEED_ROOM = "role:admin"
+SCOPED_ROLES = {"doctor", "lab", "pharmacist"}
+
+def role_room(role: str) -> str:
+    return f"role:{role}"
+
+def patient_room(patient_id) -> str:
+    return f"patient:{patient_id}"
+
+def doctor_room(doctor_id) -> str:
+    return f"doctor:{doctor_id}"
 
-# Create a Socket.IO Async Server
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+def rooms_for_user(user_id, role: str) -> List[str]:
+    role = (role or "").lower()
+    if role == "patient":
+        return [patient_room(user_id)]
+    if role == "doctor":
+        return [role_room("doctor"), doctor_room(user_id)]
+    if role in SCOPED_ROLES:
+        return [role_room(role)]
+    return [FULL_FEED_ROOM]
+
+def appointment_rooms(patient_id, doctor_id=None, appointment_type: Optional[str] = None) -> List[str]:
+    rooms = [FULL_FEED_ROOM, patient_room(patient_id)]
+    if doctor_id:
+        rooms.append(doctor_room(doctor_id))
+    if appointment_type == "lab_test":
+        # Doctor dashboards list the unassigned lab tests alongside their own queue
+        rooms += [role_room("lab"), role_room("doctor")]
+    return rooms
+
+def prescription_rooms(patient_id) -> List[str]:
+    return [FULL_FEED_ROOM, role_room("pharmacist"), patient_room(patient_id)]
+
+def record_rooms(entity: str, record: dict) -> List[str]:
+    if entity == "appointment":
+        return appointment_rooms(record["patient_id"], record["doctor_id"], record["type"])
+    return prescription_rooms(record["patient_id"])
+
+def _delta_payload(kind: str, entity: str, record: dict) -> dict:
+    return {
+        "type": kind,
+        "entity": entity,
+        "id": record["id"],
+        "version": record["version"],
+        "record": jsonable_encoder(record),
+    }
+
+def _token_from(environ: dict, auth) -> Optional[str]:
+    # socket.io-client sends { auth: { token } }; fall back to ?token= for older clients
+    if isinstance(auth, dict) and auth.get("token"):
+        return auth["token"]
+    tokens = parse_qs(environ.get("QUERY_STRING", "")).get("token")
+    return tokens[0] if tokens else None
 
 class SocketManager:
-    def __init__(self):
-        self.server = sio
+    def __init__(self, server=None, log: Optional[EventLog] = None, coalesce_window: Optional[float] = None):
+        self.server = server or sio
+        self.log = log or build_event_log()
+        if coalesce_window is None:
+            coalesce_window = settings.SOCKETIO_COALESCE_MS / 1000
+        # Looks the server up on every send, so a swapped-in server is honoured
+        self.scheduler = EmissionScheduler(lambda *args, **kwargs: self.server.emit(*args, **kwargs), coalesce_window)
 
-    async def connect(self, sid, environ):
-        print(f" Socket Connected: {sid}")
+    async def connect(self, sid, environ, auth=None):
+        """
+        Accepts only sockets carrying a valid access token and joins them to their rooms.
+        """
+        token = _token_from(environ, auth)
+        claims = decode_access_token(token) if token else None
+        if not claims or claims.get("id") is None:
+            raise socketio.exceptions.ConnectionRefusedError("authentication required")
+
+        user_id, role = claims["id"], claims.get("role") or ""
+        await self.server.save_session(sid, {"user_id": user_id, "role": role})
+        for room in rooms_for_user(user_id, role):
+            await self.server.enter_room(sid, room)
+        print(f" Socket Connected: {sid} (user {user_id}, {role})")
 
     async def disconnect(self, sid):
         print(f" Socket Disconnected: {sid}")
 
-    async def broadcast_new_appointment(self, appointment_data):
+    async def resume(self, sid, data=None):
         """
-        Notifies ALL connected doctors/admins that a new booking happened.
+        Resume handshake, sent by the client on every (re)connect: {epoch, last_seq}.
+        Replays the missed events this socket's rooms would have received, then acks with
+        the current position. If they are no longer all in the log (or the epoch changed),
+        emits 'snapshot_required' instead and the client reloads once.
         """
-        print(f" Broadcasting Appointment: {appointment_data['id']}")
-        await self.server.emit('new_appointment', appointment_data)
+        data = data or {}
+        head = await self.log.head()
+        position = {"epoch": self.log.epoch, "seq": head}
+        last_seq = data.get("last_seq")
+        if last_seq is None:
+            # First connect: nothing to replay, just learn where the stream is
+            return {"status": "ok", **position}
 
-    async def broadcast_status_update(self, patient_id, status_data):
+        missed = None
+        if data.get("epoch") == self.log.epoch:
+            missed = await self.log.since(int(last_seq))
+        if missed is None:
+            await self.server.emit(SNAPSHOT_EVENT, position, to=sid, ignore_queue=True)
+            return {"status": "snapshot_required", **position}
+
+        session = await self.server.get_session(sid)
+        rooms = set(rooms_for_user(session.get("user_id"), session.get("role")))
+        replay = [logged.payload for logged in missed if rooms.intersection(logged.rooms)]
+        if replay:
+            # The socket is on this worker, so skip the pub/sub hop
+            await self.server.emit(BATCH_EVENT, replay, to=sid, ignore_queue=True)
+        # Not head: the log may hold later events it can't hand out yet (see PersistentEventLog)
+        seq = missed[-1].seq if missed else int(last_seq)
+        return {"status": "ok", "replayed": len(replay), "epoch": self.log.epoch, "seq": seq}
+
+    async def publish(self, kind: str, entity: str, record: dict, rooms: Iterable[str]):
+        """
+        Logs and queues one typed delta: the changed record (same shape as the staff listings)
+        and its version, so clients patch their local lists instead of refetching them.
+        """
+        payload = _delta_payload(kind, entity, record)
+        rooms = list(rooms)
+        seq = await self.log.append(DELTA_EVENT, payload, rooms)
+        print(f" SOCKET {kind}: {entity} #{record['id']} v{record['version']} (seq {seq})")
+        await self.scheduler.enqueue(rooms, payload)
+
+    async def publish_many(self, deltas: Iterable[tuple]):
         """
-        Notifies a specific patient (or everyone) about a status change (e.g., Medicine Ready).
+        Logs a set of (kind, entity, record) deltas and sends them at once as one message per
+        target room set, instead of one event per record.
         """
-        await self.server.emit('status_update', status_data)
+        outgoing = [(record_rooms(entity, record), _delta_payload(kind, entity, record)) for kind, entity, record in deltas]
+        # One write for the batch; stamps every payload with its seq
+        await self.log.append_many([(DELTA_EVENT, payload, rooms) for rooms, payload in outgoing])
+        print(f" SOCKET batch: {len(outgoing)} deltas")
+        await self.scheduler.send_now(outgoing)
 
-    async def broadcast(self, message: str):
+    async def appointment_event(self, kind: str, record: dict):
+        """
+        kind is one of "created", "status_changed" or "rescheduled".
+        """
+        await self.publish(kind, "appointment", record, record_rooms("appointment", record))
+
+    async def prescription_event(self, record: dict, kind: str = "prescription_status"):
+        """
+        kind is "prescription_status", or "created" for a new upload.
+        """
+        await self.publish(kind, "prescription", record, record_rooms("prescription", record))
+
+    async def broadcast_status_update(self, patient_id, status_data):
         """
-        Generic broadcaster for status messages.
+        Notifies a specific patient about a status change (e.g., Medicine Ready).
         """
-        print(f" SOCKET BROADCAST: {message}")
-        await self.server.emit('new_appointment', {'message': message})
+        await self.server.emit('status_update', status_data, to=patient_room(patient_id))
 
 socket_manager = SocketManager()
 
 # Register Event Handlers
 sio.on('connect', socket_manager.connect)
-sio.on('disconnect', socket_manager.disconnect)
\ No newline at end of file
+sio.on('disconnect', socket_manager.disconnect)
+sio.on('resume', socket_manager.resume)
@@ -0,0 +1,55 @@
+from typing import Dict, FrozenSet, Optional
+
+from backend.database import AppointmentStatus as A, OrderStatus as O
+
+# Which status an appointment or prescription may move to from its current one.
+# Setting the current status again is always allowed (a no-op, so retries are safe),
+# and "rescheduled" may repeat because each one moves the appointment again.
+# Statuses are stored lowercase; normalize_status() is applied to everything written.
+
+def _moves(*statuses) -> FrozenSet[str]:
+    return frozenset(s.value for s in statuses)
+
+APPOINTMENT_TRANSITIONS: Dict[str, FrozenSet[str]] = {
+    A.PENDING.value: _moves(A.CONFIRMED, A.IN_PROGRESS, A.PROCESSING, A.READY, A.COMPLETED, A.CANCELLED, A.RESCHEDULED),
+    A.NEW.value: _moves(A.CONFIRMED, A.PROCESSING, A.READY, A.COMPLETED, A.CANCELLED, A.RESCHEDULED),
+    A.CONFIRMED.value: _moves(A.IN_PROGRESS, A.PROCESSING, A.READY, A.COMPLETED, A.CANCELLED, A.RESCHEDULED),
+    A.RESCHEDULED.value: _moves(A.CONFIRMED, A.IN_PROGRESS, A.PROCESSING, A.COMPLETED, A.CANCELLED, A.RESCHEDULED),
+    A.IN_PROGRESS.value: _moves(A.COMPLETED, A.CANCELLED),
+    A.PROCESSING.value: _moves(A.READY, A.COMPLETED, A.CANCELLED),
+    A.READY.value: _moves(A.COMPLETED),
+    A.COMPLETED.value: _moves(),
+    A.CANCELLED.value: _moves(),
+}
+
+PRESCRIPTION_TRANSITIONS: Dict[str, FrozenSet[str]] = {
+    O.PENDING.value: _moves(O.PROCESSING, O.PREPARING, O.READY),
+    O.PROCESSING.value: _moves(O.PREPARING, O.READY),
+    O.PREPARING.value: _moves(O.READY),
+    O.READY.value: _moves(O.DELIVERED),
+    O.DELIVERED.value: _moves(),
+}
+
+TRANSITIONS = {
+    "appointment": APPOINTMENT_TRANSITIONS,
+    "prescription": PRESCRIPTION_TRANSITIONS,
+}
+
+def normalize_status(status: Optional[str]) -> Optional[str]:
+    return status.strip().lower() if status else status
+
+def transition_error(item_type: str, current: Optional[str], new: str) -> Optional[str]:
+    """
+    Why `current -> new` is not allowed for this item type, or None if it is.
+    """
+    table = TRANSITIONS.get(item_type)
+    if table is None:
+        return f"unknown item type '{item_type}'"
+    current, new = normalize_status(current), normalize_status(new)
+    if new not in table:
+        return f"unknown {item_type} status '{new}'"
+    if current == new and new != A.RESCHEDULED.value:
+        return None
+    if new not in table.get(current, frozenset()):
+        return f"cannot move {item_type} from '{current}' to '{new}'"
+    return None
@@ -0,0 +1,19 @@
+import math
+from typing import Iterable, Optional
+
+def summarize(values: Iterable[float]) -> Optional[dict]:
+    """
+    Count, mean and nearest-rank p50/p95/max of some durations (None if there are none).
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    def rank(p):
+        return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 1),
+        "p50": round(rank(0.50), 1),
+        "p95": round(rank(0.95), 1),
+        "max": round(ordered[-1], 1),
+    }
@@ -0,0 +1,103 @@
+"""
+Shared fixtures for the in-process API tests.
+
+The older test_*.py scripts in this folder talk to a running server on :8000.
+The tests that use these fixtures spin up the FastAPI app against a throwaway
+SQLite file instead, so they can run anywhere.
+"""
+import os
+import sys
+import tempfile
+
+from cryptography.fernet import Fernet
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# security.py builds its cipher at import time, so keys must exist before any backend import
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from backend.database import Base, get_async_db
+from backend.app import fastapi_app
+from backend.services.availability import availability_engine
+from backend.services.socket_manager import socket_manager
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Sync engine used by tests to seed and inspect the database."""
+    test_engine = create_engine(
+        f"sqlite:///{tmp_path}/test.db",
+        connect_args={"check_same_thread": False, "timeout": 30}
+    )
+    Base.metadata.create_all(bind=test_engine)
+    yield test_engine
+    test_engine.dispose()
+
+
+@pytest.fixture
+def async_engine(tmp_path, engine):
+    """Async engine the routers use, on the same database file.
+
+    TestClient runs each request on its own event loop, so connections are not pooled.
+    """
+    test_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path}/test.db",
+        connect_args={"timeout": 30},
+        poolclass=NullPool
+    )
+    yield test_engine
+    test_engine.sync_engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(async_engine):
+    async_session_factory = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with async_session_factory() as session:
+            yield session
+
+    fastapi_app.dependency_overrides[get_async_db] = override_get_async_db
+    # Every test gets a fresh database, so in-process caches keyed by row ids must start empty
+    availability_engine.invalidate()
+    # TestClient runs each request on its own event loop, which would end before a coalescing
+    # window fires; send realtime deltas straight away instead
+    socket_manager.scheduler.window = 0
+    yield TestClient(fastapi_app)
+    fastapi_app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def statements(async_engine):
+    """Records every SQL statement the routers send, for N+1 regression checks."""
+    captured = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    yield captured
+    event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import axios from 'axios';
-import { adminAPI } from '../services/adminApi';
+import { adminAPI, getAllPages } from '../services/adminApi';
 import io from 'socket.io-client';
 import {
     Activity, AlertCircle, AlertTriangle, ArrowLeft, ArrowRight, ArrowUp, ArrowUpRight, BarChart as BarChartIcon, Bell, Briefcase, Calendar, Check, CheckCircle2, ChevronLeft, ChevronRight, Clock, CreditCard, FileText, Info, LayoutDashboard, List, LogOut, MessageSquare, MoreHorizontal, Package, Pill, Plus, Printer, Receipt, RefreshCw, Search, Shield, TestTube, Trash2, TrendingUp, Truck, User, Users, X
@@ -62,7 +62,13 @@ const mockBillingData = [
 
 // Ensure backend URL is correct
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
-const socket = io(API_URL);
+// The server only accepts sockets with a valid login token and joins them to this role's rooms
+const socket = io(API_URL, {
+    autoConnect: false,
+    auth: (cb) => cb({ token: localStorage.getItem('admin_token') })
+});
+// Position in the server's event log; sent on reconnect so only missed events are replayed
+const eventCursor = { epoch: null, seq: null };
 
 const Dashboard = ({ onLogout, onBack }) => {
     const rawRole = localStorage.getItem('admin_role') || 'Admin';
@@ -107,10 +113,54 @@ const Dashboard = ({ onLogout, onBack }) => {
     const adminName = localStorage.getItem('admin_name') || 'Staff';
     const adminId = localStorage.getItem('admin_id');
 
+    // Tile counts are aggregated by the server; only this role's tiles come back
+    const fetchStats = async () => {
+        try {
+            const statsRes = await adminAPI.getDashboardStats(
+                adminRole === 'doctor' && adminId ? { role: adminRole, doctor_id: adminId } : { role: adminRole }
+            );
+            setStats(prev => ({ ...prev, ...statsRes.data }));
+        } catch (err) {
+            console.error("Failed to load dashboard stats", err);
+        }
+    };
+
+    // Realtime deltas carry the changed row in the same shape as the listings, plus its version.
+    // Replace (or add) it in place; anything not newer than what we hold is a stale/duplicate event.
+    const mergeRecord = (rows, record) => {
+        const index = rows.findIndex(r => r.id === record.id);
+        if (index === -1) return [...rows, record];
+        if ((rows[index].version || 0) >= record.version) return rows;
+        const next = rows.slice();
+        next[index] = { ...rows[index], ...record };
+        return next;
+    };
+
+    const applyDeltas = (deltas) => {
+        const visible = deltas.filter(delta => {
+            const record = delta?.record;
+            if (!record) return false;
+            if (delta.entity !== 'appointment') return true;
+            // Same scoping as fetchData: lab staff only list lab tests, doctors their own queue plus lab tests
+            if (adminRole === 'lab' && record.type !== 'lab_test') return false;
+            if (adminRole === 'doctor' && adminId && String(record.doctor_id) !== String(adminId) && record.type !== 'lab_test') return false;
+            return true;
+        });
+        const byEntity = (entity) => visible.filter(d => d.entity === entity).map(d => d.record);
+        const prescriptions = byEntity('prescription');
+        const appts = byEntity('appointment');
+        if (prescriptions.length) setOrders(prev => prescriptions.reduce(mergeRecord, prev));
+        if (appts.length) setAppointments(prev => appts.reduce(mergeRecord, prev));
+        fetchStats();
+    };
+
     const fetchData = async () => {
         try {
-            const apptRes = await adminAPI.getAppointments();
-            const rxRes = await adminAPI.getPharmacyOrders();
+            // Lab staff only ever look at lab tests, so let the server do that filtering.
+            // Newest first, following the cursor, so recent bookings are never cut off by the page size.
+            const listing = { order: 'desc', limit: 500 };
+            const apptRes = await getAllPages(adminAPI.getAppointments, adminRole === 'lab' ? { ...listing, type: 'lab_test' } : listing);
+            const rxRes = await getAllPages(adminAPI.getPharmacyOrders, listing);
             const invRes = await adminAPI.getMedicines();
             const docRes = await adminAPI.getDoctors();
 
@@ -164,12 +214,7 @@ const Dashboard = ({ onLogout, onBack }) => {
                 console.error("Failed to load users/roles", err);
             }
 
-            setStats({
-                doctors: (filteredAppts || []).filter(a => a?.type !== 'lab_test' && a?.status?.toLowerCase() === 'pending').length,
-                lab: (apptData || []).filter(a => a?.type === 'lab_test' && a?.status?.toLowerCase() !== 'completed').length, // Admins/Labs see all lab tests stats
-                pharmacy: (rxData || []).filter(o => o?.status?.toLowerCase() === 'preparing' || o?.status?.toLowerCase() === 'pending').length,
-                inventory: (invData || []).length
-            });
+            await fetchStats();
 
             setOrders(rxData);
             setInventory(invData);
@@ -206,14 +251,51 @@ const Dashboard = ({ onLogout, onBack }) => {
     useEffect(() => {
         fetchData(); // eslint-disable-line react-hooks/set-state-in-effect
 
-        socket.on('new_appointment', () => {
-            try {
-                const audio = new Audio('https://assets.mixkit.co/active_storage/sfx/2869/2869-preview.mp3');
-                audio.play().catch(() => console.log("Audio blocked"));
-            } catch { /* Audio blocked */ }
+        socket.connect();
+        socket.on('connect', () => {
+            const resumeFrom = eventCursor.seq === null ? {} : { epoch: eventCursor.epoch, last_seq: eventCursor.seq };
+            socket.emit('resume', resumeFrom, (ack) => {
+                if (ack?.status === 'ok') {
+                    eventCursor.epoch = ack.epoch;
+                    eventCursor.seq = Math.max(eventCursor.seq ?? 0, ack.seq);
+                }
+            });
+        });
+        // Missed too much while disconnected, fell behind, or the server restarted: reload once
+        socket.on('snapshot_required', (position) => {
+            if (position?.epoch) {
+                eventCursor.epoch = position.epoch;
+                eventCursor.seq = position.seq;
+            }
             fetchData();
         });
-        return () => socket.off('new_appointment');
+        // Deltas arrive coalesced: one message per burst, holding the newest version of each record
+        // Stale or repeated deltas are dropped per record by version (mergeRecord), never by seq:
+        // a delta with a lower seq than one already seen can still be new to this list
+        socket.on('delta_batch', (deltas) => {
+            const received = (deltas || []).filter(delta => delta?.record);
+            if (received.length === 0) return;
+            const unseen = received.filter(delta =>
+                !(delta.epoch === eventCursor.epoch && delta.seq <= (eventCursor.seq ?? 0))
+            );
+            received.forEach(delta => {
+                eventCursor.epoch = delta.epoch;
+                eventCursor.seq = Math.max(eventCursor.seq ?? 0, delta.seq);
+            });
+            if (unseen.some(delta => delta.type === 'created')) {
+                try {
+                    const audio = new Audio('https://assets.mixkit.co/active_storage/sfx/2869/2869-preview.mp3');
+                    audio.play().catch(() => console.log("Audio blocked"));
+                } catch { /* Audio blocked */ }
+            }
+            applyDeltas(received);
+        });
+        return () => {
+            socket.off('connect');
+            socket.off('snapshot_required');
+            socket.off('delta_batch');
+            socket.disconnect();
+        };
     }, []);
 
 
@@ -240,7 +322,9 @@ const Dashboard = ({ onLogout, onBack }) => {
             fetchData(); // Refresh table
         } catch (error) {
             console.error(error);
-            alert("Action Failed. Check console.");
+            // 409: transition not allowed from the current status (or a concurrent edit)
+            const detail = error.response?.data?.detail;
+            alert(typeof detail === 'string' ? `Action Failed: ${detail}` : "Action Failed. Check console.");
         }
     };
 
@@ -10,10 +10,28 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+// Follows X-Next-Cursor until the listing is exhausted (or maxPages is reached) and returns
+// every row in one { data } response, like a single-page call
+export const getAllPages = async (fetchPage, params = {}, maxPages = 20) => {
+  const rows = [];
+  let cursor;
+  for (let page = 0; page < maxPages; page++) {
+    const res = await fetchPage(cursor ? { ...params, cursor } : params);
+    if (Array.isArray(res?.data)) rows.push(...res.data);
+    cursor = res?.headers?.['x-next-cursor'];
+    if (!cursor) break;
+  }
+  return { data: rows };
+};
+
 export const adminAPI = {
   login: (email, password) => api.post('/auth/login', { email, password }),
-  getAppointments: () => api.get('/admin/appointments'),
-  getPharmacyOrders: () => api.get('/admin/pharmacy_queue'),
+  // Server-side filters (status, type, doctor_id, department, date_from, date_to) and
+  // keyset paging: pass `cursor` from the previous response's X-Next-Cursor header
+  getAppointments: (params = {}) => api.get('/admin/appointments', { params }),
+  getPharmacyOrders: (params = {}) => api.get('/admin/pharmacy_queue', { params }),
+  // Stat tiles computed server-side; pass { role, doctor_id } to get only that role's tiles
+  getDashboardStats: (params = {}) => api.get('/admin/dashboard', { params }),
 
   // FETCH PATIENTS & DOCTORS
   getPatients: () => api.get('/admin/patients'),
@@ -35,6 +53,10 @@ export const adminAPI = {
     }
   }),
 
+  // Many status changes in one call: [{ item_type, item_id, new_status, new_result?, new_date?, new_time? }].
+  // All-or-nothing: a 409 lists the operations whose transition is not allowed.
+  bulkUpdateStatus: (operations) => api.post('/admin/bulk_status', { operations }),
+
   // FETCH INVENTORY
   getMedicines: () => api.get('/pharmacy/medicines'),
 
@@ -22,6 +22,8 @@ export const patientAPI = {
   chat: (message, history) => api.post('/patient/chat', { message, history }),
   getDoctors: () => api.get('/patient/doctors'),
   getSlots: (doctorId, date) => api.get('/patient/slots', { params: { doctor_id: doctorId, date_str: date } }),
+  // Earliest free slots across all doctors of a department (one call instead of probing per doctor/date)
+  getEarliestSlots: (department, params = {}) => api.get('/patient/earliest_slots', { params: { department, ...params } }),
   bookAppointment: (data) => api.post('/patient/book_appointment', data),
   uploadPrescription: (formData) => api.post('/patient/upload_prescription', formData, {
     headers: { 'Content-Type': 'multipart/form-data' }
@@ -5,7 +5,7 @@ echo ===================================================
 
 :: 1. Backend Service
 echo [1/3] Starting Backend API (Port 8000)...
-start "Backend API" cmd /k "pip install -r backend/requirements.txt && uvicorn backend.app:app --reload --port 8000"
+start "Backend API" cmd /k "pip install -r backend/requirements.txt && python -m backend.seed && uvicorn backend.app:app --reload --port 8000"
 
 :: 2. Frontend User
 echo [2/3] Starting Patient Portal (Frontend User)...
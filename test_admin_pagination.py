@@ -0,0 +1,116 @@
+"""
+Keyset pagination and server-side filters on /admin/appointments and /admin/pharmacy_queue.
+"""
+from datetime import datetime, timedelta
+
+from backend.database import User, Appointment, Prescription
+
+
+def seed(db):
+    cardio = User(full_name="Dr. Heart", email="heart@test.com", role="doctor", department="Cardiology")
+    neuro = User(full_name="Dr. Brain", email="brain@test.com", role="doctor", department="Neurology")
+    patient = User(full_name="Page Patient", email="page@test.com", role="patient")
+    db.add_all([cardio, neuro, patient])
+    db.commit()
+
+    start = datetime(2026, 3, 1, 9, 0)
+    for i in range(25):
+        db.add(Appointment(
+            patient_id=patient.id,
+            doctor_id=cardio.id if i % 2 else neuro.id,
+            # Pairs share a timestamp so the id tiebreak is exercised
+            appointment_time=start + timedelta(hours=i // 2),
+            type="lab_test" if i % 5 == 0 else "clinic",
+            status="pending" if i % 3 else "confirmed"
+        ))
+        db.add(Prescription(patient_id=patient.id, status="preparing" if i % 2 else "ready", created_at=start + timedelta(hours=i)))
+    db.commit()
+    return cardio
+
+
+def walk(client, url, **params):
+    seen, cursor = [], None
+    while True:
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        seen.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return seen
+
+
+def test_pages_cover_every_row_once_in_order(client, db):
+    seed(db)
+    rows = walk(client, "/admin/appointments", limit=4)
+    assert len(rows) == 25
+    assert len({r["id"] for r in rows}) == 25
+    keys = [(r["appointment_time"], r["id"]) for r in rows]
+    assert keys == sorted(keys)
+
+
+def test_filters_are_applied_server_side(client, db):
+    cardio = seed(db)
+    by_doctor = walk(client, "/admin/appointments", limit=3, doctor_id=cardio.id)
+    assert by_doctor and all(r["doctor_id"] == cardio.id for r in by_doctor)
+
+    by_department = walk(client, "/admin/appointments", department="Cardiology")
+    assert {r["id"] for r in by_department} == {r["id"] for r in by_doctor}
+
+    labs = walk(client, "/admin/appointments", type="lab_test", status="pending,confirmed")
+    assert len(labs) == 5 and all(r["type"] == "lab_test" for r in labs)
+
+    one_day = walk(client, "/admin/appointments", date_from="2026-03-01", date_to="2026-03-01")
+    assert len(one_day) == 25
+    assert walk(client, "/admin/appointments", date_from="2026-03-02") == []
+
+
+def test_pharmacy_queue_pages_and_filters(client, db):
+    seed(db)
+    rows = walk(client, "/admin/pharmacy_queue", limit=7, status="preparing")
+    assert len(rows) == 12 and all(r["status"] == "preparing" for r in rows)
+
+
+def test_bad_cursor_is_rejected(client, db):
+    response = client.get("/admin/appointments", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_newest_first_listing_shows_recent_rows_beyond_one_page(client, db):
+    seed(db)
+    # More rows than one page: the newest must be on the first page, and walking covers all
+    first = client.get("/admin/appointments", params={"order": "desc", "limit": 10})
+    assert first.headers.get("X-Next-Cursor")
+    newest = max(walk(client, "/admin/appointments", limit=10), key=lambda r: (r["appointment_time"], r["id"]))
+    assert first.json()[0]["id"] == newest["id"]
+
+    rows = walk(client, "/admin/appointments", order="desc", limit=10)
+    keys = [(r["appointment_time"], r["id"]) for r in rows]
+    assert len(set(keys)) == 25 and keys == sorted(keys, reverse=True)
+
+    # Seeded prescriptions are created in id order
+    rx = [r["id"] for r in walk(client, "/admin/pharmacy_queue", order="desc", limit=4)]
+    assert len(rx) == 25 and rx == sorted(rx, reverse=True)
+    assert client.get("/admin/pharmacy_queue", params={"order": "sideways"}).status_code == 422
+
+
+def test_rows_without_a_timestamp_page_after_the_rest(client, db):
+    seed(db)
+    patient = db.query(User).filter_by(email="page@test.com").one()
+    # Legacy rows with no time; with 25 dated rows and limit 5, the first lands on a page boundary
+    undated = [Appointment(patient_id=patient.id, type="clinic", status="pending", appointment_time=None) for _ in range(3)]
+    db.add_all(undated + [Prescription(patient_id=patient.id, status="ready", created_at=None) for _ in range(2)])
+    db.commit()
+    undated_ids = [a.id for a in undated]
+
+    for order in ("asc", "desc"):
+        rows = walk(client, "/admin/appointments", limit=5, order=order)
+        dated = [(r["appointment_time"], r["id"]) for r in rows[:25]]
+        assert dated == sorted(dated, reverse=order == "desc")
+        assert [r["id"] for r in rows[25:]] == sorted(undated_ids, reverse=order == "desc")
+
+    first_page = client.get("/admin/appointments", params={"limit": 25})
+    assert first_page.status_code == 200 and first_page.headers.get("X-Next-Cursor")
+    assert [r["id"] for r in walk(client, "/admin/appointments", limit=1, cursor=first_page.headers["X-Next-Cursor"])] == undated_ids
+    assert len(walk(client, "/admin/pharmacy_queue", limit=5, order="desc")) == 27
@@ -0,0 +1,116 @@
+"""
+/patient/slots is served from the per-doctor, per-day availability bitmap, which must
+track bookings, cancellations and reschedules.
+"""
+from datetime import datetime, timedelta
+
+from backend.database import User, Appointment
+from backend.services.availability import SLOT_TIMES
+
+DAY = "2030-05-06"
+
+
+def make_people(db):
+    doctor = User(full_name="Dr. Slots", email="slots@test.com", role="doctor", department="General")
+    patient = User(full_name="Slot Patient", email="slotpat@test.com", role="patient", phone="111")
+    db.add_all([doctor, patient])
+    db.commit()
+    return doctor, patient
+
+
+def free_slots(client, doctor_id, day=DAY):
+    response = client.get("/patient/slots", params={"doctor_id": doctor_id, "date_str": day})
+    assert response.status_code == 200
+    return response.json()["slots"]
+
+
+def book(client, doctor, patient, slot, day=DAY):
+    response = client.post("/patient/book_appointment", json={
+        "patient_id": patient.id, "doctor_id": doctor.id,
+        "date_str": day, "time_slot": slot, "type": "clinic"
+    })
+    assert response.status_code == 200
+
+
+def test_booking_removes_slot_and_cancel_restores_it(client, db):
+    doctor, patient = make_people(db)
+    assert free_slots(client, doctor.id) == SLOT_TIMES
+
+    book(client, doctor, patient, "10:30")
+    assert "10:30" not in free_slots(client, doctor.id)
+    assert len(free_slots(client, doctor.id)) == len(SLOT_TIMES) - 1
+    # Other days are untouched
+    assert free_slots(client, doctor.id, "2030-05-07") == SLOT_TIMES
+
+    appt = db.query(Appointment).filter(Appointment.doctor_id == doctor.id).one()
+    client.post("/admin/update_status", params={"item_type": "appointment", "item_id": appt.id, "new_status": "cancelled"})
+    assert "10:30" in free_slots(client, doctor.id)
+
+
+def test_reschedule_moves_the_booked_slot(client, db):
+    doctor, patient = make_people(db)
+    book(client, doctor, patient, "09:00")
+    appt = db.query(Appointment).filter(Appointment.doctor_id == doctor.id).one()
+
+    client.post("/admin/update_status", params={
+        "item_type": "appointment", "item_id": appt.id, "new_status": "rescheduled",
+        "new_date": "2030-05-07", "new_time": "15:00"
+    })
+    assert "09:00" in free_slots(client, doctor.id)
+    assert "15:00" not in free_slots(client, doctor.id, "2030-05-07")
+
+
+def test_admin_booking_updates_bitmap(client, db):
+    doctor, _ = make_people(db)
+    assert "11:00" in free_slots(client, doctor.id)
+    response = client.post("/admin/book_appointment", json={
+        "patient_name": "Walk In", "patient_phone": "999", "doctor_id": doctor.id,
+        "date_str": DAY, "time_slot": "11:00", "type": "clinic"
+    })
+    assert response.status_code == 200
+    assert "11:00" not in free_slots(client, doctor.id)
+
+
+def test_earliest_slots_merge_across_department(client, db, statements):
+    doctors = [User(full_name=f"Dr. Cardio {i}", email=f"cardio{i}@test.com", role="doctor", department="Cardiology") for i in range(3)]
+    other = User(full_name="Dr. Skin", email="skin@test.com", role="doctor", department="Dermatology")
+    patient = User(full_name="Early Bird", email="early@test.com", role="patient")
+    db.add_all(doctors + [other, patient])
+    db.commit()
+
+    # Doctors 0 and 1 are fully booked on the first morning hour, doctor 2 is free
+    for doc in doctors[:2]:
+        for slot in ("09:00", "09:30"):
+            book(client, doc, patient, slot)
+
+    statements.clear()
+    response = client.get("/patient/earliest_slots", params={"department": "Cardiology", "date_from": DAY, "limit": 4})
+    assert response.status_code == 200
+    slots = response.json()["slots"]
+    # One query for the doctors plus one for the whole window
+    assert len(statements) == 2
+
+    assert [(s["time_slot"], s["doctor_id"]) for s in slots] == [
+        ("09:00", doctors[2].id),
+        ("09:30", doctors[2].id),
+        ("10:00", doctors[0].id),
+        ("10:00", doctors[1].id),
+    ]
+    assert all(s["date"] == DAY for s in slots)
+
+
+def test_earliest_slots_spill_into_next_day(client, db):
+    doctor, patient = make_people(db)
+    for slot in SLOT_TIMES:
+        book(client, doctor, patient, slot)
+    slots = client.get("/patient/earliest_slots", params={"department": "General", "date_from": DAY, "limit": 1}).json()["slots"]
+    assert slots == [{"doctor_id": doctor.id, "doctor_name": "Dr. Slots", "date": "2030-05-07", "time_slot": "09:00"}]
+
+
+def test_past_dates_offer_no_past_slots(client, db):
+    doctor, patient = make_people(db)
+    now = datetime.now()
+    slots = client.get("/patient/earliest_slots", params={"department": "General", "date_from": "2020-01-01", "limit": 50}).json()["slots"]
+    starts = [datetime.strptime(f"{s['date']} {s['time_slot']}", "%Y-%m-%d %H:%M") for s in slots]
+    assert len(starts) == 50 and min(starts) > now - timedelta(minutes=1)
+    assert free_slots(client, doctor.id, day="2020-01-01") == []
@@ -0,0 +1,85 @@
+"""
+Concurrency stress test: many clients race for the same doctor/slot at once.
+Exactly one booking may win; every other request must get a clean 409.
+
+Requests are fired concurrently on one event loop, the way a single uvicorn worker
+would interleave them.
+"""
+import asyncio
+
+import httpx
+
+from backend.app import fastapi_app
+from backend.database import User, Appointment
+
+DAY = "2030-06-03"
+PARALLEL_REQUESTS = 40
+
+
+def post_concurrently(calls):
+    async def main():
+        transport = httpx.ASGITransport(app=fastapi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            responses = await asyncio.gather(*(ac.post(url, json=payload) for url, payload in calls))
+        return [r.status_code for r in responses]
+    return asyncio.run(main())
+
+
+def test_parallel_bookings_for_one_slot_yield_single_winner(client, db):
+    doctor = User(full_name="Dr. Busy", email="busy@test.com", role="doctor", department="General")
+    patients = [User(full_name=f"Racer {i}", email=f"racer{i}@test.com", role="patient") for i in range(PARALLEL_REQUESTS)]
+    db.add_all([doctor] + patients)
+    db.commit()
+
+    codes = post_concurrently([
+        ("/patient/book_appointment", {
+            "patient_id": p.id, "doctor_id": doctor.id,
+            "date_str": DAY, "time_slot": "10:00", "type": "clinic"
+        }) for p in patients
+    ])
+
+    assert codes.count(200) == 1
+    assert codes.count(409) == PARALLEL_REQUESTS - 1
+    assert db.query(Appointment).filter(Appointment.doctor_id == doctor.id).count() == 1
+    assert "10:00" not in client.get("/patient/slots", params={"doctor_id": doctor.id, "date_str": DAY}).json()["slots"]
+
+
+def test_admin_and_patient_race_for_the_same_slot(client, db):
+    doctor = User(full_name="Dr. Shared", email="shared@test.com", role="doctor", department="General")
+    patient = User(full_name="Online Patient", email="online@test.com", role="patient")
+    db.add_all([doctor, patient])
+    db.commit()
+
+    patient_booking = ("/patient/book_appointment", {
+        "patient_id": patient.id, "doctor_id": doctor.id,
+        "date_str": DAY, "time_slot": "12:00", "type": "clinic"
+    })
+    admin_bookings = [("/admin/book_appointment", {
+        "patient_name": f"Walk In {i}", "patient_phone": f"700{i}", "doctor_id": doctor.id,
+        "date_str": DAY, "time_slot": "12:00", "type": "clinic"
+    }) for i in range(5)]
+
+    codes = post_concurrently([patient_booking] * 5 + admin_bookings)
+    assert codes.count(200) == 1
+    assert codes.count(409) == 9
+
+
+def test_cancelled_slot_can_be_rebooked_and_reschedule_conflicts(client, db):
+    doctor = User(full_name="Dr. Again", email="again@test.com", role="doctor", department="General")
+    patient = User(full_name="Repeat", email="repeat@test.com", role="patient")
+    db.add_all([doctor, patient])
+    db.commit()
+    payload = {"patient_id": patient.id, "doctor_id": doctor.id, "date_str": DAY, "time_slot": "14:00", "type": "clinic"}
+
+    assert client.post("/patient/book_appointment", json=payload).status_code == 200
+    first = db.query(Appointment).filter(Appointment.doctor_id == doctor.id).one()
+    client.post("/admin/update_status", params={"item_type": "appointment", "item_id": first.id, "new_status": "cancelled"})
+    assert client.post("/patient/book_appointment", json=payload).status_code == 200
+
+    assert client.post("/patient/book_appointment", json={**payload, "time_slot": "15:00"}).status_code == 200
+    third = db.query(Appointment).filter(Appointment.doctor_id == doctor.id).order_by(Appointment.id.desc()).first()
+    response = client.post("/admin/update_status", params={
+        "item_type": "appointment", "item_id": third.id, "new_status": "rescheduled",
+        "new_date": DAY, "new_time": "14:00"
+    })
+    assert response.status_code == 409
@@ -0,0 +1,84 @@
+"""
+/admin/bulk_status validates every transition up front, writes them with a few
+grouped UPDATEs in one transaction and sends one aggregated socket message.
+"""
+from datetime import datetime, timedelta
+
+from backend.database import User, Appointment, Prescription, StatCounter
+from backend.services.socket_manager import socket_manager
+from test_counters import recomputed_counters, stored_counters
+from test_socket_rooms import RecordingServer
+
+
+def seed(db):
+    doctor = User(full_name="Dr. Bulk", email="doc@bulk.test", role="doctor")
+    patient = User(full_name="Pat Bulk", email="pat@bulk.test", role="patient")
+    db.add_all([doctor, patient])
+    db.commit()
+    start = datetime(2026, 6, 1, 9, 0)
+    labs = [Appointment(patient_id=patient.id, type="lab_test", status="processing", appointment_time=start + timedelta(minutes=i))
+            for i in range(5)]
+    visit = Appointment(patient_id=patient.id, doctor_id=doctor.id, type="clinic", status="confirmed", appointment_time=start)
+    orders = [Prescription(patient_id=patient.id, status="preparing") for _ in range(30)]
+    db.add_all(labs + [visit] + orders)
+    db.commit()
+    return patient, doctor, labs, visit, orders
+
+
+def test_bulk_transitions_in_one_transaction(client, db, engine, statements, monkeypatch):
+    server = RecordingServer()
+    monkeypatch.setattr(socket_manager, "server", server)
+    patient, doctor, labs, visit, orders = seed(db)
+
+    operations = [{"item_type": "prescription", "item_id": rx.id, "new_status": "ready"} for rx in orders]
+    operations += [{"item_type": "appointment", "item_id": lab.id, "new_status": "completed"} for lab in labs[1:]]
+    operations += [
+        {"item_type": "appointment", "item_id": labs[0].id, "new_status": "completed", "new_result": "HbA1c 5.4%"},
+        {"item_type": "appointment", "item_id": visit.id, "new_status": "rescheduled", "new_date": "2026-06-02", "new_time": "10:30"},
+    ]
+    statements.clear()
+    response = client.post("/admin/bulk_status", json={"operations": operations})
+    assert response.status_code == 200
+    assert response.json() == {"updated": 36, "unchanged": 0}
+
+    # Two grouped UPDATEs (prescriptions, lab tests) plus the two rows with their own values
+    updates = [s for s in statements if s.lstrip().upper().startswith("UPDATE")]
+    assert len(updates) == 4
+
+    db.expire_all()
+    assert {rx.status for rx in db.query(Prescription)} == {"ready"}
+    assert db.get(Appointment, labs[0].id).lab_result == "HbA1c 5.4%"
+    moved = db.get(Appointment, visit.id)
+    assert (moved.status, moved.appointment_time, moved.version) == ("rescheduled", datetime(2026, 6, 2, 10, 30), 2)
+    assert stored_counters(db) == recomputed_counters(engine)
+
+    # One message per target room set, not one per record
+    assert [event for event, _, _ in server.emitted] == ["delta_batch"] * len(server.emitted)
+    assert len(server.emitted) == 3
+    assert sum(len(batch) for _, batch, _ in server.emitted) == 36
+    kinds = {delta["id"]: delta["type"] for _, batch, _ in server.emitted for delta in batch if delta["entity"] == "appointment"}
+    assert kinds[visit.id] == "rescheduled" and kinds[labs[0].id] == "status_changed"
+
+
+def test_invalid_transition_rejects_the_whole_batch(client, db):
+    patient, doctor, labs, visit, orders = seed(db)
+    response = client.post("/admin/bulk_status", json={"operations": [
+        {"item_type": "prescription", "item_id": orders[0].id, "new_status": "ready"},
+        {"item_type": "prescription", "item_id": orders[1].id, "new_status": "delivered"},
+        {"item_type": "appointment", "item_id": 999999, "new_status": "completed"},
+        {"item_type": "appointment", "item_id": visit.id, "new_status": "rescheduled"},
+    ]})
+    assert response.status_code == 409
+    errors = response.json()["detail"]["errors"]
+    assert [e["index"] for e in errors] == [1, 2, 3]
+    assert "cannot move prescription from 'preparing' to 'delivered'" in errors[0]["error"]
+
+    db.expire_all()
+    assert db.get(Prescription, orders[0].id).status == "preparing"
+
+
+def test_repeating_a_batch_is_a_no_op(client, db):
+    patient, doctor, labs, visit, orders = seed(db)
+    operations = [{"item_type": "prescription", "item_id": rx.id, "new_status": "ready"} for rx in orders[:3]]
+    assert client.post("/admin/bulk_status", json={"operations": operations}).json() == {"updated": 3, "unchanged": 0}
+    assert client.post("/admin/bulk_status", json={"operations": operations}).json() == {"updated": 0, "unchanged": 3}
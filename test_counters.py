@@ -0,0 +1,87 @@
+"""
+stat_counters must move with every write, so the health check can read totals
+in one statement instead of counting whole tables.
+"""
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from backend.database import User, Appointment, Prescription, StatCounter
+from backend.services.counters import rebuild
+
+
+def stored_counters(db):
+    db.expire_all()
+    return {row.key: row.value for row in db.query(StatCounter) if row.value}
+
+
+def recomputed_counters(engine):
+    # Rebuild on a copy of the transaction and roll it back, leaving the real counters untouched
+    with engine.connect() as conn:
+        trans = conn.begin()
+        rebuild(conn)
+        counts = {row.key: row.value for row in Session(bind=conn).query(StatCounter) if row.value}
+        trans.rollback()
+    return counts
+
+
+def seed(db):
+    patient = User(full_name="Pat Counter", email="pat@counter.test", role="patient")
+    db.add(patient)
+    db.commit()
+    db.add_all([
+        Appointment(patient_id=patient.id, appointment_time=datetime(2026, 3, 2, 9, 0), type="clinic"),
+        Appointment(patient_id=patient.id, appointment_time=datetime(2026, 3, 2, 9, 30), type="lab_test", status="new"),
+        Prescription(patient_id=patient.id, status="pending"),
+    ])
+    db.commit()
+    return patient
+
+
+def test_counters_follow_inserts_updates_and_deletes(engine, db):
+    seed(db)
+    assert stored_counters(db) == recomputed_counters(engine)
+    assert stored_counters(db)["appointments:clinic:pending"] == 1
+
+    # Expired after commit: the old status is not loaded when it is overwritten
+    rx = db.query(Prescription).one()
+    db.expire(rx)
+    rx.status = "ready"
+    appt = db.query(Appointment).filter(Appointment.type == "lab_test").one()
+    appt.status = "completed"
+    db.commit()
+    assert stored_counters(db) == recomputed_counters(engine)
+    assert stored_counters(db)["prescriptions:ready"] == 1
+
+    db.delete(db.query(Appointment).filter(Appointment.type == "clinic").one())
+    db.add(User(full_name="Dr. Counter", email="doc@counter.test", role="doctor"))
+    db.commit()
+    counts = stored_counters(db)
+    assert counts == recomputed_counters(engine)
+    assert counts["appointments"] == 1 and counts["users"] == 2
+    assert "appointments:clinic:pending" not in counts
+
+
+def test_health_check_reads_counters_in_one_statement(client, db, engine, statements):
+    seed(db)
+    appt = db.query(Appointment).filter(Appointment.type == "clinic").one()
+
+    response = client.post("/admin/update_status", params={"item_type": "appointment", "item_id": appt.id, "new_status": "confirmed"})
+    assert response.status_code == 200
+    assert stored_counters(db) == recomputed_counters(engine)
+
+    statements.clear()
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.json()["counts"] == {"users": 1, "appointments": 2, "prescriptions": 1}
+    assert len(statements) == 1
+
+
+def test_liveness_and_readiness(client, statements):
+    statements.clear()
+    assert client.get("/health/live").json() == {"status": "alive"}
+    assert statements == []
+
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
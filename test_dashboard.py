@@ -0,0 +1,49 @@
+"""
+/admin/dashboard returns the stat tiles from rollups, never the underlying rows.
+"""
+from datetime import datetime, timedelta
+
+from backend.database import User, Appointment, Prescription
+from backend.routers.pharmacy import MEDICINES_DB
+
+
+def seed(db):
+    doctor = User(full_name="Dr. Tile", email="doc@tile.test", role="doctor")
+    other = User(full_name="Dr. Other", email="other@tile.test", role="doctor")
+    patient = User(full_name="Pat Tile", email="pat@tile.test", role="patient")
+    db.add_all([doctor, other, patient])
+    db.commit()
+
+    start = datetime(2026, 4, 6, 9, 0)
+    rows = [
+        (doctor.id, "clinic", "pending"),
+        (doctor.id, "online", "Pending"),
+        (doctor.id, "clinic", "completed"),
+        (other.id, "clinic", "pending"),
+        (None, "lab_test", "new"),
+        (None, "lab_test", "processing"),
+        (None, "lab_test", "completed"),
+    ]
+    for i, (doctor_id, kind, status) in enumerate(rows):
+        db.add(Appointment(patient_id=patient.id, doctor_id=doctor_id, type=kind, status=status,
+                           appointment_time=start + timedelta(minutes=30 * i)))
+    for status in ("pending", "preparing", "ready", "delivered"):
+        db.add(Prescription(patient_id=patient.id, status=status))
+    db.commit()
+    return doctor
+
+
+def test_admin_gets_every_tile_in_one_statement(client, db, statements):
+    seed(db)
+    statements.clear()
+    response = client.get("/admin/dashboard")
+    assert response.status_code == 200
+    assert response.json() == {"doctors": 3, "lab": 2, "pharmacy": 2, "inventory": len(MEDICINES_DB)}
+    assert len(statements) == 1
+
+
+def test_roles_only_get_their_own_tiles(client, db):
+    doctor = seed(db)
+    assert client.get("/admin/dashboard", params={"role": "lab"}).json() == {"lab": 2}
+    assert client.get("/admin/dashboard", params={"role": "pharmacist"}).json() == {"pharmacy": 2, "inventory": len(MEDICINES_DB)}
+    assert client.get("/admin/dashboard", params={"role": "doctor", "doctor_id": doctor.id}).json() == {"doctors": 2}
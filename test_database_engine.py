@@ -0,0 +1,48 @@
+"""
+Engine factory: SQLite connections get the WAL/busy-timeout pragmas, and pool stats are exposed.
+"""
+import asyncio
+
+from sqlalchemy import text
+
+from backend.config import settings
+from backend.database import build_engine, build_async_engine, normalize_url, to_async_url, engine_options
+
+
+def test_sqlite_connections_get_pragmas(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path}/pragmas.db")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == settings.SQLITE_BUSY_TIMEOUT_MS
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -settings.SQLITE_CACHE_SIZE_KB
+    engine.dispose()
+
+
+def test_async_sqlite_connections_get_pragmas(tmp_path):
+    async def journal_mode():
+        engine = build_async_engine(f"sqlite:///{tmp_path}/pragmas_async.db")
+        async with engine.connect() as conn:
+            mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+        await engine.dispose()
+        return mode
+    assert asyncio.run(journal_mode()) == "wal"
+
+
+def test_url_handling_and_postgres_pool_options():
+    assert normalize_url("postgres://u:p@h/db") == "postgresql://u:p@h/db"
+    assert to_async_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    assert to_async_url("sqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+
+    options = engine_options("postgresql://u:p@h/db")
+    assert options["pool_pre_ping"] is True
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+    assert options["max_overflow"] == settings.DB_MAX_OVERFLOW
+    assert "pool_size" not in engine_options("sqlite:///x.db")
+
+
+def test_pool_stats_endpoint(client):
+    stats = client.get("/health/db").json()
+    assert "p@" not in stats["database"]
+    assert {"sync", "async"} <= set(stats)
+    assert "connects" in stats["async"] and "pool_class" in stats["sync"]
@@ -0,0 +1,127 @@
+"""
+Burst handling on the realtime path: deltas are coalesced per target rooms, and
+slow clients are capped at a high-water mark instead of buffering without limit.
+"""
+import asyncio
+import json
+
+from engineio import packet as eio_packet
+
+from backend.services.emission import BoundedSendServer, EmissionScheduler
+
+
+def delta(id, version=1, seq=0):
+    return {"entity": "appointment", "id": id, "version": version, "seq": seq}
+
+
+def test_burst_is_coalesced_into_one_message_per_target():
+    sent = []
+
+    async def emit(event, data, to):
+        sent.append((event, data, to))
+
+    async def scenario():
+        scheduler = EmissionScheduler(emit, window=0.02)
+        for i in range(300):
+            await scheduler.enqueue(["role:admin", "role:lab"], delta(i, seq=i))
+        await scheduler.enqueue(["role:admin", "role:lab"], delta(5, version=2, seq=300))
+        await scheduler.enqueue(["role:admin", "role:lab"], delta(6, version=0, seq=301))  # stale, ignored
+        await scheduler.enqueue(["role:admin", "patient:9"], delta(7, seq=302))
+        assert sent == []
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert [(event, to, len(data)) for event, data, to in sent] == [
+        ("delta_batch", ["role:admin", "role:lab"], 300),
+        ("delta_batch", ["patient:9", "role:admin"], 1),
+    ]
+    lab_batch = sent[0][1]
+    # Only the newest version of a record is sent, in the position of its latest change
+    assert lab_batch[-1] == delta(5, version=2, seq=300)
+    assert [d for d in lab_batch if d["id"] == 6] == [delta(6, seq=6)]
+
+
+def test_overlapping_room_sets_reach_a_shared_socket_in_seq_order():
+    sent = []
+
+    async def emit(event, data, to):
+        sent.append((to, [d["seq"] for d in data]))
+
+    lab, patient = ["role:admin", "role:lab"], ["patient:9", "role:admin"]
+
+    async def scenario():
+        scheduler = EmissionScheduler(emit, window=0.02)
+        await scheduler.enqueue(lab, delta(1, seq=1))
+        await scheduler.enqueue(lab, delta(2, seq=2))
+        await scheduler.enqueue(patient, delta(3, seq=3))
+        await scheduler.enqueue(lab, delta(4, seq=4))
+        await asyncio.sleep(0.05)
+        await scheduler.send_now([(patient, delta(5, seq=5)), (lab, delta(6, seq=6)), (patient, delta(7, seq=7))])
+
+    asyncio.run(scenario())
+    # What an admin socket (in both room sets) receives, message by message
+    admin_seqs = [seq for to, seqs in sent if "role:admin" in to for seq in seqs]
+    assert admin_seqs == [1, 2, 3, 4, 5, 6, 7]
+    assert sent[0] == (lab, [1, 2])
+
+
+class QueuedSocket:
+    """An engine.io socket whose client never reads: packets pile up in its queue."""
+
+    closed = False
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def send(self, pkt):
+        self.queue.put_nowait(pkt)
+
+
+def event_names(queue):
+    names = []
+    while not queue.empty():
+        names.append(json.loads(queue.get_nowait().data[1:])[0])
+    return names
+
+
+def test_slow_client_is_capped_and_told_to_resync():
+    async def scenario():
+        server = BoundedSendServer(async_mode="asgi", high_water_mark=4)
+        socket = QueuedSocket()
+        server.eio.sockets["slow"] = socket
+
+        def message():
+            return eio_packet.Packet(eio_packet.MESSAGE, '2["delta_batch",[]]')
+
+        for _ in range(10):
+            await server._send_eio_packet("slow", message())
+        backlog = event_names(socket.queue)
+
+        # Client caught up: it is told to resync once more, then live events flow again
+        await server._send_eio_packet("slow", message())
+        await server._send_eio_packet("slow", message())
+        return backlog, event_names(socket.queue), server.dropped
+
+    backlog, after, dropped = asyncio.run(scenario())
+    assert backlog == ["delta_batch"] * 4 + ["snapshot_required"]
+    assert after == ["snapshot_required", "delta_batch", "delta_batch"]
+    assert dropped == 6
+
+
+def test_bounded_server_hooks_are_still_called_by_socketio():
+    # Guards the private overrides against a python-socketio upgrade: a public emit must go
+    # through _send_eio_packet, and Engine.IO's disconnect handler must clear a lagging client
+    async def scenario():
+        server = BoundedSendServer(async_mode="asgi", high_water_mark=2)
+        socket = QueuedSocket()
+        server.eio.sockets["eio-1"] = socket
+        sid = await server.manager.connect("eio-1", "/")
+        for i in range(3):
+            await server.emit("delta_batch", [i], to=sid)
+        lagging = dict(server.lagging)
+        await server.eio._trigger_event("disconnect", "eio-1", run_async=False)
+        return lagging, server.lagging, server.manager.is_connected(sid, "/")
+
+    lagging, after, connected = asyncio.run(scenario())
+    assert lagging == {"eio-1": 0}  # the third emit hit the mark and became snapshot_required
+    assert after == {} and not connected
@@ -0,0 +1,101 @@
+"""
+The realtime event log hands out increasing sequence numbers and can say exactly
+which events came after a given one, or that it no longer has them all.
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.database import RealtimeEvent
+from backend.services.event_log import EventLog, PersistentEventLog
+
+
+async def fill(log, count):
+    return [await log.append("delta", {"id": i}, ["role:admin"]) for i in range(count)]
+
+
+def test_ring_buffer_keeps_the_latest_events():
+    log = EventLog(capacity=3)
+    assert asyncio.run(fill(log, 5)) == [1, 2, 3, 4, 5]
+
+    missed = asyncio.run(log.since(2))
+    assert [e.seq for e in missed] == [3, 4, 5]
+    assert missed[0].payload == {"id": 2, "seq": 3, "epoch": log.epoch}
+    assert asyncio.run(log.since(5)) == []
+    # Event 2 has been pushed out, and seq 6 is from some other life of the server
+    assert asyncio.run(log.since(1)) is None
+    assert asyncio.run(log.since(6)) is None
+
+
+def test_persistent_log_survives_a_new_instance(async_engine):
+    factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+    async def scenario():
+        first = PersistentEventLog(capacity=200, session_factory=factory)
+        seqs = await fill(first, 3)
+        second = PersistentEventLog(capacity=200, session_factory=factory)
+        return seqs, second.epoch == first.epoch, await second.head(), await second.since(1), await second.since(4)
+
+    seqs, same_epoch, head, missed, ahead = asyncio.run(scenario())
+    assert seqs == [1, 2, 3] and same_epoch and head == 3
+    assert [(e.seq, e.payload["id"], e.rooms) for e in missed] == [(2, 1, ("role:admin",)), (3, 2, ("role:admin",))]
+    assert ahead is None
+
+
+def test_persistent_log_trims_to_capacity(async_engine):
+    factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    log = PersistentEventLog(capacity=50, session_factory=factory)
+    asyncio.run(fill(log, 200))
+    assert asyncio.run(log.since(100)) is None
+    assert [e.seq for e in asyncio.run(log.since(160))] == list(range(161, 201))
+
+
+def test_persistent_log_stops_at_a_seq_still_being_committed(async_engine):
+    factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    log = PersistentEventLog(capacity=200, session_factory=factory)
+    now = datetime.utcnow()
+
+    async def write(*seqs, created_at=now):
+        async with factory() as db:
+            db.add_all([RealtimeEvent(seq=seq, event="delta", rooms=["role:admin"], payload={"seq": seq}, created_at=created_at)
+                        for seq in seqs])
+            await db.commit()
+
+    async def scenario():
+        await write(1, 2, 4) # 3 was handed out on another worker and is not committed yet
+        early = [e.seq for e in await log.since(1)], await log.head(), await log.since(2)
+        await write(3)
+        late = [e.seq for e in await log.since(1)], await log.head()
+        # A hole that stays open (its append rolled back) is stepped over once it is old
+        await write(5, 7, created_at=now - timedelta(seconds=60))
+        return early, late, [e.seq for e in await log.since(4)]
+
+    early, late, after_rollback = asyncio.run(scenario())
+    assert early == ([2], 2, [])
+    assert late == ([2, 3, 4], 4)
+    assert after_rollback == [5, 7]
+
+
+def test_persistent_log_writes_a_batch_in_one_commit(async_engine):
+    from sqlalchemy import event
+
+    factory = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+    log = PersistentEventLog(capacity=200, session_factory=factory)
+    statements, commits = [], []
+    count_statement = lambda conn, cursor, statement, *rest: statements.append(statement)
+    count_commit = lambda conn: commits.append(1)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    event.listen(async_engine.sync_engine, "commit", count_commit)
+    payloads = [{"id": i} for i in range(5)]
+    try:
+        seqs = asyncio.run(log.append_many([("delta", payload, ["role:admin"]) for payload in payloads]))
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+        event.remove(async_engine.sync_engine, "commit", count_commit)
+
+    assert seqs == [1, 2, 3, 4, 5]
+    assert [p["seq"] for p in payloads] == seqs and {p["epoch"] for p in payloads} == {"db"}
+    assert len(statements) == 1 and statements[0].startswith("INSERT") and len(commits) == 1
+    missed = asyncio.run(log.since(3))
+    assert [e.payload for e in missed] == [{"id": 3, "seq": 4, "epoch": "db"}, {"id": 4, "seq": 5, "epoch": "db"}]
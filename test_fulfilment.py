@@ -0,0 +1,152 @@
+"""
+Pharmacy fulfilment queue: gold members first, then oldest first, across prescriptions
+and cart orders; pharmacists claim disjoint items and move them to delivery.
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from backend.database import User, Order, Prescription, StatusHistory
+from backend.routers import pharmacy
+from backend.services.fulfilment import FulfilmentQueue, QueueItem
+from test_counters import recomputed_counters, stored_counters
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    fresh = FulfilmentQueue(lease_seconds=900, resync_seconds=60)
+    monkeypatch.setattr(pharmacy, "fulfilment_queue", fresh)
+    return fresh
+
+
+def seed(db):
+    gold = User(full_name="Gold Member", email="gold@rx.test", role="patient", is_gold_member=True)
+    plain = User(full_name="Plain Member", email="plain@rx.test", role="patient")
+    db.add_all([gold, plain])
+    db.commit()
+    now = datetime.utcnow()
+    rx = [
+        Prescription(patient_id=plain.id, status="preparing", created_at=now - timedelta(hours=5)),
+        Prescription(patient_id=gold.id, status="preparing", created_at=now - timedelta(hours=1)),
+        Prescription(patient_id=plain.id, status="processing", created_at=now - timedelta(hours=3)),
+        Prescription(patient_id=gold.id, status="ready", created_at=now - timedelta(hours=9)),  # already packed
+    ]
+    db.add_all(rx)
+    db.commit()
+    return gold, plain, rx
+
+
+def test_heap_orders_gold_first_then_oldest():
+    queue = FulfilmentQueue()
+    start = datetime(2026, 1, 1)
+    items = [QueueItem("order", i, random.random() < 0.2, start + timedelta(seconds=random.randrange(10**6)), "pending")
+             for i in range(5000)]
+    for item in items:
+        queue.push(item)
+    popped = [queue._pop() for _ in items]
+    assert [item.priority for item in popped] == sorted(item.priority for item in items)
+    assert queue._pop() is None
+
+
+def test_queue_priority_across_prescriptions_and_orders(client, db, queue):
+    gold, plain, rx = seed(db)
+    order = client.post("/pharmacy/orders", json={"user_id": gold.id, "items": [{"product_id": 3, "product_name": "Dolo 650", "quantity": 2, "price": 30}]}).json()
+
+    peeked = client.get("/pharmacy/queue").json()
+    # Gold: rx[1] (1h old) then the order (just now); then everyone else oldest first
+    assert [(e["kind"], e["id"]) for e in peeked] == [
+        ("prescription", rx[1].id), ("order", order["id"]), ("prescription", rx[0].id), ("prescription", rx[2].id)
+    ]
+    assert peeked[0]["record"]["patient_name"] == "Gold Member"
+    assert [(i["product_id"], i["quantity"]) for i in peeked[1]["record"]["items"]] == [(3, 2)]
+    assert peeked[1]["record"]["total_amount"] == 60
+
+
+def test_pharmacists_claim_disjoint_items_and_deliver(client, db, engine, queue):
+    gold, plain, rx = seed(db)
+    order = client.post("/pharmacy/orders", json={"user_id": plain.id, "items": []}).json()
+
+    first = client.post("/pharmacy/queue/claim", json={"pharmacist": "ana", "limit": 2}).json()["items"]
+    second = client.post("/pharmacy/queue/claim", json={"pharmacist": "ben", "limit": 5}).json()["items"]
+    assert [e["id"] for e in first] == [rx[1].id, rx[0].id]
+    assert [e["id"] for e in second] == [rx[2].id, order["id"]]
+    assert client.post("/pharmacy/queue/claim", json={"pharmacist": "cy", "limit": 5}).json()["items"] == []
+
+    db.expire_all()
+    assert db.get(Prescription, rx[1].id).claimed_by == "ana"
+
+    advance = lambda kind, item_id, who, status: client.post(
+        f"/pharmacy/queue/{kind}/{item_id}/advance", json={"pharmacist": who, "status": status}
+    )
+    assert advance("prescription", rx[1].id, "ben", "ready").status_code == 409  # not Ben's
+    assert advance("prescription", rx[1].id, "ana", "delivered").status_code == 409  # must be packed first
+    assert advance("prescription", rx[1].id, "ana", "ready").status_code == 200
+    assert advance("prescription", rx[1].id, "ana", "delivered").status_code == 200
+    assert advance("prescription", rx[1].id, "ana", "delivered").status_code == 409  # released on delivery
+    assert advance("order", order["id"], "ben", "processing").json()["status"] == "processing"
+    db.expire_all()
+    assert (db.get(Order, order["id"]).status, db.get(Order, order["id"]).claimed_by) == ("processing", "ben")
+
+    db.expire_all()
+    delivered = db.get(Prescription, rx[1].id)
+    assert (delivered.status, delivered.version, delivered.lease_expires_at) == ("delivered", 3, None)
+    assert [(h.from_status, h.to_status) for h in db.query(StatusHistory).filter_by(item_id=rx[1].id)] == [
+        ("preparing", "ready"), ("ready", "delivered")
+    ]
+    assert stored_counters(db) == recomputed_counters(engine)
+
+    metrics = client.get("/pharmacy/queue/metrics").json()
+    assert (metrics["queued"], metrics["claimed"]) == (0, 3)
+    assert metrics["stages"]["queued"]["count"] == 4
+    assert metrics["stages"]["queued"]["max"] >= 5 * 3600 - 5
+    assert metrics["stages"]["preparing"]["count"] == 1 and metrics["stages"]["ready"]["count"] == 1
+
+
+def test_expired_claims_return_to_the_queue(client, db, queue, async_engine):
+    gold, plain, rx = seed(db)
+    queue.lease_seconds = -1
+    stale = client.post("/pharmacy/queue/claim", json={"pharmacist": "ana", "limit": 1}).json()["items"]
+    assert [e["id"] for e in stale] == [rx[1].id]
+
+    queue.lease_seconds = 900
+    again = client.post("/pharmacy/queue/claim", json={"pharmacist": "ben", "limit": 1}).json()["items"]
+    assert [e["id"] for e in again] == [rx[1].id]
+    assert client.post(f"/pharmacy/queue/prescription/{rx[1].id}/advance", json={"pharmacist": "ana", "status": "ready"}).status_code == 409
+
+    # Another worker's queue only sees what this one has not claimed
+    other = FulfilmentQueue()
+
+    async def sync_other():
+        async with async_sessionmaker(bind=async_engine)() as session:
+            await other.sync(session, datetime.utcnow())
+
+    asyncio.run(sync_other())
+    assert [item.item_id for item in other.peek(10)] == [rx[0].id, rx[2].id]
+
+
+def test_advance_checks_the_lease_on_the_row_from_any_worker(client, db, queue, monkeypatch):
+    gold, plain, rx = seed(db)
+    claimed = client.post("/pharmacy/queue/claim", json={"pharmacist": "ana", "limit": 1}).json()["items"]
+    assert [e["id"] for e in claimed] == [rx[1].id]
+
+    # A different worker (or this one after a restart) has never seen the claim
+    monkeypatch.setattr(pharmacy, "fulfilment_queue", FulfilmentQueue())
+    advance = lambda who, status: client.post(
+        f"/pharmacy/queue/prescription/{rx[1].id}/advance", json={"pharmacist": who, "status": status}
+    )
+    assert advance("ben", "ready").status_code == 409
+    assert advance("ana", "ready").json()["status"] == "ready"
+
+    # The original worker still caches the claim, but the row's lease has run out
+    monkeypatch.setattr(pharmacy, "fulfilment_queue", queue)
+    row = db.get(Prescription, rx[1].id)
+    db.refresh(row)
+    row.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert advance("ana", "delivered").status_code == 409
+    db.expire_all()
+    assert db.get(Prescription, rx[1].id).status == "ready"
+    assert client.get("/pharmacy/queue/metrics").json()["scope"] == "worker"
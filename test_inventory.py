@@ -0,0 +1,158 @@
+"""
+Inventory ledger: stock only moves through conditional UPDATEs, so many clients racing for
+one SKU sell exactly what is there; cart holds expire back into stock.
+
+test_many_clients_hammer_one_sku doubles as the benchmark: run it with `-s` to see the
+checkout rate.
+"""
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import httpx
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from backend.app import fastapi_app
+from backend.database import InventoryItem, Order, StockReservation
+from backend.services.inventory import OutOfStock, inventory
+
+CLIENTS = 60
+STOCK = 25
+SKU = 1
+
+
+def stock_row(db, product_id=SKU):
+    db.expire_all()
+    row = db.get(InventoryItem, product_id)
+    return row.stock, row.reserved
+
+
+def line(product_id=SKU, quantity=1):
+    return {"product_id": product_id, "product_name": f"Medicine {product_id}", "quantity": quantity, "price": 10}
+
+
+def set_stock(db, **stock):
+    db.add_all([InventoryItem(product_id=int(pid[1:]), stock=units) for pid, units in stock.items()])
+    db.commit()
+
+
+def test_many_clients_hammer_one_sku(client, db):
+    """
+    The requests interleave at every await on one event loop, but that loop also runs every
+    database call, so no two statements ever execute at the same moment. The threaded
+    variant below is the one that makes sessions really race.
+    """
+    set_stock(db, p1=STOCK)
+
+    async def main():
+        transport = httpx.ASGITransport(app=fastapi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(
+                ac.post("/pharmacy/orders", json={"user_id": "guest", "items": [line()]}) for _ in range(CLIENTS)
+            ))
+            return [r.status_code for r in responses], time.perf_counter() - started
+
+    codes, elapsed = asyncio.run(main())
+    print(f"\n{CLIENTS} concurrent checkouts for one SKU: {elapsed * 1000:.0f} ms, {CLIENTS / elapsed:.0f} req/s")
+
+    assert Counter(codes) == Counter({200: STOCK, 409: CLIENTS - STOCK})
+    assert stock_row(db) == (0, 0)
+    assert db.query(Order).count() == STOCK
+    sold = db.query(func.sum(StockReservation.quantity)).filter_by(product_id=SKU, status="committed").scalar()
+    assert sold == STOCK
+
+
+def test_threads_with_their_own_sessions_hammer_one_sku(db, async_engine):
+    # Each thread runs its own event loop, engine and connection, so these checkouts really
+    # execute at the same time and contend for the SQLite write lock. (An AsyncEngine must not
+    # be shared across event loops, hence one per checkout.)
+    set_stock(db, p1=STOCK)
+
+    async def checkout(order_id):
+        engine = create_async_engine(async_engine.url, connect_args={"timeout": 30}, poolclass=NullPool)
+        try:
+            async with AsyncSession(engine) as session:
+                try:
+                    await inventory.commit(session, order_id, [(SKU, 1)], datetime.utcnow())
+                except OutOfStock:
+                    await session.rollback()
+                    return False
+                await session.commit()
+                return True
+        finally:
+            await engine.dispose()
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        sold = list(pool.map(lambda order_id: asyncio.run(checkout(order_id)), range(1, CLIENTS + 1)))
+
+    assert sold.count(True) == STOCK
+    assert stock_row(db) == (0, 0)
+    committed = db.query(func.sum(StockReservation.quantity)).filter_by(product_id=SKU, status="committed").scalar()
+    assert committed == STOCK
+
+
+def test_cart_hold_commit_release_and_expiry(client, db, monkeypatch):
+    set_stock(db, p1=20, p2=5)
+
+    held = client.post("/pharmacy/cart/reserve", json={"items": [{"product_id": 1, "quantity": 5}]}).json()
+    assert stock_row(db) == (15, 5)
+    # Replacing the hold returns the old units first
+    client.post("/pharmacy/cart/reserve", json={"cart_id": held["cart_id"], "items": [{"product_id": 1, "quantity": 4}]})
+    assert stock_row(db) == (16, 4)
+
+    # The order uses the 4 held units and takes the fifth from stock
+    order = client.post("/pharmacy/orders", json={"user_id": "guest", "cart_id": held["cart_id"], "items": [line(1, 5)]})
+    assert order.status_code == 200
+    assert stock_row(db) == (15, 0)
+    ledger = sorted((r.status, r.quantity) for r in db.query(StockReservation).filter_by(order_id=order.json()["id"]))
+    assert ledger == [("committed", 1), ("committed", 4)]
+
+    other = client.post("/pharmacy/cart/reserve", json={"items": [{"product_id": 2, "quantity": 5}]}).json()
+    assert client.post("/pharmacy/cart/reserve", json={"items": [{"product_id": 2, "quantity": 1}]}).status_code == 409
+    assert client.delete(f"/pharmacy/cart/{other['cart_id']}").json()["released"] == 5
+    assert stock_row(db, 2) == (5, 0)
+
+    # An abandoned cart goes back to stock once its hold expires
+    monkeypatch.setattr(inventory, "hold_seconds", -1)
+    client.post("/pharmacy/cart/reserve", json={"cart_id": "abandoned", "items": [{"product_id": 2, "quantity": 3}]})
+    assert stock_row(db, 2) == (2, 3)
+    assert client.post("/pharmacy/inventory/sweep").json() == {"expired": 3}
+    assert client.post("/pharmacy/inventory/sweep").json() == {"expired": 0}
+    assert stock_row(db, 2) == (5, 0)
+
+
+def test_short_line_rejects_the_whole_order(client, db):
+    set_stock(db, p1=10, p2=1)
+    response = client.post("/pharmacy/orders", json={"user_id": "guest", "items": [line(1, 3), line(2, 2)]})
+    assert response.status_code == 409
+    assert "Only 1 left" in response.json()["detail"]
+    assert (stock_row(db, 1), stock_row(db, 2)) == ((10, 0), (1, 0))
+    assert db.query(Order).count() == 0
+
+    assert client.post("/pharmacy/orders", json={"user_id": "guest", "items": [line(99999)]}).status_code == 400
+    listed = client.get("/pharmacy/medicines", params={"limit": 2}).json()
+    assert [m["stock"] for m in listed][0] == 10
+
+
+def test_orders_sweep_expired_holds_in_their_own_transaction(client, db, monkeypatch):
+    set_stock(db, p1=10, p2=4)
+    monkeypatch.setattr(inventory, "hold_seconds", -1)
+    client.post("/pharmacy/cart/reserve", json={"cart_id": "abandoned", "items": [{"product_id": 2, "quantity": 3}]})
+    assert stock_row(db, 2) == (1, 3)
+
+    # The order is refused, but the sweep before it already committed
+    monkeypatch.setattr(inventory, "_swept_at", None)
+    short = client.post("/pharmacy/orders", json={"user_id": "guest", "items": [line(1, 11)]})
+    assert short.status_code == 409
+    assert stock_row(db, 2) == (4, 0)
+    assert inventory._swept_at is not None
+
+    client.post("/pharmacy/cart/reserve", json={"cart_id": "abandoned", "items": [{"product_id": 2, "quantity": 2}]})
+    monkeypatch.setattr(inventory, "_swept_at", None)
+    assert client.post("/pharmacy/orders", json={"user_id": "guest", "items": [line(2, 4)]}).status_code == 200
+    assert stock_row(db, 2) == (0, 0)
@@ -0,0 +1,130 @@
+"""
+Lab work queue: technicians claim disjoint batches, keep them alive with heartbeats,
+complete them with a result, and lose tests whose lease ran out to the next claim.
+"""
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+
+from backend.app import fastapi_app
+from backend.database import User, Appointment, StatusHistory
+from backend.services.lab_queue import lab_queue
+from test_counters import recomputed_counters, stored_counters
+
+TECHNICIANS = 10
+TESTS = 400
+
+
+def seed_tests(db, count, test_names=("CBC", "HbA1c")):
+    patient = User(full_name="Pat Lab", email="pat@lab.test", role="patient")
+    db.add(patient)
+    db.commit()
+    start = datetime.now() - timedelta(hours=2)
+    tests = [
+        Appointment(patient_id=patient.id, type="lab_test", status="pending", doctor_name=test_names[i % len(test_names)],
+                    appointment_time=start + timedelta(seconds=i))
+        for i in range(count)
+    ]
+    db.add_all(tests)
+    db.commit()
+    return tests
+
+
+def test_ten_technicians_drain_the_queue_without_overlap(client, db, engine):
+    seed_tests(db, TESTS)
+
+    async def technician(ac, name, claimed):
+        while True:
+            response = await ac.post("/lab/queue/claim", json={"technician": name, "limit": 25})
+            items = response.json()["items"]
+            if not items:
+                return
+            for item in items:
+                claimed.append(item["id"])
+                done = await ac.post(f"/lab/queue/{item['id']}/complete", json={"technician": name, "result": "WBC 6.1"})
+                assert done.status_code == 200
+
+    async def main():
+        transport = httpx.ASGITransport(app=fastapi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            claims = [[] for _ in range(TECHNICIANS)]
+            await asyncio.gather(*(technician(ac, f"tech{i}", claims[i]) for i in range(TECHNICIANS)))
+        return claims
+
+    claims = asyncio.run(main())
+    everything = [test_id for batch in claims for test_id in batch]
+    assert len(everything) == len(set(everything)) == TESTS
+    assert sum(1 for batch in claims if batch) > 1
+
+    db.expire_all()
+    assert {a.status for a in db.query(Appointment)} == {"ready"}
+    assert Counter(h.item_id for h in db.query(StatusHistory)) == Counter({test_id: 1 for test_id in everything})
+    assert stored_counters(db) == recomputed_counters(engine)
+
+    metrics = client.get("/lab/queue/metrics").json()["tests"]
+    assert metrics["CBC"]["completed"] + metrics["HbA1c"]["completed"] == TESTS
+    assert metrics["CBC"]["waiting"] == 0 and metrics["CBC"]["reclaimed"] == 0
+    assert metrics["CBC"]["turnaround"]["count"] == TESTS // 2
+
+
+def test_expired_lease_is_reclaimed(client, db, monkeypatch):
+    tests = seed_tests(db, 3)
+    later = Appointment(patient_id=tests[0].patient_id, type="lab_test", status="confirmed", doctor_name="CBC",
+                        appointment_time=datetime.now() + timedelta(days=1))
+    db.add(later)
+    db.commit()
+
+    first = client.post("/lab/queue/claim", json={"technician": "alice", "limit": 10}).json()
+    # Tests booked for later are not due yet
+    assert [item["id"] for item in first["items"]] == [t.id for t in tests]
+    assert client.post("/lab/queue/claim", json={"technician": "bob", "limit": 10}).json()["items"] == []
+
+    beat = client.post("/lab/queue/heartbeat", json={"technician": "alice", "ids": [tests[0].id, later.id]}).json()
+    assert beat["renewed"] == [tests[0].id] and beat["lost"] == [later.id]
+
+    # Alice walks away: her leases run out and Bob picks the tests up
+    monkeypatch.setattr(lab_queue, "lease_seconds", -1)
+    client.post("/lab/queue/heartbeat", json={"technician": "alice", "ids": [t.id for t in tests]})
+    monkeypatch.setattr(lab_queue, "lease_seconds", 300)
+    second = client.post("/lab/queue/claim", json={"technician": "bob", "limit": 2}).json()
+    assert [item["id"] for item in second["items"]] == [tests[0].id, tests[1].id]
+
+    assert client.post(f"/lab/queue/{tests[0].id}/complete", json={"technician": "alice", "result": "late"}).status_code == 409
+    assert client.post(f"/lab/queue/{tests[0].id}/complete", json={"technician": "bob", "result": "Hb 13.9"}).status_code == 200
+    assert client.post(f"/lab/queue/{tests[0].id}/complete", json={"technician": "bob", "result": "again"}).status_code == 409
+
+    db.expire_all()
+    done = db.get(Appointment, tests[0].id)
+    assert (done.status, done.lab_result, done.claimed_by, done.claim_count, done.version) == ("ready", "Hb 13.9", "bob", 2, 2)
+
+    metrics = client.get("/lab/queue/metrics").json()["tests"]
+    assert metrics["CBC"]["reclaimed"] == 1
+    # tests[1] is leased to Bob, tests[2] went back to the queue
+    assert (metrics["HbA1c"]["in_progress"], metrics["CBC"]["waiting"], metrics["CBC"]["in_progress"]) == (1, 1, 0)
+    assert metrics["CBC"]["oldest_waiting_seconds"] >= 7000
+
+
+def test_admin_finished_tests_count_in_metrics(client, db):
+    tests = seed_tests(db, 4, test_names=("CBC",))
+    ids = [t.id for t in tests]
+
+    assert client.post("/admin/update_status", params={"item_type": "appointment", "item_id": ids[0], "new_status": "ready"}).status_code == 200
+    assert client.post("/admin/bulk_status", json={"operations": [
+        {"item_type": "appointment", "item_id": ids[1], "new_status": "completed"},
+        {"item_type": "appointment", "item_id": ids[2], "new_status": "ready", "new_result": "WBC 5.2"},
+    ]}).status_code == 200
+
+    db.expire_all()
+    first_done = db.get(Appointment, ids[0]).completed_at
+    assert first_done is not None and db.get(Appointment, ids[3]).completed_at is None
+    # Moving on from ready keeps the time the result came in
+    assert client.post("/admin/bulk_status", json={"operations": [
+        {"item_type": "appointment", "item_id": ids[0], "new_status": "completed"},
+    ]}).status_code == 200
+    db.expire_all()
+    assert db.get(Appointment, ids[0]).completed_at == first_done
+
+    metrics = client.get("/lab/queue/metrics").json()["tests"]
+    assert (metrics["CBC"]["completed"], metrics["CBC"]["waiting"]) == (3, 1)
@@ -0,0 +1,142 @@
+"""
+Versioned migration runner: fresh databases, legacy hand-patched databases, and the
+"already current" startup path.
+"""
+import threading
+import time
+
+import pytest
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import OperationalError
+
+from backend.database import build_engine
+from backend.migrations import HEAD, batched_update, batched_update_by_id, current_version, upgrade
+
+
+def test_fresh_database_upgrades_to_head_and_then_is_one_select(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path}/fresh.db")
+    assert current_version(engine) == 0
+    assert upgrade(engine) == HEAD
+    assert {"users", "appointments", "prescriptions", "schema_version"} <= set(inspect(engine).get_table_names())
+
+    executed = []
+    event.listen(engine, "before_cursor_execute", lambda *args: executed.append(args[2]))
+    assert upgrade(engine) == HEAD
+    assert [s for s in executed if not s.startswith("PRAGMA")] == ["SELECT MAX(version) FROM schema_version"]
+
+
+def test_legacy_database_is_patched_and_deduplicated(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path}/legacy.db")
+    with engine.begin() as conn:
+        # Roughly what an early database looked like: no is_active, no lab columns, double bookings
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, full_name VARCHAR, email VARCHAR, hashed_password VARCHAR, role VARCHAR)"))
+        conn.execute(text("CREATE TABLE appointments (id INTEGER PRIMARY KEY, patient_id INTEGER, doctor_id INTEGER, appointment_time DATETIME, status VARCHAR)"))
+        for i in range(7):
+            conn.execute(text("INSERT INTO appointments (patient_id, doctor_id, appointment_time, status) VALUES (1, 5, '2026-01-01 09:00:00.000000', 'pending')"))
+        conn.execute(text("INSERT INTO appointments (patient_id, doctor_id, appointment_time, status) VALUES (1, 5, '2026-01-01 09:30:00.000000', 'pending')"))
+
+    assert upgrade(engine) == HEAD
+
+    assert {"is_active", "department"} <= {c["name"] for c in inspect(engine).get_columns("users")}
+    assert {"lab_result", "type", "zoom_link"} <= {c["name"] for c in inspect(engine).get_columns("appointments")}
+    index_names = {i["name"] for i in inspect(engine).get_indexes("appointments")}
+    assert {"uq_appointments_active_slot", "ix_appointments_doctor_time_status"} <= index_names
+
+    with engine.connect() as conn:
+        active = conn.execute(text("SELECT id FROM appointments WHERE status != 'cancelled' ORDER BY id")).scalars().all()
+    assert active == [1, 8]
+
+
+def test_batched_update_commits_in_chunks(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path}/batches.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, flag INTEGER DEFAULT 0)"))
+        conn.execute(text("INSERT INTO items (flag) SELECT 0 FROM (WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 250) SELECT x FROM n)"))
+
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    total = batched_update(
+        engine,
+        "SELECT id FROM items WHERE flag = 0 LIMIT :batch_size",
+        "UPDATE items SET flag = 1 WHERE id IN :ids",
+        batch_size=100,
+    )
+    assert total == 250
+    # 3 batches with rows plus the final empty probe
+    assert len(commits) == 4
+
+
+def test_batched_update_by_id_walks_each_range_once(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path}/ranges.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, status VARCHAR)"))
+        conn.execute(text("INSERT INTO items (status) SELECT CASE WHEN x % 3 = 0 THEN ' Pending' ELSE 'pending' END FROM (WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 250) SELECT x FROM n)"))
+
+    updates = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, params, *rest: sql.startswith("UPDATE") and updates.append(params))
+    fixed = batched_update_by_id(engine, "items", "status != LOWER(TRIM(status))", "status = LOWER(TRIM(status))", batch_size=100)
+    assert fixed == 83
+    assert [(p[0], p[1]) for p in updates] == [(0, 100), (100, 200), (200, 300)]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM items WHERE status != 'pending'")).scalar() == 0
+
+
+def test_current_version_only_treats_a_missing_table_as_zero(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path}/broken.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE schema_version (name VARCHAR)"))
+    with pytest.raises(OperationalError):
+        current_version(engine)
+
+
+def test_concurrent_sqlite_workers_migrate_once(tmp_path):
+    url = f"sqlite:///{tmp_path}/race.db"
+    results, errors = [], []
+
+    def boot():
+        try:
+            results.append(upgrade(build_engine(url)))
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=boot) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == [] and results == [HEAD] * 4
+    with build_engine(url).connect() as conn:
+        versions = conn.execute(text("SELECT version FROM schema_version ORDER BY version")).scalars().all()
+        assert versions == list(range(1, HEAD + 1))
+        assert conn.execute(text("SELECT COUNT(*) FROM schema_migration_lock")).scalar() == 0
+
+
+def test_fresh_upgrade_matches_the_models(tmp_path):
+    # m001 is frozen, so every later column and index must come from a migration
+    from backend.database import Base
+    engine = build_engine(f"sqlite:///{tmp_path}/models.db")
+    upgrade(engine)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {c.name for c in table.columns} <= {c["name"] for c in inspector.get_columns(table.name)}, table.name
+        named = {i.name for i in table.indexes}
+        assert named <= {i["name"] for i in inspector.get_indexes(table.name)}, table.name
+
+
+def test_lock_row_is_refreshed_during_a_long_migration(tmp_path, monkeypatch):
+    from backend import migrations
+    engine = build_engine(f"sqlite:///{tmp_path}/slow.db")
+    monkeypatch.setattr(migrations.settings, "MIGRATION_LOCK_STALE_SECONDS", 0.3)
+    stamps = []
+
+    def slow_migration(engine):
+        for _ in range(4):
+            time.sleep(0.1)
+            with engine.connect() as conn:
+                stamps.append(conn.execute(text("SELECT locked_at FROM schema_migration_lock")).scalar())
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [(HEAD + 1, "slow", slow_migration)])
+    monkeypatch.setattr(migrations, "HEAD", HEAD + 1)
+    assert upgrade(engine) == HEAD + 1
+    assert len(set(stamps)) > 1
@@ -0,0 +1,151 @@
+"""
+Free-text lab results become observation rows (analyte, value, unit, range, time) that
+trend queries read straight from the (patient_id, analyte, observed_at) index.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from backend.database import User, Appointment, Observation
+from backend.migrations import m011_observations
+from backend.services.lab_results import parse_result
+
+
+def test_parser_reads_common_result_formats():
+    (a1c,) = parse_result("HbA1c: 5.8% (Pre-diabetic)")
+    assert (a1c.analyte, a1c.value, a1c.unit, a1c.ref_low, a1c.ref_high, a1c.note) == ("hba1c", 5.8, "%", 4.0, 5.6, "Pre-diabetic")
+
+    hb, wbc, sugar = parse_result("Hb 13.9 g/dL (13.5-17.5); WBC 6.1\nBlood Sugar: 120mg/dL")
+    assert (hb.analyte, hb.unit, hb.ref_low, hb.ref_high) == ("hemoglobin", "g/dL", 13.5, 17.5)
+    assert (wbc.analyte, wbc.value, wbc.unit) == ("wbc", 6.1, "10^3/uL")
+    assert (sugar.analyte, sugar.value, sugar.unit) == ("glucose", 120.0, "mg/dL")
+
+    assert parse_result("Normal, no abnormalities") == []
+    assert [o.analyte for o in parse_result("Ferritin 80 ng/mL")] == ["ferritin"]
+    assert [(o.analyte, o.unit) for o in parse_result("Uric Acid: 6.2 mg/dL")] == [("uric_acid", "mg/dL")]
+
+
+def test_parser_ignores_prose_and_splits_blood_pressure():
+    # Unknown names need ":" or "=", so dates and sentences don't become readings
+    assert [(o.analyte, o.value) for o in parse_result("Lipid profile done on 12 Jan 2026, LDL 130")] == [("ldl", 130.0)]
+    assert parse_result("Sample taken at 9 am on day 3") == []
+    (sugar,) = parse_result("Report fasting blood sugar 110")
+    assert (sugar.analyte, sugar.name) == ("glucose", "fasting blood sugar")
+
+    systolic, diastolic = parse_result("BP 120/80")
+    assert (systolic.analyte, systolic.value, systolic.unit) == ("bp_systolic", 120.0, "mmHg")
+    assert (diastolic.analyte, diastolic.value, diastolic.unit) == ("bp_diastolic", 80.0, "mmHg")
+    assert [(o.analyte, o.value) for o in parse_result("Blood pressure: 135/85 mmHg; Hb 13")] == [
+        ("bp_systolic", 135.0), ("bp_diastolic", 85.0), ("hemoglobin", 13.0)
+    ]
+    assert [(o.value, o.unit) for o in parse_result("Ratio: 120/80")] == [(120.0, None)]
+
+    # Generic labels are not analytes
+    assert parse_result("Result: 5") == [] and parse_result("Report: 2, Page: 1") == []
+
+
+def test_default_unit_only_applies_when_the_text_gives_none():
+    # "lakhs" is not the default 10^3/uL, so neither the unit nor its reference range apply
+    (lakhs,) = parse_result("Platelets 2.5 lakhs")
+    assert (lakhs.analyte, lakhs.value, lakhs.unit, lakhs.ref_low, lakhs.ref_high) == ("platelets", 2.5, None, None, None)
+    (mmol,) = parse_result("Glucose 6.1 mmol/L")
+    assert (mmol.unit, mmol.ref_high) == ("mmol/L", None)
+    (plain,) = parse_result("Platelets 250 normal")
+    assert (plain.unit, plain.ref_low, plain.ref_high) == ("10^3/uL", 150.0, 450.0)
+
+
+def seed_patient(db):
+    patient = User(full_name="Pat Trend", email="pat@trend.test", role="patient")
+    db.add(patient)
+    db.commit()
+    return patient
+
+
+def observations(db, appointment_id):
+    db.expire_all()
+    return sorted((o.analyte, o.value) for o in db.query(Observation).filter_by(appointment_id=appointment_id))
+
+
+def test_results_entered_anywhere_are_stored_as_observations(client, db):
+    patient = seed_patient(db)
+    taken = datetime(2026, 5, 4, 8, 30)
+    lab = Appointment(patient_id=patient.id, type="lab_test", status="processing", doctor_name="HbA1c", appointment_time=taken)
+    other = Appointment(patient_id=patient.id, type="lab_test", status="processing", doctor_name="CBC", appointment_time=taken)
+    db.add_all([lab, other])
+    db.commit()
+
+    client.post("/admin/update_status", params={"item_type": "appointment", "item_id": lab.id, "new_status": "ready", "new_result": "HbA1c: 6.1%"})
+    assert observations(db, lab.id) == [("hba1c", 6.1)]
+    assert db.query(Observation).filter_by(appointment_id=lab.id).one().observed_at == taken
+
+    # A corrected result replaces the earlier reading instead of adding to it
+    client.post("/admin/update_status", params={"item_type": "appointment", "item_id": lab.id, "new_status": "ready", "new_result": "HbA1c: 5.9%"})
+    assert observations(db, lab.id) == [("hba1c", 5.9)]
+
+    response = client.post("/admin/bulk_status", json={"operations": [
+        {"item_type": "appointment", "item_id": other.id, "new_status": "ready", "new_result": "Hb 14.2 g/dL, WBC 7"}
+    ]})
+    assert response.status_code == 200
+    assert observations(db, other.id) == [("hemoglobin", 14.2), ("wbc", 7.0)]
+
+    booked = client.post("/admin/book_lab", json={
+        "patient_name": "Walk In", "patient_phone": "5550001111", "test_name": "Glucose", "result": "Blood Sugar: 95 mg/dL"
+    }).json()
+    assert observations(db, booked["id"]) == [("glucose", 95.0)]
+    assert db.get(Appointment, booked["id"]).status == "ready"
+
+
+def test_trend_is_downsampled_and_served_from_the_index(client, db, engine):
+    patient = seed_patient(db)
+    start = datetime.now() - timedelta(days=6 * 365)
+    # Six years of weekly readings, plus another analyte that must not leak in
+    rows = [
+        {"patient_id": patient.id, "analyte": "hba1c", "name": "HbA1c", "value": 5.0 + (i % 10) / 10, "unit": "%",
+         "observed_at": start + timedelta(days=7 * i)}
+        for i in range(6 * 52)
+    ]
+    rows += [{"patient_id": patient.id, "analyte": "glucose", "name": "Glucose", "value": 100.0, "unit": "mg/dL",
+              "observed_at": start + timedelta(days=i)} for i in range(50)]
+    with engine.begin() as conn:
+        conn.execute(Observation.__table__.insert(), rows)
+
+    full = client.get(f"/patient/observations/{patient.id}/A1c", params={"years": 5, "max_points": 1000}).json()
+    assert full["analyte"] == "hba1c" and full["unit"] == "%"
+    assert full["reference_range"] == {"low": 4.0, "high": 5.6}
+    assert 255 <= full["readings"] <= 262 and len(full["points"]) == full["readings"]
+
+    sampled = client.get(f"/patient/observations/{patient.id}/hba1c", params={"years": 5, "max_points": 60}).json()
+    assert sampled["readings"] == full["readings"]
+    assert len(sampled["points"]) <= 60
+    assert sum(p["count"] for p in sampled["points"]) == full["readings"]
+    assert all(p["min"] <= p["value"] <= p["max"] for p in sampled["points"])
+
+    listed = {row["analyte"]: row["readings"] for row in client.get(f"/patient/observations/{patient.id}").json()}
+    assert listed == {"hba1c": 6 * 52, "glucose": 50}
+
+    with engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT observed_at, value FROM observations "
+            "WHERE patient_id = 1 AND analyte = 'hba1c' AND observed_at >= '2021-01-01' ORDER BY observed_at"
+        )))
+    assert "COVERING INDEX ix_observations_patient_analyte_time" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_migration_backfills_existing_results_once(db, engine):
+    patient = seed_patient(db)
+    old = [
+        Appointment(patient_id=patient.id, type="lab_test", status="ready", lab_result=f"HbA1c: {5 + i / 10}%",
+                    appointment_time=datetime(2024, 1, 1) + timedelta(days=90 * i))
+        for i in range(5)
+    ]
+    db.add_all(old + [Appointment(patient_id=patient.id, type="clinic", status="completed", appointment_time=datetime(2024, 2, 1))])
+    db.commit()
+
+    m011_observations(engine, batch_size=2)
+    m011_observations(engine, batch_size=2)
+
+    db.expire_all()
+    stored = db.query(Observation).order_by(Observation.observed_at).all()
+    assert [(o.appointment_id, o.value) for o in stored] == [(a.id, 5 + i / 10) for i, a in enumerate(old)]
+    assert stored[0].observed_at == datetime(2024, 1, 1)
@@ -0,0 +1,75 @@
+"""
+Pharmacy orders live in the orders/order_items tables: ids come from the table sequence and
+/pharmacy/orders/{user_id} is a newest-first keyset walk of ix_orders_user_created_id.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from backend.database import User, Order, OrderItem
+from test_admin_pagination import walk
+
+
+def cart(user_id, *items):
+    return {
+        "user_id": user_id, "user_name": "Cart Owner", "payment_method": "cod",
+        "items": [
+            {"product_id": pid, "product_name": f"Medicine {pid} (Strip of 10)", "baseName": f"Medicine {pid}",
+             "packSize": "Strip of 10", "quantity": qty, "price": 12.5}
+            for pid, qty in items
+        ],
+    }
+
+
+def test_orders_are_stored_and_listed_newest_first(client, db):
+    buyer = User(full_name="Oda Buyer", email="oda@orders.test", role="patient")
+    other = User(full_name="Other Buyer", email="other@orders.test", role="patient")
+    db.add_all([buyer, other])
+    db.commit()
+
+    placed = [client.post("/pharmacy/orders", json=cart(buyer.id, (1, 2), (7, 1))).json() for _ in range(3)]
+    client.post("/pharmacy/orders", json=cart(other.id, (2, 1)))
+    guest = client.post("/pharmacy/orders", json=cart("guest", (3, 1))).json()
+
+    ids = [o["id"] for o in placed]
+    assert ids == sorted(ids) and len(set(ids)) == 3
+    first = placed[0]
+    assert (first["status"], first["total_amount"], first["payment_method"]) == ("pending", 37.5, "cod")
+    assert [(i["product_id"], i["baseName"], i["quantity"]) for i in first["items"]] == [(1, "Medicine 1", 2), (7, "Medicine 7", 1)]
+    assert guest["user_id"] is None and client.get("/pharmacy/orders/guest").json() == []
+
+    # A fresh session (any worker) sees the same rows
+    listed = client.get(f"/pharmacy/orders/{buyer.id}").json()
+    assert [o["id"] for o in listed] == ids[::-1]
+    assert listed[-1]["items"] == first["items"]
+    db.expire_all()
+    assert db.query(OrderItem).filter(OrderItem.order_id.in_(ids)).count() == 6
+
+
+def test_order_history_pages_and_uses_the_index(client, db, engine):
+    buyer = User(full_name="Page Buyer", email="page@orders.test", role="patient")
+    db.add(buyer)
+    db.commit()
+    start = datetime(2026, 1, 1)
+    orders = [
+        # Pairs share a timestamp so the id tiebreak is exercised
+        Order(user_id=buyer.id, status="pending", total_amount=10, created_at=start + timedelta(hours=i // 2))
+        for i in range(23)
+    ]
+    db.add_all(orders)
+    db.commit()
+    db.add_all([OrderItem(order_id=o.id, product_name="Cetirizine", quantity=1, price=10) for o in orders])
+    db.commit()
+
+    rows = walk(client, f"/pharmacy/orders/{buyer.id}", limit=5)
+    keys = [(r["created_at"], r["id"]) for r in rows]
+    assert keys == sorted(keys, reverse=True) and len(set(keys)) == 23
+    assert all(len(r["items"]) == 1 for r in rows)
+
+    with engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM orders WHERE user_id = 1 "
+            "ORDER BY created_at DESC, id DESC LIMIT 6"
+        )))
+    assert "ix_orders_user_created_id" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,71 @@
+"""
+With a pub/sub client manager, an emit on one worker reaches sockets held by
+another, and bursts cross the bus as one batch.
+"""
+import asyncio
+import json
+
+import socketio
+
+from backend.services.pubsub import LocalBus, LocalPubSubManager, build_client_manager
+
+
+def make_worker(bus):
+    return socketio.AsyncServer(async_mode="asgi", client_manager=LocalPubSubManager(bus, batch_window=0.01))
+
+
+async def attach_socket(server, room):
+    """Registers a fake connected socket in `room` and records what the server sends it."""
+    received = []
+
+    async def send(eio_sid, pkt):
+        received.append(pkt.data)
+
+    server._send_eio_packet = send
+    sid = await server.manager.connect("eio-1", "/")
+    await server.manager.enter_room(sid, "/", room)
+    return received
+
+
+def test_emit_reaches_sockets_on_other_workers_in_one_batch():
+    async def scenario():
+        bus = LocalBus()
+        worker_a, worker_b = make_worker(bus), make_worker(bus)
+        worker_a.manager.initialize()
+        worker_b.manager.initialize()
+        await asyncio.sleep(0)  # let both listeners subscribe
+
+        on_b = await attach_socket(worker_b, "role:lab")
+        for i in range(5):
+            await worker_a.emit("delta", {"id": i}, to=["role:lab"])
+        await worker_a.emit("delta", {"id": 99}, to=["role:pharmacist"])
+        await asyncio.sleep(0.05)
+        return on_b, bus.published
+
+    on_b, published = asyncio.run(scenario())
+    # Socket.IO EVENT packets are "2" + JSON [event, data]
+    assert [json.loads(packet[1:]) for packet in on_b] == [["delta", {"id": i}] for i in range(5)]
+    assert published == 1
+
+
+def test_default_manager_is_in_process():
+    assert type(build_client_manager()) is socketio.AsyncManager
+    assert isinstance(build_client_manager("local"), LocalPubSubManager)
+
+
+def test_local_sockets_get_the_emit_at_once_and_only_once():
+    async def scenario():
+        bus = LocalBus()
+        worker = socketio.AsyncServer(async_mode="asgi", client_manager=LocalPubSubManager(bus, batch_window=1.0))
+        worker.manager.initialize()
+        await asyncio.sleep(0)
+
+        local = await attach_socket(worker, "role:lab")
+        await worker.emit("delta", {"id": 1}, to=["role:lab"])
+        immediate = list(local)
+        await worker.manager._flush()  # the batch reaches the bus and comes back to our listener
+        await asyncio.sleep(0.01)
+        return immediate, local
+
+    immediate, received = asyncio.run(scenario())
+    assert len(immediate) == 1 and received == immediate
@@ -0,0 +1,70 @@
+"""
+Regression tests: listing endpoints must issue a fixed number of SQL statements,
+no matter how many rows they return (no per-row patient/doctor lookups).
+"""
+from datetime import datetime, timedelta
+
+from backend.database import User, Appointment, Prescription
+
+
+def seed_rows(db, count):
+    doctor = User(full_name="Dr. Count", email=f"doc{count}@test.com", role="doctor", department="General")
+    patient = User(full_name="Pat Count", email=f"pat{count}@test.com", role="patient", phone="5550000")
+    db.add_all([doctor, patient])
+    db.commit()
+
+    start = datetime(2026, 1, 5, 9, 0)
+    for i in range(count):
+        db.add(Appointment(
+            patient_id=patient.id,
+            doctor_id=doctor.id if i % 2 else None,
+            appointment_time=start + timedelta(minutes=30 * i),
+            type="clinic" if i % 2 else "lab_test",
+            status="pending"
+        ))
+        db.add(Prescription(patient_id=patient.id, extracted_data="Paracetamol", status="preparing"))
+    db.commit()
+    return patient
+
+
+def count_statements(client, statements, url):
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return len(statements), response.json()
+
+
+def test_admin_appointments_statement_count_is_constant(client, db, statements):
+    seed_rows(db, 3)
+    small, data = count_statements(client, statements, "/admin/appointments")
+    assert len(data) == 3
+
+    seed_rows(db, 40)
+    large, data = count_statements(client, statements, "/admin/appointments")
+    assert len(data) == 43
+    assert data[0]["patient_name"] == "Pat Count"
+    assert small == large == 1
+
+
+def test_pharmacy_queue_statement_count_is_constant(client, db, statements):
+    seed_rows(db, 3)
+    small, _ = count_statements(client, statements, "/admin/pharmacy_queue")
+
+    seed_rows(db, 40)
+    large, data = count_statements(client, statements, "/admin/pharmacy_queue")
+    assert len(data) == 43
+    assert data[-1]["patient_phone"] == "5550000"
+    assert small == large == 1
+
+
+def test_my_appointments_statement_count_is_constant(client, db, statements):
+    patient = seed_rows(db, 4)
+    small, data = count_statements(client, statements, f"/patient/my_appointments/{patient.id}")
+    assert {row["doctor_name"] for row in data} == {"Dr. Count", "Lab Technician"}
+
+    for _ in range(30):
+        db.add(Appointment(patient_id=patient.id, doctor_id=None, appointment_time=datetime(2026, 2, 1), type="lab_test"))
+    db.commit()
+    large, data = count_statements(client, statements, f"/patient/my_appointments/{patient.id}")
+    assert len(data) == 34
+    assert small == large == 1
@@ -0,0 +1,58 @@
+"""
+Seeding is an explicit, recorded stage: importing the app does no bcrypt work, and a
+second seed run does nothing.
+"""
+import os
+import subprocess
+import sys
+
+from sqlalchemy.orm import sessionmaker
+
+import backend.security
+from backend.database import build_engine, User, BootstrapState
+from backend.migrations import upgrade
+from backend.seed import pending_steps, run_seed
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_importing_the_app_does_no_password_hashing():
+    probe = (
+        "import bcrypt\n"
+        "calls = []\n"
+        "original = bcrypt.hashpw\n"
+        "bcrypt.hashpw = lambda *a: calls.append(1) or original(*a)\n"
+        "import backend.app\n"
+        "print('HASHES', len(calls))\n"
+    )
+    out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, timeout=120)
+    assert "HASHES 0" in out.stdout, out.stdout + out.stderr
+
+
+def test_seed_runs_once_and_is_recorded(tmp_path, monkeypatch):
+    engine = build_engine(f"sqlite:///{tmp_path}/seed.db")
+    upgrade(engine)
+    factory = sessionmaker(bind=engine)
+
+    hashes = []
+    monkeypatch.setattr(backend.security, "get_password_hash", lambda raw: hashes.append(raw) or f"hashed-{raw}")
+
+    assert pending_steps(factory) == ["demo_data", "staff_logins"]
+    assert run_seed(session_factory=factory) == ["demo_data", "staff_logins"]
+    assert pending_steps(factory) == []
+
+    db = factory()
+    assert db.query(BootstrapState).count() == 2
+    assert db.query(User).filter(User.email == "lab@medicare.com").one().hashed_password == "hashed-lab123"
+    doctors = db.query(User).filter(User.role == "doctor").count()
+    db.close()
+
+    first_run_hashes = len(hashes)
+    assert run_seed(session_factory=factory) == []
+    assert len(hashes) == first_run_hashes
+
+    # --force re-runs every step without duplicating rows
+    assert run_seed(force=True, session_factory=factory) == ["demo_data", "staff_logins"]
+    db = factory()
+    assert db.query(User).filter(User.role == "doctor").count() == doctors
+    db.close()
@@ -0,0 +1,156 @@
+"""
+Socket.IO events go only to the rooms of the records they touch, and only
+authenticated sockets get into any room.
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+import socketio
+
+from backend.database import User, Appointment, Prescription
+from backend.security import create_access_token
+from backend.services.event_log import EventLog
+from backend.services.socket_manager import SocketManager, socket_manager
+
+
+class RecordingServer:
+    """Stands in for the AsyncServer: keeps room membership and emitted events."""
+
+    def __init__(self):
+        self.sessions, self.rooms, self.emitted = {}, {}, []
+
+    async def save_session(self, sid, session):
+        self.sessions[sid] = session
+
+    async def get_session(self, sid):
+        return self.sessions[sid]
+
+    async def enter_room(self, sid, room):
+        self.rooms.setdefault(sid, set()).add(room)
+
+    async def emit(self, event, data=None, to=None, ignore_queue=False):
+        self.emitted.append((event, data, to))
+
+
+def connect(manager, sid, **claims):
+    auth = {"token": create_access_token(claims)} if claims else None
+    asyncio.run(manager.connect(sid, {"QUERY_STRING": ""}, auth))
+
+
+def test_sockets_join_rooms_for_their_identity():
+    server = RecordingServer()
+    manager = SocketManager(server)
+    connect(manager, "p", sub="p@x", role="patient", id=7)
+    connect(manager, "d", sub="d@x", role="doctor", id=3)
+    connect(manager, "l", sub="l@x", role="lab", id=4)
+    connect(manager, "a", sub="a@x", role="admin", id=1)
+
+    assert server.rooms == {
+        "p": {"patient:7"},
+        "d": {"role:doctor", "doctor:3"},
+        "l": {"role:lab"},
+        "a": {"role:admin"},
+    }
+    assert server.sessions["d"] == {"user_id": 3, "role": "doctor"}
+
+
+@pytest.mark.parametrize("auth", [None, {"token": "not-a-jwt"}])
+def test_unauthenticated_sockets_are_refused(auth):
+    server = RecordingServer()
+    with pytest.raises(socketio.exceptions.ConnectionRefusedError):
+        asyncio.run(SocketManager(server).connect("x", {"QUERY_STRING": ""}, auth))
+    assert server.rooms == {}
+
+
+def test_status_updates_reach_only_the_affected_rooms(client, db, monkeypatch):
+    server = RecordingServer()
+    monkeypatch.setattr(socket_manager, "server", server)
+
+    doctor = User(full_name="Dr. Room", email="doc@room.test", role="doctor")
+    patient = User(full_name="Pat Room", email="pat@room.test", role="patient")
+    db.add_all([doctor, patient])
+    db.commit()
+    visit = Appointment(patient_id=patient.id, doctor_id=doctor.id, type="clinic", appointment_time=datetime(2026, 5, 4, 10, 0))
+    lab = Appointment(patient_id=patient.id, type="lab_test", appointment_time=datetime(2026, 5, 4, 11, 0))
+    rx = Prescription(patient_id=patient.id)
+    db.add_all([visit, lab, rx])
+    db.commit()
+
+    for item_type, item_id in (("appointment", visit.id), ("appointment", lab.id), ("prescription", rx.id)):
+        response = client.post("/admin/update_status", params={"item_type": item_type, "item_id": item_id, "new_status": "ready"})
+        assert response.status_code == 200
+
+    rooms = [set(to) for _, _, to in server.emitted]
+    assert rooms == [
+        {"role:admin", f"patient:{patient.id}", f"doctor:{doctor.id}"},
+        {"role:admin", f"patient:{patient.id}", "role:lab", "role:doctor"},
+        {"role:admin", "role:pharmacist", f"patient:{patient.id}"},
+    ]
+
+
+def test_changes_are_sent_as_versioned_deltas(client, db, monkeypatch):
+    server = RecordingServer()
+    monkeypatch.setattr(socket_manager, "server", server)
+
+    doctor = User(full_name="Dr. Delta", email="doc@delta.test", role="doctor")
+    patient = User(full_name="Pat Delta", email="pat@delta.test", role="patient", phone="555")
+    db.add_all([doctor, patient])
+    db.commit()
+    appt = Appointment(patient_id=patient.id, doctor_id=doctor.id, type="clinic", appointment_time=datetime(2026, 5, 4, 10, 0))
+    db.add(appt)
+    db.commit()
+
+    client.post("/admin/update_status", params={"item_type": "appointment", "item_id": appt.id, "new_status": "confirmed"})
+    client.post("/admin/update_status", params={
+        "item_type": "appointment", "item_id": appt.id, "new_status": "rescheduled",
+        "new_date": "2026-05-05", "new_time": "11:30"
+    })
+
+    (first_event, [first], _), (second_event, [second], _) = server.emitted
+    assert first_event == second_event == "delta_batch"
+    assert (first["type"], first["entity"], first["id"], first["version"]) == ("status_changed", "appointment", appt.id, 2)
+    assert first["record"]["status"] == "confirmed"
+    assert first["record"]["patient_name"] == "Pat Delta"
+    assert (second["type"], second["version"]) == ("rescheduled", 3)
+    assert second["record"]["appointment_time"] == "2026-05-05T11:30:00"
+
+    # The record has exactly the shape the listing returns, so clients can swap it in place
+    listed = client.get("/admin/appointments").json()
+    assert listed == [second["record"]]
+
+
+def test_resume_replays_only_missed_events_for_the_sockets_rooms():
+    server = RecordingServer()
+    manager = SocketManager(server, EventLog(capacity=10), coalesce_window=0)
+    connect(manager, "p", sub="p@x", role="patient", id=7)
+    start = asyncio.run(manager.resume("p", {}))
+    assert start == {"status": "ok", "epoch": manager.log.epoch, "seq": 0}
+
+    record = {"patient_id": 7, "doctor_id": 3, "type": "clinic", "version": 2}
+    asyncio.run(manager.appointment_event("status_changed", {**record, "id": 1}))
+    asyncio.run(manager.appointment_event("status_changed", {**record, "id": 2, "patient_id": 8}))
+    asyncio.run(manager.appointment_event("rescheduled", {**record, "id": 3, "version": 3}))
+    server.emitted.clear()
+
+    ack = asyncio.run(manager.resume("p", {"epoch": start["epoch"], "last_seq": 0}))
+    assert ack == {"status": "ok", "replayed": 2, "epoch": start["epoch"], "seq": 3}
+    [(event, replayed, to)] = server.emitted
+    assert (event, to) == ("delta_batch", "p")
+    assert [(delta["id"], delta["seq"]) for delta in replayed] == [(1, 1), (3, 3)]
+
+
+def test_resume_from_a_gap_or_old_epoch_requires_a_snapshot():
+    server = RecordingServer()
+    manager = SocketManager(server, EventLog(capacity=2), coalesce_window=0)
+    connect(manager, "a", sub="a@x", role="admin", id=1)
+    for i in range(1, 5):
+        asyncio.run(manager.prescription_event({"id": i, "patient_id": 7, "version": 1}))
+    server.emitted.clear()
+
+    epoch = manager.log.epoch
+    assert asyncio.run(manager.resume("a", {"epoch": epoch, "last_seq": 1}))["status"] == "snapshot_required"
+    assert asyncio.run(manager.resume("a", {"epoch": "older", "last_seq": 3}))["status"] == "snapshot_required"
+    assert [event for event, _, _ in server.emitted] == ["snapshot_required", "snapshot_required"]
+
+    assert asyncio.run(manager.resume("a", {"epoch": epoch, "last_seq": 2}))["replayed"] == 2
@@ -0,0 +1,119 @@
+"""
+Status changes go through the transition table, each one leaves a status_history row,
+and the "oldest first" work queues are served from one covering index.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from backend.database import Appointment, Prescription, StatusHistory, User
+from backend.migrations import m009_status_history
+from test_counters import recomputed_counters, stored_counters
+
+
+def seed(db):
+    patient = User(full_name="Pat History", email="pat@history.test", role="patient")
+    db.add(patient)
+    db.commit()
+    start = datetime(2026, 6, 1, 9, 0)
+    lab = Appointment(patient_id=patient.id, type="lab_test", status="processing", appointment_time=start)
+    done = Appointment(patient_id=patient.id, type="lab_test", status="completed", appointment_time=start + timedelta(hours=1))
+    rx = Prescription(patient_id=patient.id, status="preparing")
+    db.add_all([lab, done, rx])
+    db.commit()
+    return lab, done, rx
+
+
+def history(db, item_type, item_id):
+    rows = db.query(StatusHistory).filter_by(item_type=item_type, item_id=item_id).order_by(StatusHistory.id)
+    return [(row.from_status, row.to_status) for row in rows]
+
+
+def test_single_update_checks_the_transition_and_records_it(client, db):
+    lab, done, rx = seed(db)
+
+    response = client.post("/admin/update_status", params={"item_type": "appointment", "item_id": done.id, "new_status": "pending"})
+    assert response.status_code == 409
+    assert "cannot move appointment from 'completed' to 'pending'" in response.json()["detail"]
+    assert client.post("/admin/update_status", params={"item_type": "prescription", "item_id": rx.id, "new_status": "shipped"}).status_code == 409
+    assert client.post("/admin/update_status", params={"item_type": "prescription", "item_id": 999, "new_status": "ready"}).status_code == 404
+
+    # Stored lowercase whatever the caller sent
+    assert client.post("/admin/update_status", params={"item_type": "appointment", "item_id": lab.id, "new_status": " Ready "}).status_code == 200
+    assert client.post("/admin/update_status", params={"item_type": "prescription", "item_id": rx.id, "new_status": "ready"}).status_code == 200
+    # Setting the same status again is a no-op, not a new history row
+    assert client.post("/admin/update_status", params={"item_type": "prescription", "item_id": rx.id, "new_status": "ready"}).status_code == 200
+
+    db.expire_all()
+    assert db.get(Appointment, lab.id).status == "ready"
+    assert db.get(Appointment, done.id).status == "completed"
+    assert history(db, "appointment", lab.id) == [("processing", "ready")]
+    assert history(db, "appointment", done.id) == []
+    assert history(db, "prescription", rx.id) == [("preparing", "ready")]
+
+    listed = client.get("/admin/status_history", params={"item_type": "prescription", "item_id": rx.id}).json()
+    assert [(row["from_status"], row["to_status"]) for row in listed] == [("preparing", "ready")]
+
+
+def test_bad_reschedule_date_is_rejected(client, db):
+    lab, _, _ = seed(db)
+    response = client.post("/admin/update_status", params={
+        "item_type": "appointment", "item_id": lab.id, "new_status": "cancelled", "new_date": "2026-06-02", "new_time": "10:30"
+    })
+    assert response.status_code == 200  # only a reschedule looks at the date
+
+    visit = Appointment(patient_id=lab.patient_id, type="clinic", status="confirmed", appointment_time=datetime(2026, 6, 3, 9, 0))
+    db.add(visit)
+    db.commit()
+    response = client.post("/admin/update_status", params={
+        "item_type": "appointment", "item_id": visit.id, "new_status": "rescheduled", "new_date": "06/02/2026", "new_time": "10:30"
+    })
+    assert response.status_code == 400
+    db.expire_all()
+    assert db.get(Appointment, visit.id).status == "confirmed"
+
+
+def test_bulk_update_writes_history_in_one_insert(client, db, statements):
+    lab, done, rx = seed(db)
+    operations = [
+        {"item_type": "appointment", "item_id": lab.id, "new_status": "COMPLETED", "new_result": "Hb 14 g/dL"},
+        {"item_type": "appointment", "item_id": done.id, "new_status": "completed"},
+        {"item_type": "prescription", "item_id": rx.id, "new_status": "ready"},
+    ]
+    statements.clear()
+    response = client.post("/admin/bulk_status", json={"operations": operations})
+    assert response.status_code == 200
+    assert response.json() == {"updated": 2, "unchanged": 1}
+
+    inserts = [s for s in statements if "INSERT INTO status_history" in s]
+    assert len(inserts) == 1
+    assert history(db, "appointment", lab.id) == [("processing", "completed")]
+    assert history(db, "appointment", done.id) == []
+    assert history(db, "prescription", rx.id) == [("preparing", "ready")]
+
+
+def test_work_queue_is_an_index_only_scan(engine):
+    with engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id, appointment_time FROM appointments "
+            "WHERE status = 'processing' AND type = 'lab_test' ORDER BY appointment_time, id LIMIT 50"
+        )))
+    assert "COVERING INDEX ix_appointments_status_type_time_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_migration_lowercases_stored_statuses(engine, db):
+    lab, _, rx = seed(db)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE appointments SET status = 'Processing' WHERE id = :id"), {"id": lab.id})
+        conn.execute(text("UPDATE prescriptions SET status = 'PREPARING ' WHERE id = :id"), {"id": rx.id})
+        conn.execute(text("DROP INDEX ix_appointments_status_type_time_id"))
+
+    m009_status_history(engine)
+
+    db.expire_all()
+    assert db.get(Appointment, lab.id).status == "processing"
+    assert db.get(Prescription, rx.id).status == "preparing"
+    assert stored_counters(db) == recomputed_counters(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT name FROM sqlite_master WHERE name = 'ix_appointments_status_type_time_id'")).scalar()